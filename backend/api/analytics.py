@@ -0,0 +1,105 @@
+"""
+analytics.py — Class-level item analysis across graded papers.
+
+Routes:
+  GET /analytics/questions?answer_key_id=…|exam_title=…   per-question / per-step statistics
+"""
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from models.session import GradingSession
+from models.question import Question, QuestionStep
+from models.result import GradingResult
+from services.class_analytics import compute_item_statistics
+from services.metrics import CACHE_LOOKUPS
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Sessions whose marks are settled enough to analyse
+GRADED_STATUSES = ("ready", "completed")
+
+# (answer_key_id, exam_title) → (stamp, payload); bounded LRU
+_CACHE_SIZE = 64
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def _session_filter(answer_key_id: Optional[str], exam_title: Optional[str]) -> list:
+    conds = [GradingSession.status.in_(GRADED_STATUSES)]
+    if answer_key_id:
+        conds.append(GradingSession.answer_key_id == answer_key_id)
+    if exam_title:
+        conds.append(GradingSession.exam_title == exam_title)
+    return conds
+
+
+@router.get("/questions")
+async def question_analytics(
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Per-question and per-step mean, histogram, % scoring zero, difficulty,
+    discrimination index and AI-vs-teacher agreement over every graded paper.
+    """
+    if not answer_key_id and not exam_title:
+        raise HTTPException(status_code=422, detail="Pass answer_key_id or exam_title")
+
+    conds = _session_filter(answer_key_id, exam_title)
+
+    # Every mark save bumps the session's version/updated_at, so this stamp moves
+    # whenever the underlying marks do and the cached result is recomputed
+    stamp = tuple((await db.execute(
+        select(
+            func.count(GradingSession.id),
+            func.max(GradingSession.updated_at),
+            func.sum(GradingSession.version),
+        ).where(*conds)
+    )).one())
+
+    key = (answer_key_id, exam_title)
+    cached = _cache.get(key)
+    if cached and cached[0] == stamp:
+        _cache.move_to_end(key)
+        CACHE_LOOKUPS.inc(cache="analytics", result="hit")
+        return cached[1]
+    CACHE_LOOKUPS.inc(cache="analytics", result="miss")
+
+    question_rows = (await db.execute(
+        select(
+            GradingSession.id, Question.q_number, Question.max_marks,
+            GradingResult.obtained_marks, GradingResult.ai_obtained_marks,
+        )
+        .join(Question, Question.session_id == GradingSession.id)
+        .outerjoin(GradingResult, GradingResult.question_id == Question.id)
+        .where(*conds)
+    )).all()
+    step_rows = (await db.execute(
+        select(
+            GradingSession.id, Question.q_number, QuestionStep.step_key, QuestionStep.max_marks,
+            QuestionStep.obtained_marks, QuestionStep.ai_obtained_marks,
+        )
+        .join(Question, Question.session_id == GradingSession.id)
+        .join(QuestionStep, QuestionStep.question_id == Question.id)
+        .where(*conds)
+    )).all()
+
+    payload = {
+        "answerKeyId": answer_key_id,
+        "examTitle": exam_title,
+        **compute_item_statistics(
+            [tuple(r) for r in question_rows],
+            [tuple(r) for r in step_rows],
+        ),
+    }
+
+    _cache[key] = (stamp, payload)
+    _cache.move_to_end(key)
+    while len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return payload
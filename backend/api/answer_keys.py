@@ -6,20 +6,26 @@ Routes:
   POST   /answer-keys/extract    extract scheme from uploaded PDF/DOCX
   POST   /answer-keys            create (save)
   GET    /answer-keys/{id}       detail
+  PUT    /answer-keys/{id}       update (then POST /regrade to re-mark affected sessions)
   DELETE /answer-keys/{id}       delete
 """
 import shutil
 import uuid
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from database import get_db
+from database import get_db, get_async_db
 from models.answer_key import AnswerKey
 from services.answer_key_extractor import extract_answer_key
+from services.admission import admission
+from services.pdf_processor import estimate_pages
 
 router = APIRouter(prefix="/answer-keys", tags=["answer-keys"])
 
@@ -60,20 +66,23 @@ def _key_detail(key: AnswerKey) -> dict:
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @router.get("")
-def list_answer_keys(db: Session = Depends(get_db)):
+async def list_answer_keys(db: AsyncSession = Depends(get_async_db)):
     """List all saved answer keys (summary — no questions list)."""
-    keys = db.query(AnswerKey).order_by(AnswerKey.created_at.desc()).all()
+    keys = (await db.scalars(select(AnswerKey).order_by(AnswerKey.created_at.desc()))).all()
     return [_key_summary(k) for k in keys]
 
 
 @router.post("/extract")
 async def extract_from_file(
     file: UploadFile = File(...),
+    x_tenant_id: Optional[str] = Header(None),
 ):
     """
     Upload a PDF or DOCX marking scheme.
     Returns extracted question list for the user to review/edit before saving.
     Does NOT persist anything to the database.
+    Extraction runs on this node, so only ADMIT_MAX_EXTRACTIONS run at once;
+    beyond that the request gets 429/503 with Retry-After.
     """
     ext = Path(file.filename or "upload.pdf").suffix.lower()
     if ext not in (".pdf", ".docx", ".doc", ".jpg", ".jpeg", ".png"):
@@ -82,15 +91,24 @@ async def extract_from_file(
             detail="Unsupported file type. Please upload a PDF, DOCX, or image.",
         )
 
+    # Counting pages reads the upload and the queue check may hit the jobs table — off the event loop too
+    ticket = await run_in_threadpool(
+        lambda: admission.admit(
+            x_tenant_id or "default", None, pages=estimate_pages(file.file, ext), nbytes=file.size or 0,
+            extraction=True,
+        )
+    )
     # Save temp file
     tmp_path = UPLOAD_DIR / f"tmp_ak_{uuid.uuid4()}{ext}"
     try:
         with tmp_path.open("wb") as f:
             shutil.copyfileobj(file.file, f)
 
-        result = extract_answer_key(str(tmp_path))
+        # OCR and the model call block — keep them off the event loop
+        result = await run_in_threadpool(extract_answer_key, str(tmp_path))
     finally:
         tmp_path.unlink(missing_ok=True)
+        ticket.release()
 
     return {
         "questions": result["questions"],
@@ -115,11 +133,26 @@ def create_answer_key(body: AnswerKeyCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/{key_id}")
-def get_answer_key(key_id: str, db: Session = Depends(get_db)):
+async def get_answer_key(key_id: str, db: AsyncSession = Depends(get_async_db)):
     """Full detail including questions list."""
+    key = await db.get(AnswerKey, key_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Answer key not found")
+    return _key_detail(key)
+
+
+@router.put("/{key_id}")
+def update_answer_key(key_id: str, body: AnswerKeyCreate, db: Session = Depends(get_db)):
+    """Replace an answer key's details and marking scheme. Graded sessions are untouched until regraded."""
     key = db.get(AnswerKey, key_id)
     if not key:
         raise HTTPException(status_code=404, detail="Answer key not found")
+    key.title = body.title
+    key.subject = body.subject
+    key.exam_title = body.exam_title
+    key.questions = body.questions
+    db.commit()
+    db.refresh(key)
     return _key_detail(key)
 
 
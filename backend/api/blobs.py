@@ -0,0 +1,45 @@
+"""
+blobs.py — Read access to the content-addressed blob store.
+
+Routes:
+  GET /blobs/{key}   redirect to a presigned URL (S3), or stream the blob
+"""
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models.blob import Blob
+from services.blob_store import blob_store, is_blob_key, content_type, BLOB_URL_TTL
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+# Let the browser fetch straight from S3 when the backend can sign URLs; 0 streams through the API
+BLOB_SIGNED_URLS = os.getenv("BLOB_SIGNED_URLS", "1") != "0"
+
+# A key names its content, so a response never goes stale
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.get("/{key:path}")
+def get_blob(key: str, request: Request, db: Session = Depends(get_db)):
+    if not is_blob_key(key):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    blob = db.get(Blob, key)
+    if not blob or blob.refcount < 0:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    if BLOB_SIGNED_URLS:
+        url = blob_store.signed_url(key, BLOB_URL_TTL)
+        if url:
+            # Short private cache: the signature expires, the content doesn't
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=60"})
+
+    etag = f'"{key.split("/")[-1].split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Length"] = str(blob.size)
+    return StreamingResponse(blob_store.iter_chunks(key), media_type=content_type(key), headers=headers)
@@ -0,0 +1,269 @@
+"""
+clusters.py — Grade identical / near-identical answers once and propagate.
+
+Routes:
+  POST  /clusters/grade               cluster ungraded answers for an exam and grade one per cluster
+  GET   /clusters                     list clusters (with members) for review
+  PATCH /clusters/{cluster_id}/marks  apply one mark edit to every answer in a cluster (one transaction)
+"""
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from database import get_db, get_async_db, SessionLocal
+from models.session import GradingSession
+from models.question import Question
+from models.result import GradingResult
+from services.ai_grader import grade_answer
+from services.answer_clustering import cluster_transcripts, DEFAULT_THRESHOLD
+from services.scheduler import BULK
+from services.job_queue import enqueue
+from api.grading import MarkUpdate, apply_mark_updates
+
+router = APIRouter(prefix="/clusters", tags=["clusters"])
+
+
+# ── Pydantic schemas ──────────────────────────────────────────────────────────
+
+class ClusterGradeRequest(BaseModel):
+    answer_key_id: Optional[str] = None
+    exam_title: Optional[str] = None
+    threshold: float = DEFAULT_THRESHOLD
+
+
+class ClusterMarkUpdate(BaseModel):
+    step_id: Optional[str] = None   # None → update question-level mark
+    obtained_marks: Optional[float] = None
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _exam_filter(answer_key_id: Optional[str], exam_title: Optional[str]) -> list:
+    if not answer_key_id and not exam_title:
+        raise HTTPException(status_code=422, detail="Pass answer_key_id or exam_title")
+    conds = []
+    if answer_key_id:
+        conds.append(GradingSession.answer_key_id == answer_key_id)
+    if exam_title:
+        conds.append(GradingSession.exam_title == exam_title)
+    return conds
+
+
+def _grading_from_result(result: GradingResult, question: Question) -> dict:
+    """Re-use an already trusted grade as if the grader had just returned it."""
+    return {
+        "obtained_marks": result.obtained_marks,
+        "confidence": result.confidence,
+        "ai_remark": result.ai_remark,
+        "steps": [
+            {
+                "step_key": s.step_key,
+                "obtained_marks": s.obtained_marks,
+                "ai_status": s.ai_status,
+                "ai_note": s.ai_note,
+            }
+            for s in question.steps
+        ],
+    }
+
+
+def _apply_grading(result: GradingResult, question: Question, grading: dict):
+    for step_result in grading.get("steps", []):
+        for step in question.steps:
+            if step.step_key == step_result.get("step_key"):
+                step.obtained_marks = step_result.get("obtained_marks")
+                step.ai_obtained_marks = step.obtained_marks
+                step.ai_status = step_result.get("ai_status", "low_confidence")
+                step.ai_note = step_result.get("ai_note")
+
+    result.obtained_marks = grading.get("obtained_marks")
+    result.ai_obtained_marks = result.obtained_marks
+    result.confidence = grading.get("confidence", "low")
+    result.ai_remark = grading.get("ai_remark", "")
+
+
+def _grade_clusters(answer_key_id: Optional[str], exam_title: Optional[str], threshold: float):
+    """
+    Background task: cluster every ungraded answer per question and grade one
+    representative per cluster. Previously graded high-confidence answers join
+    clustering as preferred representatives, so their grade is reused for free.
+    """
+    conds = _exam_filter(answer_key_id, exam_title)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(GradingResult, Question, GradingSession.answer_key_id)
+            .join(Question, GradingResult.question_id == Question.id)
+            .join(GradingSession, Question.session_id == GradingSession.id)
+            .options(selectinload(Question.steps))
+            .filter(*conds, GradingSession.status.in_(("pending", "ready", "completed")))
+            .all()
+        )
+
+        # Q3 of one answer key is not Q3 of another (an exam_title can span several keys),
+        # so answers only cluster with the same question of the same key / marking scheme
+        by_question: dict[tuple, list] = defaultdict(list)
+        for result, question, key_id in rows:
+            scheme = key_id or question.scheme_hash or question.question_text
+            by_question[(scheme, question.q_number)].append((result, question))
+
+        touched: set[str] = set()
+        calls = answers = 0
+        for items in by_question.values():
+            pending = [
+                (r, q) for r, q in items
+                if r.ai_obtained_marks is None and r.obtained_marks is None and not r.is_finalised
+            ]
+            if not pending:
+                continue
+            trusted = [
+                (r, q) for r, q in items
+                if r.ai_obtained_marks is not None and r.confidence == "high" and not r.is_propagated
+            ]
+            candidates = pending + trusted
+            leaders = set(range(len(pending), len(candidates)))
+
+            for members in cluster_transcripts([r.transcript for r, _ in candidates], threshold, leaders):
+                targets = [candidates[i] for i in members if i not in leaders]
+                if not targets:
+                    continue
+                rep_result, rep_question = candidates[members[0]]
+
+                if members[0] in leaders:
+                    grading = _grading_from_result(rep_result, rep_question)
+                else:
+                    grading = grade_answer(
+                        question_text=rep_question.question_text,
+                        question_type=rep_question.question_type,
+                        max_marks=rep_question.max_marks,
+                        marking_scheme=[
+                            {"step_key": s.step_key, "label": s.label, "max_marks": s.max_marks}
+                            for s in rep_question.steps
+                        ],
+                        student_text=rep_result.transcript,
+                    )
+                    calls += 1
+
+                cluster_id = rep_result.cluster_id or str(uuid.uuid4())
+                rep_result.cluster_id = cluster_id
+                for result, question in targets:
+                    _apply_grading(result, question, grading)
+                    result.cluster_id = cluster_id
+                    result.is_propagated = result is not rep_result
+                    touched.add(question.session_id)
+                    answers += 1
+
+        db.flush()
+        totals = dict(
+            db.query(Question.session_id, func.coalesce(func.sum(GradingResult.obtained_marks), 0.0))
+            .join(GradingResult, GradingResult.question_id == Question.id)
+            .join(GradingSession, Question.session_id == GradingSession.id)
+            .filter(*conds)
+            .group_by(Question.session_id)
+            .all()
+        )
+        for session in db.query(GradingSession).filter(GradingSession.id.in_(touched)):
+            session.obtained_marks = totals.get(session.id, 0.0)
+            session.version += 1
+            if session.status == "pending":
+                session.status = "ready"
+        db.commit()
+        print(f"[clusters] Graded {answers} answers with {calls} grading calls")
+    except Exception as e:
+        db.rollback()
+        print(f"[clusters] Cluster grading failed: {e}")
+    finally:
+        db.close()
+
+
+# ── Routes ────────────────────────────────────────────────────────────────────
+
+@router.post("/grade", status_code=202)
+def grade_clusters(body: ClusterGradeRequest, x_tenant_id: Optional[str] = Header(None)):
+    """Queue the cluster grading stage for every ungraded answer of an exam (bulk priority)."""
+    _exam_filter(body.answer_key_id, body.exam_title)  # validate before queueing
+    enqueue(_grade_clusters, body.answer_key_id, body.exam_title, body.threshold,
+            tenant=x_tenant_id or "default", priority=BULK)
+    return {"status": "queued"}
+
+
+@router.get("")
+async def list_clusters(
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    q_number: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Clusters for an exam, largest first, so a teacher can review each one as a unit."""
+    query = (
+        select(
+            GradingResult.cluster_id, GradingResult.id, GradingResult.transcript,
+            GradingResult.obtained_marks, GradingResult.is_propagated,
+            Question.q_number, GradingSession.id.label("session_id"), GradingSession.student_name,
+        )
+        .join(Question, GradingResult.question_id == Question.id)
+        .join(GradingSession, Question.session_id == GradingSession.id)
+        .where(GradingResult.cluster_id.isnot(None), *_exam_filter(answer_key_id, exam_title))
+    )
+    if q_number is not None:
+        query = query.where(Question.q_number == q_number)
+
+    clusters: dict[str, dict] = {}
+    for row in (await db.execute(query)).all():
+        c = clusters.setdefault(row.cluster_id, {
+            "clusterId": row.cluster_id,
+            "qNumber": row.q_number,
+            "obtainedMarks": None,
+            "members": [],
+        })
+        if not row.is_propagated:
+            c["obtainedMarks"] = row.obtained_marks
+        c["members"].append({
+            "resultId": row.id,
+            "sessionId": row.session_id,
+            "studentName": row.student_name,
+            "transcript": row.transcript,
+            "obtainedMarks": row.obtained_marks,
+            "propagated": row.is_propagated,
+        })
+
+    return sorted(
+        ({**c, "size": len(c["members"])} for c in clusters.values()),
+        key=lambda c: (c["qNumber"], -c["size"]),
+    )
+
+
+@router.patch("/{cluster_id}/marks")
+def update_cluster_marks(cluster_id: str, update: ClusterMarkUpdate, db: Session = Depends(get_db)):
+    """Apply the same step- or question-level mark to every answer in the cluster, all or nothing."""
+    members = (
+        db.query(Question)
+        .join(GradingResult, GradingResult.question_id == Question.id)
+        .options(selectinload(Question.steps))
+        .filter(GradingResult.cluster_id == cluster_id, GradingResult.is_finalised.is_(False))
+        .all()
+    )
+    if not members:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    # Validate every member before editing any, so a bad step can't leave the cluster half-updated
+    if update.step_id and any(all(s.step_key != update.step_id for s in q.steps) for q in members):
+        raise HTTPException(status_code=404, detail="Step not found")
+
+    try:
+        for question in members:
+            apply_mark_updates(db, question.session_id, [MarkUpdate(
+                question_id=question.id,
+                step_id=update.step_id,
+                obtained_marks=update.obtained_marks,
+            )], commit=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"ok": True, "updated": len(members)}
@@ -1,24 +1,276 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from datetime import datetime
+from typing import Optional
 import csv
 import io
 import json
 
-from database import get_db
+from database import get_async_db, SessionLocal
 from models.session import GradingSession
+from models.question import Question, QuestionStep
+from models.result import GradingResult
+from services.columnar_export import stream_columnar, PYARROW_AVAILABLE
 
 router = APIRouter(prefix="/sessions", tags=["export"])
 
+# Rows pulled from the DB cursor per round trip, and bytes buffered before each yield
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+BATCH_CSV_HEADER = [
+    "Session ID", "Student", "Subject", "Exam", "Status", "Session Total", "Session Obtained",
+    "Q#", "Question", "Type", "Max Marks", "Obtained Marks", "Confidence", "AI Remark",
+]
+
+
+@router.get("/export/batch")
+def export_batch(
+    format: str = "csv",
+    exam_title: Optional[str] = None,
+    subject: Optional[str] = None,
+    status: Optional[str] = None,          # comma-separated
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """
+    Export every matching session in one download, streamed as it is read.
+    ?format=csv     → one row per question
+    ?format=ndjson  → one JSON object per session
+    """
+    # Plain columns rather than ORM entities: no identity map to grow while streaming
+    query = (
+        select(
+            GradingSession.id.label("session_id"),
+            GradingSession.student_name,
+            GradingSession.subject,
+            GradingSession.exam_title,
+            GradingSession.status,
+            GradingSession.total_marks.label("session_total"),
+            GradingSession.obtained_marks.label("session_obtained"),
+            Question.q_number,
+            Question.question_text,
+            Question.question_type,
+            Question.max_marks,
+            GradingResult.obtained_marks,
+            GradingResult.confidence,
+            GradingResult.ai_remark,
+        )
+        .join(Question, Question.session_id == GradingSession.id)
+        .outerjoin(GradingResult, GradingResult.question_id == Question.id)
+    )
+    query = _filter_sessions(
+        query,
+        exam_title=exam_title,
+        subject=subject,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    # Rows for one session stay contiguous so NDJSON can group them without buffering
+    query = query.order_by(GradingSession.created_at, GradingSession.id, Question.q_number)
+
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M")
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_ndjson(query),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="gradeglide_export_{stamp}.ndjson"'},
+        )
+    return StreamingResponse(
+        _stream_csv(query),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="gradeglide_export_{stamp}.csv"'},
+    )
+
+
+@router.get("/export/columnar")
+def export_columnar(
+    format: str = "parquet",
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """
+    Export question- and step-level marks for analysis tools.
+    ?format=parquet  → Parquet (zstd), one row group per record batch
+    ?format=arrow    → Arrow IPC file, memory-mappable
+    Question rows have a null step_key; step rows carry ai_status instead of confidence.
+    """
+    if format not in ("parquet", "arrow"):
+        raise HTTPException(status_code=422, detail="format must be 'parquet' or 'arrow'")
+    if not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Columnar export needs pyarrow — pip install pyarrow")
+
+    filters = dict(
+        answer_key_id=answer_key_id,
+        exam_title=exam_title,
+        created_from=created_from,
+        created_to=created_to,
+    )
+    question_rows = _filter_sessions(
+        select(
+            GradingSession.id, Question.q_number, Question.max_marks,
+            GradingResult.obtained_marks, GradingResult.confidence,
+        )
+        .join(Question, Question.session_id == GradingSession.id)
+        .outerjoin(GradingResult, GradingResult.question_id == Question.id),
+        **filters,
+    )
+    step_rows = _filter_sessions(
+        select(
+            GradingSession.id, Question.q_number, QuestionStep.step_key, QuestionStep.max_marks,
+            QuestionStep.obtained_marks, QuestionStep.ai_status,
+        )
+        .join(Question, Question.session_id == GradingSession.id)
+        .join(QuestionStep, QuestionStep.question_id == Question.id),
+        **filters,
+    )
+
+    def rows():
+        for sid, q_num, max_marks, obtained, confidence in _iter_rows(question_rows):
+            yield sid, q_num, None, float(max_marks), obtained, confidence, None
+        for sid, q_num, step_key, max_marks, obtained, ai_status in _iter_rows(step_rows):
+            yield sid, q_num, step_key, max_marks, obtained, None, ai_status
+
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M")
+    ext, media_type = (
+        ("arrow", "application/vnd.apache.arrow.file") if format == "arrow"
+        else ("parquet", "application/vnd.apache.parquet")
+    )
+    return StreamingResponse(
+        stream_columnar(rows(), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="gradeglide_marks_{stamp}.{ext}"'},
+    )
+
+
+def _filter_sessions(
+    query,
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    subject: Optional[str] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """Apply the shared export filters to a query that already selects from grading_sessions."""
+    if answer_key_id:
+        query = query.where(GradingSession.answer_key_id == answer_key_id)
+    if exam_title:
+        query = query.where(GradingSession.exam_title == exam_title)
+    if subject:
+        query = query.where(GradingSession.subject == subject)
+    if status:
+        query = query.where(GradingSession.status.in_([v.strip() for v in status.split(",") if v.strip()]))
+    if created_from:
+        query = query.where(GradingSession.created_at >= created_from)
+    if created_to:
+        query = query.where(GradingSession.created_at < created_to)
+    return query
+
+
+def _iter_rows(query):
+    """
+    Yield flat export rows from a server-side cursor.
+    Owns its DB session: request-scoped ones are closed before a streamed body is sent.
+    """
+    db = SessionLocal()
+    try:
+        yield from db.execute(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+    finally:
+        db.close()
+
+
+def _stream_csv(query):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # UTF-8 BOM for Excel compatibility
+    writer.writerow(BATCH_CSV_HEADER)
+
+    for row in _iter_rows(query):
+        writer.writerow([
+            row.session_id,
+            row.student_name,
+            row.subject,
+            row.exam_title or "",
+            row.status,
+            row.session_total,
+            row.session_obtained,
+            row.q_number,
+            row.question_text,
+            row.question_type,
+            row.max_marks,
+            row.obtained_marks if row.obtained_marks is not None else "",
+            row.confidence or "low",
+            row.ai_remark or "",
+        ])
+        if buf.tell() >= EXPORT_CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue().encode("utf-8")
+
+
+def _stream_ndjson(query):
+    current = None
+    chunk = []
+    size = 0
+
+    def _line(record: dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    for row in _iter_rows(query):
+        if current is None or current["sessionId"] != row.session_id:
+            if current is not None:
+                line = _line(current)
+                chunk.append(line)
+                size += len(line)
+                if size >= EXPORT_CHUNK_BYTES:
+                    yield b"".join(chunk)
+                    chunk, size = [], 0
+            current = {
+                "sessionId": row.session_id,
+                "student": row.student_name,
+                "subject": row.subject,
+                "examTitle": row.exam_title,
+                "status": row.status,
+                "totalMarks": row.session_total,
+                "obtainedMarks": row.session_obtained,
+                "questions": [],
+            }
+        current["questions"].append({
+            "question": row.q_number,
+            "questionText": row.question_text,
+            "type": row.question_type,
+            "maxMarks": row.max_marks,
+            "obtainedMarks": row.obtained_marks,
+            "confidence": row.confidence or "low",
+            "aiRemark": row.ai_remark or "",
+        })
+
+    if current is not None:
+        chunk.append(_line(current))
+    yield b"".join(chunk)
+
 
 @router.get("/{session_id}/export")
-def export_session(session_id: str, format: str = "json", db: Session = Depends(get_db)):
+async def export_session(session_id: str, format: str = "json", db: AsyncSession = Depends(get_async_db)):
     """
     Export a completed grading session.
     ?format=json  → full JSON
     ?format=csv   → spreadsheet-friendly CSV
     """
-    session = db.get(GradingSession, session_id)
+    session = await db.get(
+        GradingSession,
+        session_id,
+        options=[selectinload(GradingSession.questions).selectinload(Question.result)],
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
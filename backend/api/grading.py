@@ -1,12 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, and_, or_, update, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
+import base64
+import hashlib
 
-from database import get_db
+from database import get_db, get_async_db
 from models.session import GradingSession
-from models.question import Question, QuestionStep
-from models.result import GradingResult
+from models.question import Question
+from services.grading_router import routing_summary
+from services.image_cache import derivative_url, crop_param
 
 router = APIRouter(prefix="/sessions", tags=["grading"])
 
@@ -19,8 +26,42 @@ class MarkUpdate(BaseModel):
     obtained_marks: Optional[float] = None
 
 
+class BatchMarkUpdate(BaseModel):
+    version: Optional[int] = None   # session version the client last saw; None skips the check
+    updates: list[MarkUpdate]
+
+
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
+# Async sessions can't lazy-load, so everything _session_to_dict touches is fetched up front
+SESSION_DETAIL_OPTIONS = [
+    selectinload(GradingSession.images),
+    selectinload(GradingSession.questions).selectinload(Question.steps),
+    selectinload(GradingSession.questions).selectinload(Question.result),
+]
+
+
+# Review pane / per-question crop widths; the UI scales the image, so bboxes (percent) still line up
+ANSWER_SHEET_WIDTH = 1600
+CROP_WIDTH = 960
+
+
+def _page_image_url(session: GradingSession, page_number: int, width: int, bbox: dict | None = None) -> str | None:
+    page = session.page_images().get(page_number)
+    if not page:
+        return None
+    if page.blob_key:
+        return derivative_url(page.blob_key, width, bbox=bbox)
+    # Sessions stored before the blob store: address the page through the session
+    url = f"/images/sessions/{session.id}/pages/{page_number}?w={width}&fmt=webp"
+    crop = crop_param(bbox)
+    return f"{url}&crop={crop}" if crop else url
+
+
+def _answer_sheet_url(session: GradingSession) -> str | None:
+    return _page_image_url(session, 1, ANSWER_SHEET_WIDTH)
+
+
 def _session_to_dict(session: GradingSession) -> dict:
     """Shape the DB session into the format GradingReview.jsx expects."""
     questions = []
@@ -38,6 +79,7 @@ def _session_to_dict(session: GradingSession) -> dict:
                 "aiNote": s.ai_note,
             })
 
+        bbox = q.bbox or {"x": 0, "y": q.q_number * 25, "w": 100, "h": 25}
         q_dict = {
             "id": q.q_number,
             "question": q.question_text,
@@ -47,8 +89,12 @@ def _session_to_dict(session: GradingSession) -> dict:
             "aiRemark": result.ai_remark if result else "",
             "status": _derive_status(result),
             "confidence": result.confidence if result else "low",
-            "bbox": q.bbox or {"x": 0, "y": q.q_number * 25, "w": 100, "h": 25},
+            "bbox": bbox,
+            "cropUrl": _page_image_url(session, bbox.get("page", 1), CROP_WIDTH, bbox) if q.bbox else None,
             "transcript": result.transcript if result else "",
+            "clusterId": result.cluster_id if result else None,
+            "propagated": bool(result and result.is_propagated),
+            "route": result.grading_route if result else None,
             "steps": steps if steps else None,
         }
         questions.append(q_dict)
@@ -59,15 +105,141 @@ def _session_to_dict(session: GradingSession) -> dict:
         "totalMarks": session.total_marks,
         "obtainedMarks": session.obtained_marks,
         "status": session.status,
+        "version": session.version,
+        "routing": routing_summary([q["route"] for q in questions]),
         "questions": questions,
-        # Serve the first uploaded image as the answer sheet photo
-        "answerSheetUrl": (
-            f"/uploads/{session.id}/page_1.png"
-            if session.images else None
-        ),
+        # Serve the first rendered page, downscaled, as the answer sheet photo
+        "answerSheetUrl": _answer_sheet_url(session),
     }
 
 
+def _session_summary(s: GradingSession) -> dict:
+    """Compact row used by the batch list and the dashboard activity feed."""
+    return {
+        "id": s.id,
+        "studentName": s.student_name,
+        "subject": s.subject,
+        "examTitle": s.exam_title,
+        "batchId": s.batch_id,
+        "totalMarks": s.total_marks,
+        "obtainedMarks": s.obtained_marks,
+        "status": s.status,
+        "createdAt": s.created_at.isoformat(),
+    }
+
+
+def _encode_cursor(s: GradingSession) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a row."""
+    raw = f"{s.created_at.isoformat()}|{s.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), session_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _load_questions(db: Session, session_id: str, keys: set[str]) -> dict[str, Question]:
+    """
+    Fetch only the questions referenced by `keys`, with steps and result eager-loaded.
+    A key may be the Question.id or the q_number the review payload exposes as "id".
+    """
+    numbers = [int(k) for k in keys if k.isdigit()]
+    rows = (
+        db.query(Question)
+        .options(selectinload(Question.steps), selectinload(Question.result))
+        .filter(
+            Question.session_id == session_id,
+            or_(Question.id.in_(keys), Question.q_number.in_(numbers)),
+        )
+        .all()
+    )
+    lookup = {}
+    for q in rows:
+        lookup[str(q.q_number)] = q
+        lookup[q.id] = q
+    return lookup
+
+
+def apply_mark_updates(
+    db: Session,
+    session_id: str,
+    updates: list[MarkUpdate],
+    expected_version: Optional[int] = None,
+    commit: bool = True,
+) -> tuple[float, int]:
+    """
+    Apply step/question mark edits in one transaction and move the session
+    total by the summed delta instead of re-summing every question.
+    Returns (session_total, new_version); raises 409 on a version mismatch.
+    commit=False leaves the transaction open so a caller can edit several sessions atomically.
+    """
+    questions = _load_questions(db, session_id, {u.question_id for u in updates})
+
+    delta = 0.0
+    for u in updates:
+        question = questions.get(u.question_id)
+        if not question:
+            raise HTTPException(status_code=404, detail=f"Question '{u.question_id}' not found")
+        result = question.result
+        before = (result.obtained_marks or 0) if result else 0
+
+        if u.step_id:
+            # Update individual step mark
+            step = next((s for s in question.steps if s.step_key == u.step_id), None)
+            if not step:
+                raise HTTPException(status_code=404, detail="Step not found")
+            step.obtained_marks = u.obtained_marks
+            step.ai_status = "correct" if (u.obtained_marks or 0) >= step.max_marks else "incorrect"
+
+            # Question total is re-derived from its own steps only
+            if result:
+                result.obtained_marks = sum((s.obtained_marks or 0) for s in question.steps)
+        elif result:
+            # Update question-level mark directly (SHORT_ANSWER)
+            result.obtained_marks = u.obtained_marks
+
+        if result:
+            delta += (result.obtained_marks or 0) - before
+
+    # Compare-and-set on the version so concurrent editors can't silently overwrite each other
+    stmt = update(GradingSession).where(GradingSession.id == session_id)
+    if expected_version is not None:
+        stmt = stmt.where(GradingSession.version == expected_version)
+    stmt = stmt.values(
+        obtained_marks=GradingSession.obtained_marks + delta,
+        version=GradingSession.version + 1,
+    )
+    if db.execute(stmt).rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Session was modified elsewhere — reload and retry")
+    if commit:
+        db.commit()
+
+    total, version = (
+        db.query(GradingSession.obtained_marks, GradingSession.version)
+        .filter(GradingSession.id == session_id)
+        .one()
+    )
+    return total, version
+
+
+def _session_etag(session_id: str, version: int, updated_at: Optional[datetime]) -> str:
+    """Strong validator for the review payload — changes whenever marks, status or version do."""
+    raw = f"{session_id}:{version}:{updated_at.isoformat() if updated_at else ''}"
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 def _derive_status(result) -> str:
     if not result or result.obtained_marks is None:
         return "partial"
@@ -80,67 +252,128 @@ def _derive_status(result) -> str:
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @router.get("")
-def list_sessions(db: Session = Depends(get_db)):
-    """List all grading sessions (for GradingWorkspace batch list)."""
-    sessions = db.query(GradingSession).order_by(GradingSession.created_at.desc()).all()
-    return [
-        {
-            "id": s.id,
-            "studentName": s.student_name,
-            "subject": s.subject,
-            "examTitle": s.exam_title,
-            "totalMarks": s.total_marks,
-            "obtainedMarks": s.obtained_marks,
-            "status": s.status,
-            "createdAt": s.created_at.isoformat(),
-        }
-        for s in sessions
-    ]
+async def list_sessions(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,          # comma-separated, e.g. "ready,completed"
+    subject: Optional[str] = None,
+    exam_title: Optional[str] = None,      # case-insensitive substring match
+    batch_id: Optional[str] = None,        # sessions split from one class upload
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    List grading sessions (for GradingWorkspace batch list), newest first.
+    Keyset-paginated on (created_at, id): pass the returned nextCursor back
+    as ?cursor= to fetch the following page.
+    """
+    query = select(GradingSession)
+
+    if status:
+        query = query.where(GradingSession.status.in_([v.strip() for v in status.split(",") if v.strip()]))
+    if subject:
+        query = query.where(GradingSession.subject == subject)
+    if exam_title:
+        query = query.where(GradingSession.exam_title.ilike(f"%{exam_title}%"))
+    if batch_id:
+        query = query.where(GradingSession.batch_id == batch_id)
+    if created_from:
+        query = query.where(GradingSession.created_at >= created_from)
+    if created_to:
+        query = query.where(GradingSession.created_at < created_to)
+
+    # Count before the cursor is applied so it reflects the whole filtered set
+    total = None
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+
+    if cursor:
+        c_created_at, c_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            GradingSession.created_at < c_created_at,
+            and_(GradingSession.created_at == c_created_at, GradingSession.id < c_id),
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.scalars(
+        query.order_by(GradingSession.created_at.desc(), GradingSession.id.desc())
+        .limit(limit + 1)
+    )).all()
+    page = rows[:limit]
+
+    return {
+        "items": [_session_summary(s) for s in page],
+        "nextCursor": _encode_cursor(page[-1]) if len(rows) > limit else None,
+        "total": total,
+    }
 
 
 @router.get("/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_db)):
     """Aggregate metrics and recent activity for the Dashboard page."""
-    all_sessions = db.query(GradingSession).all()
-
-    total = len(all_sessions)
-    completed = sum(1 for s in all_sessions if s.status == "completed")
-    processing = sum(1 for s in all_sessions if s.status in ("processing", "pending"))
+    # Counts are aggregated in SQL so the cost doesn't grow with Python-side rows
+    status_counts = dict((await db.execute(
+        select(GradingSession.status, func.count(GradingSession.id))
+        .group_by(GradingSession.status)
+    )).all())
+    total = sum(status_counts.values())
+    completed = status_counts.get("completed", 0)
+    processing = status_counts.get("processing", 0) + status_counts.get("pending", 0)
 
     # Distinct subjects seen (proxy for "answer keys used")
-    subjects = list({s.subject for s in all_sessions if s.subject})
+    unique_subjects = await db.scalar(
+        select(func.count(func.distinct(GradingSession.subject)))
+        .where(GradingSession.subject.isnot(None), GradingSession.subject != "")
+    )
 
     # 5 most recent sessions for the activity feed
-    recent = sorted(all_sessions, key=lambda s: s.created_at, reverse=True)[:5]
+    recent = (await db.scalars(
+        select(GradingSession)
+        .order_by(GradingSession.created_at.desc())
+        .limit(5)
+    )).all()
 
     return {
         "totalPapersGraded": total,
         "completed": completed,
         "processing": processing,
-        "uniqueSubjects": len(subjects),
-        "recentSessions": [
-            {
-                "id": s.id,
-                "studentName": s.student_name,
-                "subject": s.subject,
-                "examTitle": s.exam_title,
-                "totalMarks": s.total_marks,
-                "obtainedMarks": s.obtained_marks,
-                "status": s.status,
-                "createdAt": s.created_at.isoformat(),
-            }
-            for s in recent
-        ],
+        "uniqueSubjects": unique_subjects or 0,
+        "recentSessions": [_session_summary(s) for s in recent],
     }
 
 
 @router.get("/{session_id}")
-def get_session(session_id: str, db: Session = Depends(get_db)):
+async def get_session(
+    session_id: str,
+    request: Request,
+    v: Optional[int] = None,   # pin to a version; a finalised, pinned read is served as immutable
+    db: AsyncSession = Depends(get_async_db),
+):
     """Full session data — matches MOCK_EXAM_DATA shape in GradingReview."""
-    session = db.get(GradingSession, session_id)
-    if not session:
+    # Check the validator from the session row alone before loading the question graph
+    head = (await db.execute(
+        select(GradingSession.status, GradingSession.version, GradingSession.updated_at)
+        .where(GradingSession.id == session_id)
+    )).first()
+    if not head:
         raise HTTPException(status_code=404, detail="Session not found")
-    return _session_to_dict(session)
+    status, version, updated_at = head
+
+    headers = {}
+    # Questions are still being written while processing, so only validate settled sessions
+    if status not in ("pending", "processing"):
+        headers["ETag"] = _session_etag(session_id, version, updated_at)
+        if status == "completed" and v == version:
+            headers["Cache-Control"] = "private, max-age=31536000, immutable"
+        else:
+            headers["Cache-Control"] = "private, no-cache"
+        if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+    session = await db.get(GradingSession, session_id, options=SESSION_DETAIL_OPTIONS)
+    return ORJSONResponse(_session_to_dict(session), headers=headers)
 
 
 @router.patch("/{session_id}/marks")
@@ -150,35 +383,26 @@ def update_marks(session_id: str, update: MarkUpdate, db: Session = Depends(get_
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if update.step_id:
-        # Update individual step mark
-        step = db.query(QuestionStep).filter_by(
-            question_id=update.question_id,
-            step_key=update.step_id,
-        ).first()
-        if not step:
-            raise HTTPException(status_code=404, detail="Step not found")
-        step.obtained_marks = update.obtained_marks
-        step.ai_status = "correct" if (update.obtained_marks or 0) >= step.max_marks else "incorrect"
-
-        # Recalculate question total from steps
-        question = db.get(Question, update.question_id)
-        if question and question.result:
-            question.result.obtained_marks = sum(
-                (s.obtained_marks or 0) for s in question.steps
-            )
-    else:
-        # Update question-level mark directly (SHORT_ANSWER)
-        result = db.query(GradingResult).filter_by(question_id=update.question_id).first()
-        if result:
-            result.obtained_marks = update.obtained_marks
+    total, version = apply_mark_updates(db, session_id, [update])
+    return {"ok": True, "sessionTotal": total, "version": version}
 
-    # Recalculate session total
-    session.obtained_marks = sum(
-        (q.result.obtained_marks or 0) for q in session.questions if q.result
-    )
-    db.commit()
-    return {"ok": True, "sessionTotal": session.obtained_marks}
+
+@router.patch("/{session_id}/marks/batch")
+def update_marks_batch(session_id: str, body: BatchMarkUpdate, db: Session = Depends(get_db)):
+    """
+    Save many step/question mark edits in one round trip.
+    Pass the session `version` from GET /sessions/{id} to get a 409 instead of
+    overwriting edits made elsewhere since that read.
+    """
+    session = db.get(GradingSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if not body.updates:
+        return {"ok": True, "sessionTotal": session.obtained_marks, "version": session.version}
+
+    total, version = apply_mark_updates(db, session_id, body.updates, body.version)
+    return {"ok": True, "sessionTotal": total, "version": version}
 
 
 @router.post("/{session_id}/finalise")
@@ -192,5 +416,6 @@ def finalise_session(session_id: str, db: Session = Depends(get_db)):
         if q.result:
             q.result.is_finalised = True
     session.status = "completed"
+    session.version += 1
     db.commit()
     return {"ok": True, "status": "completed"}
@@ -0,0 +1,98 @@
+"""
+images.py — Page images and question crops at the size the client asks for.
+
+Routes:
+  GET /images/{key}?w=&fmt=&crop=                          derivative of a page blob
+  GET /images/sessions/{id}/pages/{n}?w=&fmt=&crop=        same, addressed by rendered page (n from 1)
+
+w is rounded up to the width ladder in services/image_cache.py, fmt is
+webp | jpeg | png, crop is "x,y,w,h" in percent of the page (a question's bbox).
+Responses support ETag / If-None-Match and byte ranges.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models.blob import Blob
+from models.session import AnswerSheetImage
+from services.blob_store import is_blob_key
+from services.image_cache import FORMATS, DerivativeSpec, derivative_cache, parse_crop, snap_width, source_version
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+# Blob-key URLs name their content, so their derivatives never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Session page URLs can point at a different file if a page is ever replaced — revalidate
+REVALIDATE = "public, max-age=300, must-revalidate"
+
+
+def _spec(w: Optional[int], fmt: str, crop: Optional[str]) -> DerivativeSpec:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"fmt must be one of {', '.join(FORMATS)}")
+    try:
+        return DerivativeSpec(width=snap_width(w), fmt=fmt, crop=parse_crop(crop))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _serve(ref: str, spec: DerivativeSpec, request: Request, cache_control: str):
+    try:
+        version = source_version(ref)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{derivative_cache.digest(version, spec)}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    # Answer revalidations without touching the cache or the source
+    if etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = derivative_cache.get_or_render(ref, version, spec)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except OSError as e:
+        print(f"[images] Could not render {ref}: {e}")
+        raise HTTPException(status_code=422, detail="Source is not a readable image")
+    # FileResponse handles Range / If-Range and Content-Length
+    return FileResponse(path, media_type=FORMATS[spec.fmt], headers=headers)
+
+
+@router.get("/sessions/{session_id}/pages/{page_number}")
+def session_page_image(
+    session_id: str,
+    page_number: int,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1),
+    fmt: str = "webp",
+    crop: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    spec = _spec(w, fmt, crop)
+    page = next((
+        img for img in db.query(AnswerSheetImage)
+        .filter(AnswerSheetImage.session_id == session_id, AnswerSheetImage.page_number == page_number)
+        if img.is_page
+    ), None)
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return _serve(page.blob_key or page.file_path, spec, request, REVALIDATE)
+
+
+@router.get("/{key:path}")
+def blob_image(
+    key: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1),
+    fmt: str = "webp",
+    crop: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    spec = _spec(w, fmt, crop)
+    if not is_blob_key(key):
+        raise HTTPException(status_code=404, detail="Image not found")
+    blob = db.get(Blob, key)
+    if not blob or blob.refcount < 0:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return _serve(key, spec, request, IMMUTABLE)
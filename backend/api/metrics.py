@@ -0,0 +1,76 @@
+"""
+metrics.py — Operational metrics and per-session pipeline timings.
+
+Routes:
+  GET /metrics                          Prometheus text exposition
+  GET /metrics/sessions/{id}            stage timing spans of a session's last run
+  GET /metrics/sessions/{id}/profile    top functions from an opt-in cProfile capture
+"""
+import io
+import json
+import pstats
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import get_db, get_async_db
+from models.session import GradingSession
+from services.blob_store import blob_store
+from services.metrics import Gauge, register, render_all
+from services.job_queue import GRADING_WORKER, queued_counts
+from services.admission import admission
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+register(Gauge(
+    "gradeglide_admitted_inflight", "Work admitted on this API node and not yet finished, by resource",
+    admission.snapshot, label="resource",
+))
+if GRADING_WORKER == "external":
+    # The scheduler lives in the worker process, which serves its own /metrics
+    # (WORKER_METRICS_PORT) with the pipeline counters; report the jobs table here
+    register(Gauge(
+        "gradeglide_jobs", "Jobs in the worker queue table, by status",
+        queued_counts, label="status",
+    ))
+
+
+@router.get("", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_all(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/sessions/{session_id}")
+async def session_timings(session_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Spans in execution order plus the total time per stage."""
+    session = await db.get(GradingSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    spans = json.loads(session.timings_json) if session.timings_json else []
+    totals: dict[str, float] = {}
+    for s in spans:
+        totals[s["stage"]] = round(totals.get(s["stage"], 0.0) + s["ms"], 2)
+    return {"sessionId": session_id, "spans": spans, "totalsMs": totals}
+
+
+@router.get("/sessions/{session_id}/profile", response_class=PlainTextResponse)
+def session_profile(
+    session_id: str,
+    limit: int = Query(40, ge=1, le=500),
+    sort: str = "cumulative",
+    db: Session = Depends(get_db),
+):
+    """Top functions of a run uploaded with profile=true, read from the blob store."""
+    session = db.get(GradingSession, session_id)
+    if not session or not session.profile_blob_key:
+        raise HTTPException(status_code=404, detail="No profile captured for this session")
+    out = io.StringIO()
+    try:
+        with blob_store.local_path(session.profile_blob_key) as path:
+            stats = pstats.Stats(path, stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown sort key '{sort}'")
+    return PlainTextResponse(out.getvalue())
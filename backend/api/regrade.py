@@ -0,0 +1,317 @@
+"""
+regrade.py — Incremental re-grading after an answer key changes.
+
+Routes:
+  POST /regrade   regrade a session, an exam batch or every session of an answer key
+"""
+import hashlib
+import io
+import json
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.orm import Session, selectinload
+
+from database import get_db, SessionLocal
+from models.session import GradingSession
+from models.question import Question, QuestionStep
+from models.result import GradingResult
+from models.answer_key import AnswerKey
+from models.similarity import TranscriptSignature, LshBucket
+from services.grading_router import route_answers, routing_summary
+from services.ocr_service import locate_questions
+from services.scheduler import BULK
+from services.job_queue import enqueue
+from services.blob_store import blob_store
+from api.similarity import index_committed
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+router = APIRouter(prefix="/regrade", tags=["regrade"])
+
+
+# ── Pydantic schemas ──────────────────────────────────────────────────────────
+
+class RegradeRequest(BaseModel):
+    session_id: Optional[str] = None
+    exam_title: Optional[str] = None
+    # Scheme to apply; defaults to each session's own answer key
+    answer_key_id: Optional[str] = None
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def scheme_fingerprint(q_scheme: dict) -> str:
+    """Stable hash of everything in an answer-key entry that affects grading."""
+    relevant = {
+        "type": q_scheme.get("type"),
+        "text": q_scheme.get("text"),
+        "max_marks": float(q_scheme.get("max_marks") or 0),
+        "answer": q_scheme.get("answer"),
+        "steps": [
+            [s.get("step_key"), s.get("label"), float(s.get("max_marks") or 0)]
+            for s in q_scheme.get("steps", [])
+        ],
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+
+
+def _question_fingerprint(q: Question) -> str:
+    """Fingerprint for rows graded before scheme_hash existed (no model answer known)."""
+    return scheme_fingerprint({
+        "type": q.question_type,
+        "text": q.question_text,
+        "max_marks": q.max_marks,
+        "steps": [{"step_key": s.step_key, "label": s.label, "max_marks": s.max_marks} for s in q.steps],
+    })
+
+
+def _is_overridden(obtained: float | None, ai_obtained: float | None) -> bool:
+    return obtained is not None and obtained != ai_obtained
+
+
+def _page_crop(page: "Image.Image | None", bbox: dict | None) -> "Image.Image | None":
+    """Re-cut a question's crop from the stored page image using its saved bbox."""
+    if page is None or not bbox:
+        return None
+    w, h = page.size
+    return page.crop((
+        int(bbox["x"] / 100 * w), int(bbox["y"] / 100 * h),
+        int((bbox["x"] + bbox["w"]) / 100 * w), int((bbox["y"] + bbox["h"]) / 100 * h),
+    ))
+
+
+def _regrade_session(db: Session, session: GradingSession, scheme: dict) -> dict:
+    """
+    Bring one session in line with `scheme` ({q_number -> answer-key entry}).
+    Only added or changed questions are graded; transcripts come from the
+    stored results, and crops are re-cut from the stored page image.
+    Returns {"changed", "added", "removed", "routing"}.
+    """
+    from PIL import Image
+
+    existing = {q.q_number: q for q in session.questions}
+    page_refs = {n: img.blob_key or img.file_path for n, img in session.page_images().items()}
+    pages: dict[int, Image.Image | None] = {}
+    regions = None
+
+    def _page(number: int) -> Image.Image | None:
+        if number not in pages:
+            pages[number] = None
+            if number in page_refs:
+                try:
+                    pages[number] = Image.open(io.BytesIO(blob_store.read_bytes(page_refs[number]))).convert("RGB")
+                except Exception as e:
+                    print(f"[regrade] Could not open page {number} of session {session.id}: {e}")
+        return pages[number]
+
+    removed = [q for n, q in existing.items() if n not in scheme]
+    # Their copy-detection index rows go in the same transaction
+    removed_results = [q.result.id for q in removed if q.result]
+    if removed_results:
+        db.execute(delete(LshBucket).where(LshBucket.result_id.in_(removed_results)))
+        db.execute(delete(TranscriptSignature).where(TranscriptSignature.result_id.in_(removed_results)))
+    for q in removed:
+        db.delete(q)
+
+    work = []   # (question, item, previous step marks, previous result marks)
+    added = changed = 0
+    for q_num, q_scheme in scheme.items():
+        fingerprint = scheme_fingerprint(q_scheme)
+        question = existing.get(q_num)
+        if question is not None and fingerprint in (question.scheme_hash, _question_fingerprint(question)):
+            question.scheme_hash = fingerprint
+            continue
+
+        if question is None:
+            # New question: the only case that needs OCR again — searched for page by page, as on upload
+            if regions is None:
+                pages_in_order = (_page(n) for n in range(1, max(page_refs, default=0) + 1))
+                regions = locate_questions(pages_in_order, [n for n in scheme if n not in existing])
+            region = regions.get(q_num, {})
+            question = Question(
+                session_id=session.id,
+                q_number=q_num,
+                question_text=q_scheme["text"],
+                max_marks=q_scheme["max_marks"],
+                question_type=q_scheme["type"],
+                bbox_json=json.dumps(region.get("bbox_pct", {"x": 0, "y": q_num * 25, "w": 100, "h": 25})),
+            )
+            db.add(question)
+            db.flush()
+            transcript, crop = region.get("raw_text", ""), region.get("cropped_image")
+            prev_steps, prev_result = {}, None
+            added += 1
+        else:
+            transcript = question.result.transcript if question.result else ""
+            crop = _page_crop(_page((question.bbox or {}).get("page", 1)), question.bbox)
+            # Teacher overrides on steps that survive unchanged are carried over
+            prev_steps = {
+                (s.step_key, s.label, s.max_marks): s.obtained_marks
+                for s in question.steps
+                if _is_overridden(s.obtained_marks, s.ai_obtained_marks)
+            }
+            prev_result = question.result
+            question.question_text = q_scheme["text"]
+            question.max_marks = q_scheme["max_marks"]
+            question.question_type = q_scheme["type"]
+            question.steps.clear()
+            db.flush()
+            changed += 1
+
+        for i, step_def in enumerate(q_scheme.get("steps", [])):
+            question.steps.append(QuestionStep(
+                step_key=step_def["step_key"],
+                label=step_def["label"],
+                max_marks=step_def["max_marks"],
+                order_index=i,
+            ))
+        question.scheme_hash = fingerprint
+        work.append((question, {
+            "question_text": q_scheme["text"],
+            "question_type": q_scheme["type"],
+            "max_marks": q_scheme["max_marks"],
+            "marking_scheme": q_scheme.get("steps", []),
+            "student_text": transcript,
+            "cropped_image": crop,
+            "expected_answer": q_scheme.get("answer"),
+        }, prev_steps, prev_result))
+
+    gradings = route_answers([item for _, item, _, _ in work]) if work else []
+    for (question, item, prev_steps, prev_result), grading in zip(work, gradings):
+        by_key = {s.get("step_key"): s for s in grading.get("steps", [])}
+        for step in question.steps:
+            step_result = by_key.get(step.step_key, {})
+            step.ai_obtained_marks = step_result.get("obtained_marks")
+            step.ai_status = step_result.get("ai_status", "low_confidence")
+            step.ai_note = step_result.get("ai_note")
+            kept = prev_steps.get((step.step_key, step.label, step.max_marks))
+            step.obtained_marks = kept if kept is not None else step.ai_obtained_marks
+
+        obtained = grading.get("obtained_marks")
+        result = prev_result or GradingResult(question_id=question.id, transcript=item["student_text"])
+        if prev_result is None:
+            db.add(result)
+        # A question-level override only exists without steps; with steps the total is theirs
+        keep_total = result.is_finalised or (
+            not question.steps and _is_overridden(result.obtained_marks, result.ai_obtained_marks)
+        )
+        result.ai_obtained_marks = obtained
+        if keep_total and result.obtained_marks is not None:
+            # Teacher's mark stands, capped at the new maximum
+            result.obtained_marks = min(result.obtained_marks, question.max_marks)
+        elif any(s.obtained_marks is not None for s in question.steps):
+            # Re-derived from the rebuilt steps (carried-over overrides included), as apply_mark_updates does
+            result.obtained_marks = sum(s.obtained_marks or 0 for s in question.steps)
+        else:
+            result.obtained_marks = obtained
+        result.confidence = grading.get("confidence", "low")
+        result.ai_remark = grading.get("ai_remark", "")
+        result.grading_route = grading.get("route")
+        # A regraded answer no longer shares its cluster's grade
+        result.cluster_id = None
+        result.is_propagated = False
+
+    if work or removed:
+        db.flush()
+        db.expire(session, ["questions"])
+        session.total_marks = sum(q["max_marks"] for q in scheme.values())
+        session.obtained_marks = sum(
+            q.result.obtained_marks or 0.0 for q in session.questions if q.result
+        )
+        session.version += 1
+
+    return {
+        "changed": changed,
+        "added": added,
+        "removed": len(removed),
+        "routing": routing_summary([g.get("route") for g in gradings]),
+    }
+
+
+def _regrade(session_ids: list[str], answer_key_id: Optional[str]):
+    """Background task: regrade each session against its (or the given) answer key."""
+    db = SessionLocal()
+    try:
+        schemes: dict[str, dict] = {}
+        totals = defaultdict(int)
+        for session_id in session_ids:
+            session = (
+                db.query(GradingSession)
+                .options(
+                    selectinload(GradingSession.images),
+                    selectinload(GradingSession.questions).selectinload(Question.steps),
+                    selectinload(GradingSession.questions).selectinload(Question.result),
+                )
+                .filter(GradingSession.id == session_id)
+                .first()
+            )
+            # Deleted, or picked up by another upload, since the regrade was queued
+            if session is None or session.status not in ("pending", "ready", "completed"):
+                print(f"[regrade] Session {session_id} is gone or processing — skipping")
+                continue
+            key_id = answer_key_id or session.answer_key_id
+            if key_id not in schemes:
+                key = db.get(AnswerKey, key_id)
+                schemes[key_id] = {q["q_number"]: q for q in key.questions} if key else None
+            if schemes[key_id] is None:
+                print(f"[regrade] Answer key {key_id} not found — skipping session {session_id}")
+                continue
+
+            session.answer_key_id = key_id
+            try:
+                stats = _regrade_session(db, session, schemes[key_id])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[regrade] Failed to regrade session {session_id}: {e}")
+                continue
+            if stats["added"]:
+                # Added answers join copy detection once the regrade is committed
+                index_committed(db, [session_id])
+            for k in ("changed", "added", "removed"):
+                totals[k] += stats[k]
+            totals["modelCallsSaved"] += stats["routing"]["modelCallsSaved"]
+        print(f"[regrade] Regraded {len(session_ids)} sessions: {dict(totals)}")
+    finally:
+        db.close()
+
+
+# ── Routes ────────────────────────────────────────────────────────────────────
+
+@router.post("", status_code=202)
+def regrade(body: RegradeRequest, x_tenant_id: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """
+    Queue a regrade. Pick sessions by session_id, by exam_title, or — with only
+    answer_key_id — every session marked against that key. Unchanged questions
+    are left alone and teacher-edited marks are kept. Runs at bulk priority.
+    """
+    query = db.query(GradingSession.id, GradingSession.answer_key_id).filter(
+        GradingSession.status.in_(("pending", "ready", "completed"))
+    )
+    if body.session_id:
+        query = query.filter(GradingSession.id == body.session_id)
+    elif body.exam_title:
+        query = query.filter(GradingSession.exam_title == body.exam_title)
+    elif body.answer_key_id:
+        query = query.filter(GradingSession.answer_key_id == body.answer_key_id)
+    else:
+        raise HTTPException(status_code=422, detail="Pass session_id, exam_title or answer_key_id")
+
+    rows = query.all()
+    if body.session_id and not rows:
+        raise HTTPException(status_code=404, detail="Session not found or still processing")
+    if body.answer_key_id and not db.get(AnswerKey, body.answer_key_id):
+        raise HTTPException(status_code=404, detail="Answer key not found")
+    if not body.answer_key_id and any(key_id is None for _, key_id in rows):
+        raise HTTPException(status_code=422, detail="Some sessions have no answer key — pass answer_key_id")
+
+    enqueue(
+        _regrade, [sid for sid, _ in rows], body.answer_key_id,
+        tenant=x_tenant_id or "default", priority=BULK,
+    )
+    return {"status": "queued", "sessions": len(rows)}
@@ -0,0 +1,197 @@
+"""
+similarity.py — Copy detection over student transcripts via MinHash + LSH.
+
+Routes:
+  GET  /similarity/pairs     suspiciously similar answer pairs for an exam
+  POST /similarity/reindex   rebuild the index for an exam (backfill)
+"""
+from collections import defaultdict
+from itertools import combinations
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import get_db, get_async_db
+from models.session import GradingSession
+from models.question import Question
+from models.result import GradingResult
+from models.similarity import TranscriptSignature, LshBucket
+from services.similarity_index import (
+    signature, band_buckets, to_bytes, from_bytes, estimate_similarity, MAX_BUCKET_SIZE,
+)
+
+router = APIRouter(prefix="/similarity", tags=["similarity"])
+
+
+# ── Index maintenance ─────────────────────────────────────────────────────────
+
+def index_sessions(db: Session, session_ids: list[str]) -> int:
+    """
+    (Re)write signatures and LSH buckets for every result of the given sessions.
+    Runs inside the caller's transaction; returns the number of answers indexed.
+    """
+    rows = (
+        db.query(
+            GradingResult.id, GradingResult.transcript, Question.q_number, Question.session_id,
+            GradingSession.answer_key_id, GradingSession.exam_title,
+        )
+        .join(Question, GradingResult.question_id == Question.id)
+        .join(GradingSession, Question.session_id == GradingSession.id)
+        .filter(GradingSession.id.in_(session_ids))
+        .all()
+    )
+    result_ids = [r.id for r in rows]
+    db.execute(delete(LshBucket).where(LshBucket.result_id.in_(result_ids)))
+    db.execute(delete(TranscriptSignature).where(TranscriptSignature.result_id.in_(result_ids)))
+
+    indexed = 0
+    for r in rows:
+        sig = signature(r.transcript)
+        if sig is None:
+            continue
+        scope = dict(q_number=r.q_number, answer_key_id=r.answer_key_id, exam_title=r.exam_title)
+        db.add(TranscriptSignature(result_id=r.id, session_id=r.session_id, signature=to_bytes(sig), **scope))
+        db.add_all([
+            LshBucket(result_id=r.id, band=band, bucket=bucket, **scope)
+            for band, bucket in enumerate(band_buckets(sig))
+        ])
+        indexed += 1
+    return indexed
+
+
+def index_committed(db: Session, session_ids: list[str]) -> int:
+    """
+    index_sessions in a transaction of its own, after the grades are committed.
+    A failure only logs: copy detection can be rebuilt with POST /similarity/reindex,
+    a finished grading run can't.
+    """
+    try:
+        indexed = index_sessions(db, session_ids)
+        db.commit()
+        return indexed
+    except Exception as e:
+        db.rollback()
+        print(f"[similarity] Could not index {len(session_ids)} session(s): {e}")
+        return 0
+
+
+def _scope_filter(model, answer_key_id: Optional[str], exam_title: Optional[str]) -> list:
+    if not answer_key_id and not exam_title:
+        raise HTTPException(status_code=422, detail="Pass answer_key_id or exam_title")
+    conds = []
+    if answer_key_id:
+        conds.append(model.answer_key_id == answer_key_id)
+    if exam_title:
+        conds.append(model.exam_title == exam_title)
+    return conds
+
+
+# ── Routes ────────────────────────────────────────────────────────────────────
+
+@router.get("/pairs")
+async def similar_pairs(
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    q_number: Optional[int] = None,
+    threshold: float = Query(0.8, ge=0.0, le=1.0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Answer pairs from different students whose estimated similarity ≥ threshold.
+    Only pairs sharing an LSH bucket are compared, so cost follows the number of
+    collisions rather than the square of the class size. Buckets larger than
+    MAX_BUCKET_SIZE hold a stock answer most of the class gave and are skipped.
+    """
+    scope = _scope_filter(LshBucket, answer_key_id, exam_title)
+    if q_number is not None:
+        scope.append(LshBucket.q_number == q_number)
+
+    # 1. Buckets holding more than one answer — a single pass over the covering index
+    hot = (await db.execute(
+        select(LshBucket.q_number, LshBucket.band, LshBucket.bucket)
+        .where(*scope)
+        .group_by(LshBucket.q_number, LshBucket.band, LshBucket.bucket)
+        .having(func.count() > 1, func.count() <= MAX_BUCKET_SIZE)
+    )).all()
+    hot_keys = {tuple(h) for h in hot}
+
+    # 2. Members of those buckets only, paired up per bucket
+    groups: dict[tuple, list[str]] = defaultdict(list)
+    buckets = list({h.bucket for h in hot})
+    for i in range(0, len(buckets), 500):
+        for row in (await db.execute(
+            select(LshBucket.result_id, LshBucket.q_number, LshBucket.band, LshBucket.bucket)
+            .where(*scope, LshBucket.bucket.in_(buckets[i:i + 500]))
+        )).all():
+            key = (row.q_number, row.band, row.bucket)
+            if key in hot_keys:
+                groups[key].append(row.result_id)
+    candidates = {tuple(sorted(pair)) for members in groups.values() for pair in combinations(members, 2)}
+    if not candidates:
+        return []
+
+    ids = {rid for pair in candidates for rid in pair}
+    sigs = {
+        s.result_id: s
+        for s in (await db.scalars(
+            select(TranscriptSignature).where(TranscriptSignature.result_id.in_(ids))
+        )).all()
+    }
+
+    scored = []
+    for a, b in candidates:
+        # A bucket row can outlive its signature (the answer was removed) — nothing to compare
+        sa, sb = sigs.get(a), sigs.get(b)
+        if sa is None or sb is None or sa.session_id == sb.session_id:
+            continue
+        sim = estimate_similarity(from_bytes(sa.signature), from_bytes(sb.signature))
+        if sim >= threshold:
+            scored.append((sim, sa, sb))
+    scored.sort(key=lambda t: t[0], reverse=True)
+    scored = scored[:limit]
+
+    # Attach student names and transcripts for the pairs actually returned
+    keep = {s.result_id for _, sa, sb in scored for s in (sa, sb)}
+    details = {
+        row.id: row
+        for row in (await db.execute(
+            select(GradingResult.id, GradingResult.transcript, GradingSession.id.label("session_id"),
+                   GradingSession.student_name)
+            .join(Question, GradingResult.question_id == Question.id)
+            .join(GradingSession, Question.session_id == GradingSession.id)
+            .where(GradingResult.id.in_(keep))
+        )).all()
+    }
+
+    def _side(sig: TranscriptSignature) -> dict:
+        d = details[sig.result_id]
+        return {
+            "resultId": d.id,
+            "sessionId": d.session_id,
+            "studentName": d.student_name,
+            "transcript": d.transcript,
+        }
+
+    return [
+        {"qNumber": sa.q_number, "similarity": round(sim, 3), "a": _side(sa), "b": _side(sb)}
+        for sim, sa, sb in scored
+        if sa.result_id in details and sb.result_id in details
+    ]
+
+
+@router.post("/reindex")
+def reindex(
+    answer_key_id: Optional[str] = None,
+    exam_title: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Rebuild signatures for every session of an exam (e.g. for sessions graded before indexing)."""
+    conds = _scope_filter(GradingSession, answer_key_id, exam_title)
+    session_ids = [sid for (sid,) in db.query(GradingSession.id).filter(*conds).all()]
+    indexed = index_sessions(db, session_ids) if session_ids else 0
+    db.commit()
+    return {"ok": True, "sessions": len(session_ids), "indexed": indexed}
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Header
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import shutil
+import cProfile
+import io
+import marshal
 import uuid
 import json
 from pathlib import Path
 from typing import Optional
 
 from database import get_db
-from models.session import GradingSession, AnswerSheetImage
+from models.session import GradingSession, AnswerSheetImage, ORIGINAL_PAGE
 from models.question import Question, QuestionStep
 from models.result import GradingResult
 from models.answer_key import AnswerKey
-from services.pdf_processor import file_to_images, save_page_images
-from services.ocr_service import detect_question_regions
-from services.ai_grader import grade_answer
+from services.pdf_processor import file_to_images, iter_pages, save_page_images, estimate_pages
+from services.class_splitter import split_students, SPLIT_MODES
+from services.ocr_service import locate_questions
+from services.grading_router import route_answers, routing_summary
+from services.scheduler import INTERACTIVE, BULK
+from services.job_queue import enqueue
+from services.blob_store import blob_store
+from services.admission import admission, Ticket
+from services.metrics import span, collect_spans, PAGES_PROCESSED, SESSIONS_PROCESSED
+from api.similarity import index_committed
+from api.regrade import scheme_fingerprint
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
@@ -27,6 +38,7 @@ DEFAULT_SCHEMES = {
         "text": "Define Ohm's Law.",
         "max_marks": 2,
         "steps": [],
+        "answer": "Current through a conductor is directly proportional to the potential difference across it, at constant temperature (V = IR).",
     },
     2: {
         "type": "LONG_ANSWER",
@@ -48,185 +60,420 @@ DEFAULT_SCHEMES = {
             {"step_key": "b", "label": "Correct substitution of values", "max_marks": 1},
             {"step_key": "c", "label": "Final answer with correct unit (Ω)", "max_marks": 1},
         ],
+        "answer": "R = 2.4 Ω",
     },
 }
 
 
+def _resolve_scheme(db: Session, answer_key_id: Optional[str]) -> tuple[dict, str, str]:
+    """Marking scheme {q_number -> {type, text, max_marks, steps}}, subject and exam title."""
+    if answer_key_id:
+        ak = db.get(AnswerKey, answer_key_id)
+        if not ak:
+            raise HTTPException(status_code=404, detail=f"Answer key '{answer_key_id}' not found.")
+        return {q["q_number"]: q for q in ak.questions}, ak.subject, ak.exam_title or ak.title
+
+    # Fallback: built-in Physics demo scheme
+    scheme = {
+        q_num: {"type": v["type"], "text": v["text"], "max_marks": v["max_marks"], "steps": v["steps"],
+                "answer": v.get("answer")}
+        for q_num, v in DEFAULT_SCHEMES.items()
+    }
+    return scheme, "Physics", "Uploaded Exam"
+
+
+def _admit(upload: UploadFile, ext: str, tenant: Optional[str], priority: int) -> Ticket:
+    """
+    Reserve this upload's pages and bytes; raises Overloaded (429/503/413) when it doesn't fit.
+    Blocking (reads the upload to count pages, may count the jobs table) — call via run_in_threadpool.
+    """
+    return admission.admit(
+        tenant or "default", priority, pages=estimate_pages(upload.file, ext), nbytes=upload.size or 0,
+    )
+
+
 @router.post("/session")
 async def create_grading_session(
-    background_tasks: BackgroundTasks,
     answer_sheet: UploadFile = File(...),
     answer_key_id: Optional[str] = Form(None),
+    defer_grading: bool = Form(False),
+    profile: bool = Form(False),
+    x_tenant_id: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
     """
     Upload an answer sheet (PDF or image).
     Optionally pass answer_key_id to use a saved marking scheme.
-    Returns a session_id immediately; processing happens in the background.
+    Pass defer_grading=true to only run OCR now and leave grading to the
+    cluster stage (POST /clusters/grade), which grades similar answers once.
+    Pass profile=true to capture a cProfile of this one run (GET /metrics/sessions/{id}/profile).
+    Returns a session_id immediately; processing is queued at interactive
+    priority, ahead of bulk class uploads. Turned away with 429/503 and
+    Retry-After when the tenant or the service is over its admission limits.
     """
-    # ── Resolve marking scheme ────────────────────────────────────────────────
-    scheme: dict  # {q_number -> {type, text, max_marks, steps}}
-    subject = "Physics"  # default
-    exam_title = "Uploaded Exam"
+    scheme, subject, exam_title = _resolve_scheme(db, answer_key_id)
+    ext = Path(answer_sheet.filename or "sheet.png").suffix or ".png"
+    ticket = await run_in_threadpool(_admit, answer_sheet, ext, x_tenant_id, INTERACTIVE)
+    try:
+        session_id = str(uuid.uuid4())
 
-    if answer_key_id:
-        ak = db.get(AnswerKey, answer_key_id)
-        if not ak:
-            raise HTTPException(status_code=404, detail=f"Answer key '{answer_key_id}' not found.")
-        subject = ak.subject
-        exam_title = ak.exam_title or ak.title
-        scheme = {q["q_number"]: q for q in ak.questions}
-    else:
-        # Fallback: built-in Physics demo scheme
-        scheme = {
-            q_num: {"type": v["type"], "text": v["text"], "max_marks": v["max_marks"], "steps": v["steps"]}
-            for q_num, v in DEFAULT_SCHEMES.items()
-        }
+        # Store the uploaded file (its reference is owned by the image record below)
+        source_key = blob_store.put_stream(answer_sheet.file, ext)
 
-    session_id = str(uuid.uuid4())
+        # Create DB session record
+        session = GradingSession(
+            id=session_id,
+            student_name="Unknown Student",
+            subject=subject,
+            exam_title=exam_title,
+            answer_key_id=answer_key_id,
+            total_marks=sum(q["max_marks"] for q in scheme.values()),
+            status="processing",
+        )
+        db.add(session)
+        db.commit()
 
-    # Save the uploaded file
-    ext = Path(answer_sheet.filename or "sheet.png").suffix or ".png"
-    raw_path = UPLOAD_DIR / f"{session_id}_original{ext}"
-    with raw_path.open("wb") as f:
-        shutil.copyfileobj(answer_sheet.file, f)
-
-    # Create DB session record
-    session = GradingSession(
-        id=session_id,
-        student_name="Unknown Student",
-        subject=subject,
-        exam_title=exam_title,
-        total_marks=sum(q["max_marks"] for q in scheme.values()),
-        status="processing",
-    )
-    db.add(session)
-    db.commit()
-
-    # Save image record
-    img_record = AnswerSheetImage(
-        session_id=session_id,
-        file_path=str(raw_path),
-        original_filename=answer_sheet.filename,
-        page_number=1,
+        # Save image record
+        img_record = AnswerSheetImage(
+            session_id=session_id,
+            file_path=blob_store.describe(source_key),
+            blob_key=source_key,
+            original_filename=answer_sheet.filename,
+            page_number=ORIGINAL_PAGE,
+        )
+        db.add(img_record)
+        db.commit()
+
+        # Queue processing ahead of any bulk work; the admission ticket is held until it is done
+        enqueue(
+            _process_session, session_id, source_key, scheme, defer_grading, profile=profile,
+            tenant=x_tenant_id or "default", priority=INTERACTIVE, on_done=ticket.release,
+        )
+        return {"session_id": session_id, "status": "processing", "queuePosition": ticket.queue_position}
+    except BaseException:
+        ticket.release()
+        raise
+
+
+@router.post("/class", status_code=202)
+async def create_class_sessions(
+    answer_sheet: UploadFile = File(...),
+    answer_key_id: Optional[str] = Form(None),
+    split_mode: str = Form("fixed"),            # fixed | separator | cover
+    pages_per_student: Optional[int] = Form(None),
+    student_names: Optional[str] = Form(None),  # one per line, in scan order ("Doe, Jane" is one name)
+    defer_grading: bool = Form(False),
+    offpeak: bool = Form(False),                # hold grading until the OFFPEAK_WINDOW opens
+    x_tenant_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Upload one scanned PDF holding a whole class's papers.
+    Pages are split into one session per student (every N pages, at blank
+    separator sheets, or at cover pages), and each student is processed as
+    soon as their pages are rendered. Students are queued at bulk priority
+    under the uploading account (X-Tenant-Id), so several class batches
+    from one teacher share that teacher's slots. List the results with
+    GET /sessions?batch_id=<batch_id>. The admission ticket (pages / bytes of
+    the scan) is held until the PDF has been split.
+    """
+    if split_mode not in SPLIT_MODES:
+        raise HTTPException(status_code=422, detail=f"split_mode must be one of {', '.join(SPLIT_MODES)}")
+    if split_mode == "fixed" and not (pages_per_student and pages_per_student > 0):
+        raise HTTPException(status_code=422, detail="pages_per_student is required for fixed splitting")
+
+    scheme, subject, exam_title = _resolve_scheme(db, answer_key_id)
+    batch_id = str(uuid.uuid4())
+
+    ext = Path(answer_sheet.filename or "class.pdf").suffix or ".pdf"
+    ticket = await run_in_threadpool(_admit, answer_sheet, ext, x_tenant_id, BULK)
+    try:
+        # The splitter job holds this reference and drops it once every student is queued
+        source_key = blob_store.put_stream(answer_sheet.file, ext)
+    except BaseException:
+        ticket.release()
+        raise
+
+    names = [n.strip() for n in (student_names or "").splitlines() if n.strip()]
+    meta = {
+        "subject": subject, "exam_title": exam_title, "answer_key_id": answer_key_id, "batch_id": batch_id,
+        "tenant": x_tenant_id or "default", "offpeak": offpeak,
+    }
+    # Splitting renders every page — worker work, queued at bulk priority like the students it yields
+    enqueue(
+        _process_class, source_key, scheme, meta, split_mode, pages_per_student, names, defer_grading,
+        tenant=meta["tenant"], priority=BULK, on_done=ticket.release,
     )
-    db.add(img_record)
-    db.commit()
+    return {"batch_id": batch_id, "status": "splitting", "queuePosition": ticket.queue_position}
 
-    # Queue background processing
-    background_tasks.add_task(_process_session, session_id, str(raw_path), scheme)
-    return {"session_id": session_id, "status": "processing"}
 
+def _process_class(
+    source_key: str,
+    scheme: dict,
+    meta: dict,
+    split_mode: str,
+    pages_per_student: Optional[int],
+    names: list[str],
+    defer_grading: bool,
+):
+    """
+    Background task: render the class PDF page by page, open a session for
+    each student as soon as their pages are complete, and queue it with the
+    scheduler — grading starts before the rest of the document is rendered.
+    Pages go to the blob store straight away so queued students hold no images.
+    The class PDF is released when the job ends, whether or not the split finished.
+    """
+    from database import SessionLocal
+    db = SessionLocal()
+    count = 0
+    session = None
+    try:
+        with blob_store.local_path(source_key) as file_path:
+            for pages in split_students(iter_pages(file_path), split_mode, pages_per_student):
+                session = GradingSession(
+                    student_name=names[count] if count < len(names) else f"Student {count + 1}",
+                    subject=meta["subject"],
+                    exam_title=meta["exam_title"],
+                    answer_key_id=meta["answer_key_id"],
+                    batch_id=meta["batch_id"],
+                    total_marks=sum(q["max_marks"] for q in scheme.values()),
+                    status="processing",
+                )
+                db.add(session)
+                db.commit()
+                page_keys = save_page_images(pages)
+                try:
+                    # The queued job owns the page references until its image records exist
+                    enqueue(
+                        _process_session, session.id, None, scheme, defer_grading, page_keys,
+                        tenant=meta["tenant"], priority=BULK, offpeak=meta["offpeak"],
+                    )
+                except Exception:
+                    for key in page_keys:
+                        blob_store.release(key)
+                    raise
+                session = None
+                count += 1
+        print(f"[upload] Class upload {meta['batch_id']} split into {count} students")
+    except Exception as e:
+        db.rollback()
+        # The student being split when it failed will never be processed
+        if session is not None:
+            db.query(GradingSession).filter(GradingSession.id == session.id).update({"status": "error"})
+            db.commit()
+        print(f"[upload] Error splitting class upload {meta['batch_id']} after {count} students: {e}")
+    finally:
+        db.close()
+        blob_store.release(source_key)
 
-def _process_session(session_id: str, file_path: str, scheme: dict):
+
+def _process_session(
+    session_id: str,
+    source: str | None,
+    scheme: dict,
+    defer_grading: bool = False,
+    page_keys: list[str] | None = None,
+    profile: bool = False,
+):
     """
     Background task: OCR + AI grading pipeline.
     `scheme` is a dict of {q_number -> {type, text, max_marks, steps}}.
+    `page_keys` are blob keys of pages already rendered (class uploads);
+    otherwise the pages are rendered from `source` (a blob key, or a local path).
+    With defer_grading the session stops after OCR in status "pending".
+    Stage timings are stored on the session; with profile=True the run is
+    also captured with cProfile into the blob store (session.profile_blob_key).
     """
     from database import SessionLocal
     db = SessionLocal()
+    profiler = cProfile.Profile() if profile else None
+
+    with collect_spans() as spans:
+        try:
+            if profiler:
+                profiler.enable()
+            try:
+                _run_pipeline(db, session_id, source, scheme, defer_grading, page_keys)
+            finally:
+                if profiler:
+                    profiler.disable()
+            SESSIONS_PROCESSED.inc(outcome="ok")
+        except Exception as e:
+            db.rollback()
+            session = db.get(GradingSession, session_id)
+            if session:
+                session.status = "error"
+                db.commit()
+            SESSIONS_PROCESSED.inc(outcome="error")
+            print(f"[upload] Error processing session {session_id}: {e}")
 
+    profile_key = old_profile = None
     try:
-        # 1. Convert to PIL images
-        images = file_to_images(file_path)
+        session = db.get(GradingSession, session_id)
+        if session:
+            session.timings_json = json.dumps(spans)
+            if profiler:
+                # In the blob store rather than on this node's disk, so the API can read it
+                profiler.create_stats()
+                profile_key = blob_store.put_bytes(marshal.dumps(profiler.stats), ".pstats")
+                old_profile, session.profile_blob_key = session.profile_blob_key, profile_key
+            db.commit()
+            profile_key = None
+        if old_profile:
+            blob_store.release(old_profile)
+    except Exception as e:
+        print(f"[upload] Could not store timings for session {session_id}: {e}")
+        if profile_key:
+            blob_store.release(profile_key)
+    finally:
+        db.close()
 
-        # Save page images for the viewer
-        session_img_dir = str(UPLOAD_DIR / session_id)
-        page_paths = save_page_images(images, session_id, str(UPLOAD_DIR))
 
-        # Update image records with page paths
-        for i, path in enumerate(page_paths):
-            img = AnswerSheetImage(
+def _record_pages(db: Session, session_id: str, page_keys: list[str]):
+    """
+    Write the image records that own the page blobs' references, committed
+    straight away: a failure later in the pipeline rolls back its own work, not
+    the ownership. If the records can't be written the references are dropped.
+    """
+    try:
+        for i, key in enumerate(page_keys):
+            db.add(AnswerSheetImage(
                 session_id=session_id,
-                file_path=path,
+                file_path=blob_store.describe(key),
+                blob_key=key,
                 original_filename=f"page_{i + 1}.png",
                 page_number=i + 1,
-            )
-            db.add(img)
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        for key in page_keys:
+            blob_store.release(key)
+        raise
 
-        # 2. Detect question regions from first page
-        regions = detect_question_regions(images[0])
 
-        # Map regions to question numbers
-        region_map = {r["q_num"]: r for r in regions}
+def _run_pipeline(
+    db: Session,
+    session_id: str,
+    source: str | None,
+    scheme: dict,
+    defer_grading: bool,
+    page_keys: list[str] | None,
+):
+    """The pipeline stages of _process_session, each timed with a span."""
+    # 1. Convert to PIL images, saving the pages for the viewer
+    images = None
+    if not page_keys:
+        with span("render"):
+            with blob_store.local_path(source) as file_path:
+                images = file_to_images(file_path)
+        with span("save_pages"):
+            page_keys = save_page_images(images)
+    _record_pages(db, session_id, page_keys)
+    if images is None:
+        from PIL import Image
+        with span("render"):
+            images = [Image.open(io.BytesIO(blob_store.read_bytes(key))).convert("RGB") for key in page_keys]
+    PAGES_PROCESSED.inc(len(images))
 
-        total_marks = 0.0
+    # 2. Detect question regions from the first page, then look for any
+    #    questions still missing on the following pages
+    region_map = locate_questions(images, scheme)
 
-        # 3. Create Question + Step + Result records
-        for q_num, q_scheme in scheme.items():
-            region = region_map.get(q_num, {})
-            student_text = region.get("raw_text", "")
-            bbox_pct = region.get("bbox_pct", {"x": 0, "y": q_num * 25, "w": 100, "h": 25})
+    total_marks = 0.0
 
-            # Create Question
-            question = Question(
-                session_id=session_id,
-                q_number=q_num,
-                question_text=q_scheme["text"],
-                max_marks=q_scheme["max_marks"],
-                question_type=q_scheme["type"],
-                bbox_json=json.dumps(bbox_pct),
-            )
-            db.add(question)
-            db.flush()  # get question.id
-
-            # Create Steps
-            for i, step_def in enumerate(q_scheme.get("steps", [])):
-                step = QuestionStep(
-                    question_id=question.id,
-                    step_key=step_def["step_key"],
-                    label=step_def["label"],
-                    max_marks=step_def["max_marks"],
-                    order_index=i,
-                )
-                db.add(step)
-
-            db.flush()
-
-            # 4. AI grade this question
-            grading = grade_answer(
-                question_text=q_scheme["text"],
-                question_type=q_scheme["type"],
-                max_marks=q_scheme["max_marks"],
-                marking_scheme=q_scheme.get("steps", []),
-                student_text=student_text,
-                cropped_image=region.get("cropped_image"),
-            )
+    # 3. Create Question + Step records and collect the answers to grade
+    pending = []
+    for q_num, q_scheme in scheme.items():
+        region = region_map.get(q_num, {})
+        student_text = region.get("raw_text", "")
+        bbox_pct = region.get("bbox_pct", {"x": 0, "y": q_num * 25, "w": 100, "h": 25})
 
-            # Update step results from AI
-            for step_result in grading.get("steps", []):
-                for step in question.steps:
-                    if step.step_key == step_result.get("step_key"):
-                        step.obtained_marks = step_result.get("obtained_marks")
-                        step.ai_status = step_result.get("ai_status", "low_confidence")
-                        step.ai_note = step_result.get("ai_note")
-
-            # Create GradingResult
-            obtained = grading.get("obtained_marks")
-            result = GradingResult(
+        # Create Question
+        question = Question(
+            session_id=session_id,
+            q_number=q_num,
+            question_text=q_scheme["text"],
+            max_marks=q_scheme["max_marks"],
+            question_type=q_scheme["type"],
+            bbox_json=json.dumps(bbox_pct),
+            scheme_hash=scheme_fingerprint(q_scheme),
+        )
+        db.add(question)
+        db.flush()  # get question.id
+
+        # Create Steps
+        for i, step_def in enumerate(q_scheme.get("steps", [])):
+            step = QuestionStep(
                 question_id=question.id,
-                obtained_marks=obtained,
-                confidence=grading.get("confidence", "low"),
-                ai_remark=grading.get("ai_remark", ""),
-                transcript=student_text,
+                step_key=step_def["step_key"],
+                label=step_def["label"],
+                max_marks=step_def["max_marks"],
+                order_index=i,
             )
-            db.add(result)
+            db.add(step)
 
-            if obtained is not None:
-                total_marks += obtained
+        db.flush()
+        pending.append((question, {
+            "question_text": q_scheme["text"],
+            "question_type": q_scheme["type"],
+            "max_marks": q_scheme["max_marks"],
+            "marking_scheme": q_scheme.get("steps", []),
+            "student_text": student_text,
+            "cropped_image": region.get("cropped_image"),
+            "ocr_confidence": region.get("ocr_confidence"),
+            "expected_answer": q_scheme.get("answer"),
+        }))
 
-        # 5. Update session totals + status
-        session = db.get(GradingSession, session_id)
-        session.obtained_marks = total_marks
-        session.status = "ready"
+    # 4. Grade: the router settles easy answers locally and sends the rest
+    #    to the model (or leave everything for the cluster stage)
+    if defer_grading:
+        gradings = [{
+            "obtained_marks": None,
+            "confidence": "low",
+            "ai_remark": "Queued for batch grading.",
+            "steps": [],
+        }] * len(pending)
+    else:
+        with span("grade"):
+            gradings = route_answers([item for _, item in pending])
+        summary = routing_summary([g["route"] for g in gradings])
+        print(f"[upload] Session {session_id} routing: {summary}")
+
+    for (question, item), grading in zip(pending, gradings):
+        # Update step results from AI
+        for step_result in grading.get("steps", []):
+            for step in question.steps:
+                if step.step_key == step_result.get("step_key"):
+                    step.obtained_marks = step_result.get("obtained_marks")
+                    step.ai_obtained_marks = step.obtained_marks
+                    step.ai_status = step_result.get("ai_status", "low_confidence")
+                    step.ai_note = step_result.get("ai_note")
+
+        # Create GradingResult
+        obtained = grading.get("obtained_marks")
+        result = GradingResult(
+            question_id=question.id,
+            obtained_marks=obtained,
+            ai_obtained_marks=obtained,
+            confidence=grading.get("confidence", "low"),
+            ai_remark=grading.get("ai_remark", ""),
+            transcript=item["student_text"],
+            grading_route=grading.get("route"),
+        )
+        db.add(result)
+
+        if obtained is not None:
+            total_marks += obtained
+
+    # 5. Update session totals + status
+    session = db.get(GradingSession, session_id)
+    session.obtained_marks = total_marks
+    session.status = "pending" if defer_grading else "ready"
+
+    with span("db_commit"):
         db.commit()
 
-    except Exception as e:
-        db.rollback()
-        session = db.get(GradingSession, session_id)
-        if session:
-            session.status = "error"
-            db.commit()
-        print(f"[upload] Error processing session {session_id}: {e}")
-    finally:
-        db.close()
+    # 6. Add transcripts to the copy-detection index once the grades are safe
+    with span("index"):
+        index_committed(db, [session_id])
@@ -0,0 +1,4 @@
+"""
+benchmarks — Reproducible timings for the grading pipeline and API reads.
+Run from backend/:  python -m benchmarks.run --help
+"""
@@ -0,0 +1,181 @@
+"""
+fake_gemini.py — Local stand-in for the Gemini generateContent REST endpoint.
+
+  cd backend
+  python -m benchmarks.fake_gemini --port 8089 --latency-ms 800 --jitter-ms 400 --rate-limit-rate 0.05
+  GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8089 uvicorn main:app --port 8000
+
+Answers grading prompts with deterministic marks parsed from the marking
+scheme, and answer-key prompts with questions parsed from "Q1 ... (2 marks)"
+lines, so the real pipeline runs end to end offline. Latency, server errors
+and 429s are tunable; --responses swaps in canned JSON for matching prompts.
+
+Routes:
+  POST /{version}/models/{model}:generateContent
+  GET  /_stats     — request / error / 429 counts
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+_STEP_RE = re.compile(r"Step (\w+): (.+?) \((\d+(?:\.\d+)?) marks?\)")
+_MAX_RE = re.compile(r"MAX MARKS: (\d+(?:\.\d+)?)")
+_ANSWER_RE = re.compile(r"STUDENT'S ANSWER \(OCR transcription\):\n(.*?)\n\nGrade this answer", re.S)
+_KEY_LINE_RE = re.compile(r"Q\s*(\d+)[.:)]?\s*(.+?)\s*\[?\((\d+(?:\.5)?)\s*marks?\)\]?", re.I)
+
+
+# ── Canned replies ────────────────────────────────────────────────────────────
+
+def _grading_reply(prompt: str) -> dict:
+    """Marks depend only on the student's answer, so reruns grade identically."""
+    answer = (_ANSWER_RE.search(prompt) or [None, ""])[1]
+    h = zlib.crc32(answer.encode())
+    steps = [
+        {
+            "step_key": key,
+            "obtained_marks": float(marks) if (h >> i) & 1 else 0.0,
+            "ai_status": "correct" if (h >> i) & 1 else "incorrect",
+            "ai_note": "",
+        }
+        for i, (key, _label, marks) in enumerate(_STEP_RE.findall(prompt))
+    ]
+    max_marks = float((_MAX_RE.search(prompt) or [None, "0"])[1])
+    obtained = sum(s["obtained_marks"] for s in steps) if steps else float(h % (int(max_marks) + 1))
+    return {
+        "obtained_marks": obtained,
+        "confidence": ("high", "high", "medium", "low")[h % 4],
+        "ai_remark": "Graded by the local stand-in.",
+        "steps": steps,
+    }
+
+
+def _extraction_reply(prompt: str) -> list:
+    text = prompt.split("TEXT:", 1)[-1].split("Return ONLY", 1)[0]
+    questions = [
+        {"q_number": int(n), "type": "SHORT_ANSWER", "text": body.strip(), "max_marks": float(m), "steps": []}
+        for n, body, m in _KEY_LINE_RE.findall(text)
+    ]
+    return questions or [
+        {"q_number": 1, "type": "SHORT_ANSWER", "text": "Define Ohm's Law.", "max_marks": 2, "steps": []},
+    ]
+
+
+def _reply_text(prompt: str, canned: list[dict]) -> str:
+    for entry in canned:
+        if entry["match"] in prompt:
+            body = entry["response"]
+            return body if isinstance(body, str) else json.dumps(body)
+    if "MARKING SCHEME:" in prompt:
+        return json.dumps(_grading_reply(prompt))
+    if "marking scheme document" in prompt:
+        return json.dumps(_extraction_reply(prompt))
+    return "{}"
+
+
+def _prompt_text(body: dict) -> str:
+    return "\n".join(
+        part["text"]
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+        if "text" in part
+    )
+
+
+def _error(code: int, status: str, message: str, headers: dict | None = None) -> JSONResponse:
+    return JSONResponse({"error": {"code": code, "message": message, "status": status}},
+                        status_code=code, headers=headers)
+
+
+# ── App ───────────────────────────────────────────────────────────────────────
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+               rate_limit_rate: float = 0.0, retry_after: int = 2, canned: list[dict] | None = None,
+               seed: int | None = None) -> FastAPI:
+    app = FastAPI(title="Fake Gemini")
+    rng = random.Random(seed)
+    canned = canned or []
+    stats: Counter = Counter()
+    lock = threading.Lock()
+
+    @app.post("/{version}/models/{target}")
+    async def generate_content(version: str, target: str, request: Request):
+        model, _, method = target.partition(":")
+        if method != "generateContent":
+            return _error(404, "NOT_FOUND", f"Method {method or '(none)'} is not supported by the stand-in")
+
+        with lock:
+            stats["requests"] += 1
+            roll = rng.random()
+            delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+
+        # Rate limits come back fast, like the real quota check
+        if roll < rate_limit_rate:
+            with lock:
+                stats["rate_limited"] += 1
+            return _error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).",
+                          headers={"Retry-After": str(retry_after)})
+
+        await asyncio.sleep(delay)
+        if roll < rate_limit_rate + error_rate:
+            with lock:
+                stats["errors"] += 1
+            return _error(500, "INTERNAL", "An internal error has occurred.")
+
+        prompt = _prompt_text(await request.json())
+        text = _reply_text(prompt, canned)
+        with lock:
+            stats["ok"] += 1
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": (len(prompt) + len(text)) // 4,
+            },
+            "modelVersion": model,
+        }
+
+    @app.get("/_stats")
+    def get_stats():
+        with lock:
+            return dict(stats)
+
+    return app
+
+
+def main(argv: list[str] | None = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform ± spread around the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with a 429")
+    parser.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds on 429s")
+    parser.add_argument("--responses", help='JSON file: [{"match": "<prompt substring>", "response": <str|json>}]')
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    canned = json.loads(Path(args.responses).read_text()) if args.responses else []
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                     args.retry_after, canned, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
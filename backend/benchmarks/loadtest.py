@@ -0,0 +1,191 @@
+"""
+loadtest.py — Concurrent upload + review load driver against a running API.
+
+  cd backend
+  python -m benchmarks.fake_gemini --latency-ms 800 --jitter-ms 400 &
+  GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8089 uvicorn main:app --port 8000 &
+  python -m benchmarks.loadtest --api http://127.0.0.1:8000 --papers 40 --concurrency 8
+
+Each virtual teacher uploads a synthetic answer sheet, polls the session until
+processing finishes, then sends a few review PATCHes the way GradingReview.jsx
+does. Reports p50/p95/p99 latency per request type and papers graded per
+minute (uploads accepted → sessions ready, over the whole run).
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+
+from benchmarks.synthetic import write_sheet, PAGE_SIZES
+
+
+# ── HTTP ──────────────────────────────────────────────────────────────────────
+
+def _multipart(fields: dict, files: dict) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, value in fields.items():
+        chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, path in files.items():
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{path.name}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode()
+        )
+        chunks.append(path.read_bytes() + b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode())
+    return b"".join(chunks), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """Times every request into per-operation sample lists."""
+
+    def __init__(self, base: str, tenant: str | None = None, timeout: float = 60):
+        self.base = base.rstrip("/")
+        self.tenant = tenant
+        self.timeout = timeout
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = Lock()
+
+    def request(self, op: str, method: str, path: str, body: bytes | None = None,
+                content_type: str | None = None) -> dict | None:
+        headers = {"Accept-Encoding": "identity"}
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.tenant:
+            headers["X-Tenant-ID"] = self.tenant
+        req = urllib.request.Request(self.base + path, data=body, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+            outcome = None
+        except urllib.error.HTTPError as e:
+            payload, outcome = None, str(e.code)
+        except Exception as e:
+            payload, outcome = None, type(e).__name__
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if outcome:
+                self.errors[op][outcome] += 1
+            else:
+                self.samples[op].append(elapsed)
+        return json.loads(payload) if payload else None
+
+
+# ── One virtual teacher's paper ───────────────────────────────────────────────
+
+def run_paper(client: Client, sheet: Path, args, rng: random.Random) -> float | None:
+    """Upload → wait for ready → review. Returns the time the session became ready, or None."""
+    fields = {"answer_key_id": args.answer_key_id} if args.answer_key_id else {}
+    body, ctype = _multipart(fields, {"answer_sheet": sheet})
+    created = client.request("upload", "POST", "/upload/session", body, ctype)
+    if not created:
+        return None
+    sid = created["session_id"]
+
+    deadline = time.monotonic() + args.paper_timeout
+    session = None
+    while time.monotonic() < deadline:
+        session = client.request("poll", "GET", f"/sessions/{sid}")
+        if session and session["status"] != "processing":
+            break
+        time.sleep(args.poll_interval)
+    if not session or session["status"] != "ready":
+        return None
+    ready_at = time.monotonic()
+
+    for _ in range(args.patches):
+        q = rng.choice(session["questions"])
+        update = {"question_id": str(q["id"]), "obtained_marks": rng.randint(0, int(q["maxMarks"]))}
+        client.request("patch", "PATCH", f"/sessions/{sid}/marks", json.dumps(update).encode(), "application/json")
+        time.sleep(args.think_ms / 1000)
+    return ready_at
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def summarise(client: Client, started: float, finished: list[float], papers: int, wall: float) -> dict:
+    ops = {}
+    for op in sorted(set(client.samples) | set(client.errors)):
+        ordered = sorted(client.samples.get(op, []))
+        ops[op] = {"ok": len(ordered), "errors": dict(client.errors.get(op, {}))}
+        if ordered:
+            ops[op].update({f"p{p}Ms": round(_percentile(ordered, p) * 1000, 1) for p in (50, 95, 99)})
+    span = (max(finished) - started) if finished else 0.0
+    return {
+        "papers": papers,
+        "ready": len(finished),
+        "failed": papers - len(finished),
+        "wallSeconds": round(wall, 2),
+        "papersPerMinute": round(len(finished) / span * 60, 2) if span else 0.0,
+        "ops": ops,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--api", default="http://127.0.0.1:8000")
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--patches", type=int, default=3, help="review PATCHes per paper")
+    parser.add_argument("--think-ms", type=float, default=200, help="pause between a teacher's PATCHes")
+    parser.add_argument("--size", default="a4-150", choices=list(PAGE_SIZES))
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.2)
+    parser.add_argument("--answer-key-id")
+    parser.add_argument("--tenant", help="X-Tenant-ID header for every request")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--paper-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="write the report JSON here")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="gradeglide-load-"))
+    # A handful of distinct sheets is enough variety; uploads cycle through them
+    sheets = [
+        write_sheet(workdir / f"sheet-{i}.png", n_questions=args.questions, size=args.size,
+                    noise=args.noise, seed=args.seed + i)
+        for i in range(min(args.papers, 8))
+    ]
+
+    client = Client(args.api, args.tenant)
+    finished: list[float] = []
+    print(f"{args.papers} papers, {args.concurrency} concurrent, against {args.api}")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_paper, client, sheets[i % len(sheets)], args, random.Random(args.seed + i))
+            for i in range(args.papers)
+        ]
+        for f in futures:
+            ready_at = f.result()
+            if ready_at is not None:
+                finished.append(ready_at)
+    report = summarise(client, started, finished, args.papers, time.monotonic() - started)
+
+    print(f"ready {report['ready']}/{report['papers']} in {report['wallSeconds']} s — "
+          f"{report['papersPerMinute']} papers/min")
+    for op, r in report["ops"].items():
+        latency = f"p50 {r['p50Ms']:>8} ms  p95 {r['p95Ms']:>8} ms  p99 {r['p99Ms']:>8} ms" if r["ok"] else "—"
+        print(f"  {op:<8} {r['ok']:>5} ok  {latency}  errors {r['errors'] or 0}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
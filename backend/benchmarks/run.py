@@ -0,0 +1,215 @@
+"""
+run.py — Benchmark runner for the grading pipeline and API reads.
+
+  cd backend
+  python -m benchmarks.run --sizes a4-150,a4-200 --repeat 5 --out bench.json
+  python -m benchmarks.run --compare bench.json          # show change vs a saved run
+
+Everything runs in a throwaway working directory (its own SQLite file and
+uploads folder) with a deterministic fake grader in place of Gemini, and all
+inputs come from fixed seeds, so results are comparable run to run on the
+same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+# Imports below happen after chdir into the scratch directory, so pin backend/ on the path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+# ── Timing helpers ────────────────────────────────────────────────────────────
+
+def _summarise(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    p95 = ordered[max(0, int(round(0.95 * len(ordered))) - 1)]
+    return {
+        "n": len(samples),
+        "medianMs": round(statistics.median(samples) * 1000, 3),
+        "p95Ms": round(p95 * 1000, 3),
+        "minMs": round(ordered[0] * 1000, 3),
+        "meanMs": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def bench(results: dict, name: str, fn, repeat: int, warmup: int = 1, setup=None):
+    """Time fn() `repeat` times after `warmup` untimed runs; setup() runs untimed before each call."""
+    samples = []
+    for i in range(warmup + repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            samples.append(elapsed)
+    results[name] = _summarise(samples)
+    print(f"  {name:<48} median {results[name]['medianMs']:>10.2f} ms   p95 {results[name]['p95Ms']:>10.2f} ms")
+
+
+def skip(results: dict, name: str, reason: str):
+    results[name] = {"skipped": reason}
+    print(f"  {name:<48} skipped — {reason}")
+
+
+# ── API server ────────────────────────────────────────────────────────────────
+
+def _start_server(app) -> tuple[str, object]:
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def _get(url: str) -> bytes:
+    req = urllib.request.Request(url, headers={"Accept-Encoding": "identity"})
+    with urllib.request.urlopen(req) as resp:
+        return resp.read()
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--sizes", default="a4-150,a4-200", help="comma-separated page sizes")
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.2)
+    parser.add_argument("--pdf-pages", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=50, help="sessions seeded for the API read benchmarks")
+    parser.add_argument("--grader-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    out_path = Path(args.out).resolve() if args.out else None
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    workdir = Path(tempfile.mkdtemp(prefix="gradeglide-bench-"))
+    os.chdir(workdir)
+    os.environ["GEMINI_API_KEY"] = ""
+    # Time Tesseract itself, not lookups of the page it OCR'd on the previous repeat
+    os.environ["OCR_CACHE"] = "0"
+
+    import main as app_main
+    from database import SessionLocal
+    from models.session import GradingSession
+    from services.pdf_processor import file_to_images, save_page_images
+    import services.ocr_service as ocr_service
+    from services.ocr_service import detect_question_regions
+    from api.upload import _process_session, _resolve_scheme
+    from benchmarks.synthetic import write_sheet, write_pdf, PAGE_SIZES
+    from benchmarks.fake_grader import fake_grader
+
+    # pytesseract can import without the tesseract binary; time the fallback path then
+    if ocr_service.TESSERACT_AVAILABLE:
+        try:
+            ocr_service.get_tesseract().get_tesseract_version()
+        except Exception:
+            ocr_service.TESSERACT_AVAILABLE = False
+    tesseract = ocr_service.TESSERACT_AVAILABLE
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in PAGE_SIZES]
+    if unknown:
+        parser.error(f"unknown size(s) {unknown}; choose from {', '.join(PAGE_SIZES)}")
+
+    results: dict[str, dict] = {}
+    db = SessionLocal()
+    scheme, subject, exam_title = _resolve_scheme(db, None)
+
+    def _new_session() -> str:
+        s = GradingSession(student_name="Bench", subject=subject, exam_title=exam_title,
+                           total_marks=sum(q["max_marks"] for q in scheme.values()), status="processing")
+        db.add(s)
+        db.commit()
+        return s.id
+
+    print(f"Scratch dir {workdir}  (tesseract={'yes' if tesseract else 'no — synthetic regions'})")
+    with fake_grader(args.grader_latency_ms):
+        for size in sizes:
+            print(f"[{size}]")
+            sheet = write_sheet(workdir / f"sheet-{size}.png", n_questions=args.questions, size=size,
+                                noise=args.noise, seed=args.seed)
+            bench(results, f"file_to_images[png,{size}]", lambda: file_to_images(str(sheet)), args.repeat)
+
+            pdf = write_pdf(workdir / f"class-{size}.pdf", n_pages=args.pdf_pages, n_questions=args.questions,
+                            size=size, noise=args.noise, seed=args.seed)
+            try:
+                file_to_images(str(pdf))
+                bench(results, f"file_to_images[pdf x{args.pdf_pages},{size}]",
+                      lambda: file_to_images(str(pdf)), args.repeat)
+            except Exception as e:
+                skip(results, f"file_to_images[pdf x{args.pdf_pages},{size}]", str(e).splitlines()[0])
+
+            page = file_to_images(str(sheet))[0]
+            bench(results, f"detect_question_regions[{size}]", lambda: detect_question_regions(page), args.repeat)
+            bench(results, f"save_page_images[{size}]",
+                  lambda: save_page_images([page]), args.repeat)
+            bench(results, f"process_session[{size}]",
+                  lambda sid: _process_session(sid, str(sheet), scheme), args.repeat, setup=_new_session)
+
+        # ── API reads over a seeded class ────────────────────────────────────
+        print(f"[api, {args.sessions} sessions]")
+        small = write_sheet(workdir / "seed.png", n_questions=args.questions, size="a4-100",
+                            noise=args.noise, seed=args.seed)
+        for _ in range(args.sessions):
+            _process_session(_new_session(), str(small), scheme)
+
+    some_id = db.query(GradingSession.id).filter(GradingSession.status == "ready").first()[0]
+    db.close()
+
+    base, server = _start_server(app_main.app)
+    try:
+        reads = {
+            "GET /sessions?limit=50": "/sessions?limit=50",
+            "GET /sessions/{id}": f"/sessions/{some_id}",
+            "GET /sessions/stats": "/sessions/stats",
+            "GET /analytics/questions": f"/analytics/questions?exam_title={urllib.request.quote(exam_title)}",
+            "GET /sessions/export/batch (ndjson)": "/sessions/export/batch?format=ndjson",
+        }
+        for name, path in reads.items():
+            bench(results, name, lambda: _get(base + path), args.repeat)
+    finally:
+        server.should_exit = True
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tesseract": tesseract,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if out_path:
+        out_path.write_text(json.dumps(report, indent=2))
+        print(f"Wrote {out_path}")
+
+    if baseline:
+        print("\nChange vs baseline (median):")
+        for name, r in results.items():
+            old = baseline.get("results", {}).get(name, {})
+            if "medianMs" in r and "medianMs" in old and old["medianMs"]:
+                delta = (r["medianMs"] - old["medianMs"]) / old["medianMs"] * 100
+                print(f"  {name:<48} {old['medianMs']:>10.2f} → {r['medianMs']:>10.2f} ms  ({delta:+.1f}%)")
+    return report
+
+
+if __name__ == "__main__":
+    main()
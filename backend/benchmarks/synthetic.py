@@ -0,0 +1,87 @@
+"""
+synthetic.py — Deterministic synthetic answer sheets.
+Pages carry "Q1 … Qn" labels followed by a few lines of answer text, with
+optional noise, so region detection and OCR have realistic work to do.
+"""
+import random
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Page sizes in pixels at common scan resolutions (A4)
+PAGE_SIZES = {
+    "a4-100": (827, 1169),
+    "a4-150": (1240, 1754),
+    "a4-200": (1654, 2339),
+    "a4-300": (2480, 3508),
+}
+
+_WORDS = (
+    "current voltage resistance ohm law proportional conductor temperature transformer "
+    "primary secondary coil mutual induction flux step up down turns ratio series parallel "
+    "equivalent formula substitute therefore hence answer unit power energy charge field"
+).split()
+
+
+def _answer_lines(rng: random.Random, n_lines: int) -> list[str]:
+    lines = []
+    for _ in range(n_lines):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(5, 10))]
+        if rng.random() < 0.3:
+            words.append(f"= {rng.randint(1, 99)}.{rng.randint(0, 9)}")
+        lines.append(" ".join(words))
+    return lines
+
+
+def generate_sheet(
+    n_questions: int = 3,
+    size: str = "a4-150",
+    noise: float = 0.0,
+    seed: int = 0,
+    first_question: int = 1,
+) -> Image.Image:
+    """One answer-sheet page with Q labels; noise in [0, 1] adds grain and specks."""
+    width, height = PAGE_SIZES[size]
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+
+    scale = width / PAGE_SIZES["a4-150"][0]
+    font = ImageFont.load_default(size=max(12, int(28 * scale)))
+    line_h = int(42 * scale)
+    margin = int(80 * scale)
+    band = (height - 2 * margin) // max(n_questions, 1)
+
+    for i in range(n_questions):
+        y = margin + i * band
+        draw.text((margin, y), f"Q{first_question + i}.", fill="black", font=font)
+        for j, line in enumerate(_answer_lines(rng, min(6, max(1, band // line_h - 2)))):
+            draw.text((margin + int(90 * scale), y + (j + 1) * line_h), line, fill="black", font=font)
+
+    if noise > 0:
+        np_rng = np.random.default_rng(seed)
+        arr = np.asarray(img, dtype=np.int16)
+        arr = arr + np_rng.normal(0, 40 * noise, arr.shape[:2])[..., None].astype(np.int16)
+        n_specks = int(2000 * noise * scale * scale)
+        ys = np_rng.integers(0, height, n_specks)
+        xs = np_rng.integers(0, width, n_specks)
+        arr[ys, xs] = 0
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img
+
+
+def write_sheet(path: Path, **kwargs) -> Path:
+    generate_sheet(**kwargs).save(path, "PNG")
+    return path
+
+
+def write_pdf(path: Path, n_pages: int = 4, n_questions: int = 3, size: str = "a4-150",
+              noise: float = 0.0, seed: int = 0, dpi: int = 150) -> Path:
+    """Multi-page PDF; questions continue numbering across pages."""
+    pages = [
+        generate_sheet(n_questions, size, noise, seed + p, first_question=1 + p * n_questions)
+        for p in range(n_pages)
+    ]
+    pages[0].save(path, "PDF", save_all=True, append_images=pages[1:], resolution=dpi)
+    return path
@@ -7,15 +7,19 @@ from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 load_dotenv()
 
-from database import engine, Base
-import models  # noqa: F401 — ensures all models are registered for table creation
+from database import init_db
+import models  # noqa: F401 — ensures all models are registered before the first query
 
 # ── Create all DB tables on startup ─────────────────────────────────────────
-Base.metadata.create_all(bind=engine)
+# Set DB_CREATE_ALL=0 on API replicas once the schema exists (the worker creates it too)
+if os.getenv("DB_CREATE_ALL", "1") != "0":
+    init_db()
 
 # ── Ensure uploads directory exists ─────────────────────────────────────────
 Path("uploads").mkdir(exist_ok=True)
@@ -24,8 +28,20 @@ app = FastAPI(
     title="GradeGlide API",
     description="AI-powered answer sheet grading for CBSE/ICSE tutors",
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
+# ── Admission control — added before CORS so rejections still carry CORS headers ──
+from services.admission import AdmissionMiddleware, Overloaded
+
+app.add_middleware(AdmissionMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    return ORJSONResponse(exc.body(), status_code=exc.status, headers=exc.headers())
+
+
 # ── CORS — allow the React dev server ───────────────────────────────────────
 app.add_middleware(
     CORSMiddleware,
@@ -35,7 +51,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ── Serve uploaded images directly (for the answer sheet viewer) ─────────────
+# ── Compress JSON/CSV responses above ~1 KB (review payloads carry full transcripts) ──
+# Images are already compressed, and gzip would break their byte-range responses
+class JSONGZipMiddleware(GZipMiddleware):
+    SKIP_PREFIXES = ("/images/", "/blobs/", "/uploads/")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(JSONGZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")))
+
+# ── Serve pre-blob-store uploads directly (new pages are read through /blobs and /images) ──
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # ── Include API routers ──────────────────────────────────────────────────────
@@ -43,11 +73,25 @@ from api.upload import router as upload_router
 from api.grading import router as grading_router
 from api.export import router as export_router
 from api.answer_keys import router as answer_keys_router
+from api.analytics import router as analytics_router
+from api.clusters import router as clusters_router
+from api.similarity import router as similarity_router
+from api.regrade import router as regrade_router
+from api.metrics import router as metrics_router
+from api.blobs import router as blobs_router
+from api.images import router as images_router
 
 app.include_router(upload_router)
 app.include_router(grading_router)
 app.include_router(export_router)
 app.include_router(answer_keys_router)
+app.include_router(analytics_router)
+app.include_router(clusters_router)
+app.include_router(similarity_router)
+app.include_router(regrade_router)
+app.include_router(metrics_router)
+app.include_router(blobs_router)
+app.include_router(images_router)
 
 
 @app.get("/")
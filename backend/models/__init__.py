@@ -2,3 +2,6 @@ from .session import GradingSession, AnswerSheetImage  # noqa: F401
 from .question import Question, QuestionStep          # noqa: F401
 from .result import GradingResult                      # noqa: F401
 from .answer_key import AnswerKey                      # noqa: F401
+from .similarity import TranscriptSignature, LshBucket  # noqa: F401
+from .job import QueuedJob                             # noqa: F401
+from .blob import Blob                                 # noqa: F401
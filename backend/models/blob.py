@@ -0,0 +1,22 @@
+"""
+blob.py — Reference counts for content-addressed blobs (see services/blob_store.py).
+The object itself lives in the blob backend under the same key.
+"""
+from datetime import datetime
+from sqlalchemy import String, Integer, BigInteger, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    # "ab/cd/<sha256><ext>"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=True)
+    # Rows / jobs holding the blob; -1 marks a blob being garbage-collected
+    refcount: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Set when refcount drops to 0; the object is collected after a grace period
+    released_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
@@ -0,0 +1,34 @@
+"""
+job.py — Grading work handed from the API process to a separate worker.
+Only used when GRADING_WORKER=external; otherwise jobs go straight to the
+in-process scheduler and this table stays empty.
+"""
+import uuid
+from datetime import datetime
+from sqlalchemy import String, Integer, Boolean, DateTime, Text, LargeBinary, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class QueuedJob(Base):
+    __tablename__ = "jobs"
+    # The worker's claim query: oldest queued job of the highest priority first
+    __table_args__ = (Index("ix_jobs_status_priority_created", "status", "priority", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # "module:function", for logs and metrics — the payload is what actually runs
+    name: Mapped[str] = mapped_column(String(200), nullable=False)
+    # pickle of (function, args, kwargs); functions pickle by reference
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    tenant: Mapped[str] = mapped_column(String(200), default="default")
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    offpeak: Mapped[bool] = mapped_column(Boolean, default=False)
+    # queued | running | done | failed
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    worker: Mapped[str] = mapped_column(String(200), nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # Renewed by the claiming worker's heartbeat; a running job past it is requeued
+    lease_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
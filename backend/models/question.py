@@ -17,6 +17,8 @@ class Question(Base):
     question_type: Mapped[str] = mapped_column(String(20), default="SHORT_ANSWER")
     # JSON string: {"x": 5, "y": 10, "w": 90, "h": 20}
     bbox_json: Mapped[str] = mapped_column(Text, nullable=True)
+    # Fingerprint of the answer-key entry this question was graded against (see api/regrade.py)
+    scheme_hash: Mapped[str] = mapped_column(String(64), nullable=True)
 
     session: Mapped["GradingSession"] = relationship(back_populates="questions")
     steps: Mapped[list["QuestionStep"]] = relationship(back_populates="question", cascade="all, delete-orphan", order_by="QuestionStep.order_index")
@@ -36,6 +38,7 @@ class QuestionStep(Base):
     label: Mapped[str] = mapped_column(Text, nullable=False)
     max_marks: Mapped[float] = mapped_column(Float, nullable=False, default=1.0)
     obtained_marks: Mapped[float] = mapped_column(Float, nullable=True)
+    ai_obtained_marks: Mapped[float] = mapped_column(Float, nullable=True)
     # correct | incorrect | low_confidence
     ai_status: Mapped[str] = mapped_column(String(20), default="low_confidence")
     ai_note: Mapped[str] = mapped_column(Text, nullable=True)
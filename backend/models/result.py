@@ -10,11 +10,19 @@ class GradingResult(Base):
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     question_id: Mapped[str] = mapped_column(String, ForeignKey("questions.id"), nullable=False, unique=True)
     obtained_marks: Mapped[float] = mapped_column(Float, nullable=True)
+    # Mark as first proposed by the grader — kept so teacher overrides can be compared
+    ai_obtained_marks: Mapped[float] = mapped_column(Float, nullable=True)
     # high | medium | low
     confidence: Mapped[str] = mapped_column(String(10), default="low")
     ai_remark: Mapped[str] = mapped_column(Text, nullable=True)
     # Raw OCR text of the student's answer
     transcript: Mapped[str] = mapped_column(Text, nullable=True)
     is_finalised: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Answers graded together by the cluster stage share a cluster_id; every member
+    # except the graded representative has is_propagated=True
+    cluster_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    is_propagated: Mapped[bool] = mapped_column(Boolean, default=False)
+    # How the grade was produced: blank | exact | local | model | fallback (None before grading)
+    grading_route: Mapped[str] = mapped_column(String(10), nullable=True)
 
     question: Mapped["Question"] = relationship(back_populates="result")
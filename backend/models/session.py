@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, Text
+from sqlalchemy import String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database import Base
 
@@ -9,29 +9,58 @@ from database import Base
 
 class GradingSession(Base):
     __tablename__ = "grading_sessions"
+    # Backs the keyset pagination in GET /sessions and the dashboard's recent feed
+    __table_args__ = (Index("ix_grading_sessions_created_at_id", "created_at", "id"),)
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     student_name: Mapped[str] = mapped_column(String(200), nullable=False)
     subject: Mapped[str] = mapped_column(String(100), nullable=False)
     exam_title: Mapped[str] = mapped_column(String(200), nullable=True)
+    # Marking scheme used at upload time (no FK — deleting a key leaves sessions intact)
+    answer_key_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    # Shared by every student session split out of one class upload
+    batch_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
     total_marks: Mapped[int] = mapped_column(default=0)
     obtained_marks: Mapped[float] = mapped_column(default=0.0)
     # pending | processing | ready | completed
-    status: Mapped[str] = mapped_column(String(20), default="pending")
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+    # Bumped on every mark edit / finalise — used for optimistic concurrency
+    version: Mapped[int] = mapped_column(default=1)
+    # JSON list of pipeline timing spans from the last processing run: [{"stage", "ms", ...}]
+    timings_json: Mapped[str] = mapped_column(Text, nullable=True)
+    # Blob key of the cProfile stats (marshalled pstats) of the last run uploaded with profile=true
+    profile_blob_key: Mapped[str] = mapped_column(String(100), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     images: Mapped[list["AnswerSheetImage"]] = relationship(back_populates="session", cascade="all, delete-orphan")
     questions: Mapped[list["Question"]] = relationship(back_populates="session", cascade="all, delete-orphan")
 
+    def page_images(self) -> dict[int, "AnswerSheetImage"]:
+        """Rendered pages by page number, leaving out the uploaded file recorded alongside them."""
+        return {img.page_number: img for img in self.images if img.is_page}
+
+
+# page_number of the uploaded file itself; rendered pages are numbered from 1
+ORIGINAL_PAGE = 0
+
 
 class AnswerSheetImage(Base):
     __tablename__ = "answer_sheet_images"
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id: Mapped[str] = mapped_column(String, nullable=False)
+    session_id: Mapped[str] = mapped_column(String, ForeignKey("grading_sessions.id"), nullable=False)
+    # Blob store location for display/debugging; legacy rows hold a local path under uploads/
     file_path: Mapped[str] = mapped_column(Text, nullable=False)
+    # Content-addressed key in the blob store (None for rows written before it existed)
+    blob_key: Mapped[str] = mapped_column(String(100), nullable=True, index=True)
     original_filename: Mapped[str] = mapped_column(String(255), nullable=True)
     page_number: Mapped[int] = mapped_column(default=1)
 
     session: Mapped["GradingSession"] = relationship(back_populates="images")
+
+    @property
+    def is_page(self) -> bool:
+        """A page rendered by the pipeline (page_N.png), not the uploaded PDF / image itself."""
+        # Older releases recorded the upload as page 1 too; only the file name tells those apart
+        return self.page_number != ORIGINAL_PAGE and (self.original_filename or "").startswith("page_")
@@ -0,0 +1,35 @@
+"""
+similarity.py — MinHash signatures and LSH band buckets for student transcripts.
+Rows are written as results are committed, so copy detection never has to
+compare every pair of answers.
+"""
+from sqlalchemy import String, Integer, BigInteger, LargeBinary, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class TranscriptSignature(Base):
+    __tablename__ = "transcript_signatures"
+
+    result_id: Mapped[str] = mapped_column(String, ForeignKey("grading_results.id"), primary_key=True)
+    session_id: Mapped[str] = mapped_column(String, nullable=False)
+    q_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    answer_key_id: Mapped[str] = mapped_column(String, nullable=True)
+    exam_title: Mapped[str] = mapped_column(String(200), nullable=True)
+    # NUM_PERM little-endian uint32 MinHash values
+    signature: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class LshBucket(Base):
+    __tablename__ = "lsh_buckets"
+    __table_args__ = (
+        Index("ix_lsh_buckets_key", "answer_key_id", "q_number", "band", "bucket"),
+        Index("ix_lsh_buckets_exam", "exam_title", "q_number", "band", "bucket"),
+    )
+
+    result_id: Mapped[str] = mapped_column(String, ForeignKey("grading_results.id"), primary_key=True)
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    q_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    answer_key_id: Mapped[str] = mapped_column(String, nullable=True)
+    exam_title: Mapped[str] = mapped_column(String(200), nullable=True)
@@ -0,0 +1,234 @@
+"""
+admission.py — Admission control for the upload and extraction endpoints.
+
+Before work is accepted it must fit under every limit, globally and for the
+requesting tenant (X-Tenant-Id, "default" when absent):
+
+  queued jobs      jobs waiting to start, in the scheduler or the jobs table
+  in-flight pages  pages this API node has accepted but not finished with
+  in-flight bytes  upload bytes likewise
+  extractions      answer-key extractions running at once (they run on the API node)
+
+A tenant over its own share gets 429; the service as a whole over its limits
+gets 503. Both carry Retry-After and the queue position the work would have
+taken. AdmissionMiddleware applies the cheap checks from the request headers
+before the body is read; the route then reserves pages / bytes for the actual
+upload with admit() and releases the ticket when its job is done.
+
+Every limit is an env var (see .env.example); 0 disables it.
+"""
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+
+from fastapi.concurrency import run_in_threadpool
+
+from services.job_queue import queued_by_priority
+from services.metrics import ADMISSION_REJECTIONS
+from services.scheduler import scheduler, INTERACTIVE, BULK
+
+MB = 1024 * 1024
+
+
+def _limit(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+@dataclass
+class Limits:
+    max_queued_jobs: int = _limit("ADMIT_MAX_QUEUED_JOBS", 500)
+    tenant_max_queued_jobs: int = _limit("ADMIT_TENANT_MAX_QUEUED_JOBS", 150)
+    max_inflight_pages: int = _limit("ADMIT_MAX_INFLIGHT_PAGES", 2000)
+    tenant_max_inflight_pages: int = _limit("ADMIT_TENANT_MAX_INFLIGHT_PAGES", 600)
+    max_inflight_bytes: int = _limit("ADMIT_MAX_INFLIGHT_MB", 2048) * MB
+    tenant_max_inflight_bytes: int = _limit("ADMIT_TENANT_MAX_INFLIGHT_MB", 512) * MB
+    max_extractions: int = _limit("ADMIT_MAX_EXTRACTIONS", 4)
+    tenant_max_extractions: int = _limit("ADMIT_TENANT_MAX_EXTRACTIONS", 2)
+    # Rough time one queued job holds a worker, for the Retry-After estimate
+    seconds_per_job: float = float(os.getenv("ADMIT_SECONDS_PER_JOB", "20"))
+
+
+def _over(value: int, limit: int) -> bool:
+    return bool(limit) and value > limit
+
+
+class Overloaded(Exception):
+    """429 / 503 with a Retry-After estimate; 413 (retry_after None) for work that can never fit."""
+
+    def __init__(self, status: int, reason: str, retry_after: int | None, queue_position: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+    def body(self) -> dict:
+        return {"detail": self.reason, "retryAfter": self.retry_after, "queuePosition": self.queue_position}
+
+    def headers(self) -> dict:
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+
+
+@dataclass
+class Ticket:
+    """Pages / bytes / an extraction slot held for one accepted request."""
+    tenant: str
+    pages: int
+    nbytes: int
+    extraction: bool
+    queue_position: int
+    controller: "AdmissionController"
+    _released: bool = False
+
+    def release(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        # Re-entrant: admit() holds it across check() and the reservation
+        self._lock = threading.RLock()
+        self._pages: dict[str, int] = defaultdict(int)
+        self._bytes: dict[str, int] = defaultdict(int)
+        self._extractions: dict[str, int] = defaultdict(int)
+
+    # ── Checks ────────────────────────────────────────────────────────────────
+
+    def _queue_position(self, tenant: str, priority: int | None) -> tuple[int, int, int]:
+        """(jobs queued in total, queued for this tenant, jobs ahead of new work at `priority`)."""
+        overall = queued_by_priority()
+        mine = queued_by_priority(tenant)
+        ahead = sum(n for p, n in overall.items() if priority is None or p <= priority)
+        return sum(overall.values()), sum(mine.values()), ahead + 1
+
+    def _retry_after(self, excess_jobs: int) -> int:
+        seconds = max(1, excess_jobs) * self.limits.seconds_per_job / max(1, scheduler.workers)
+        return max(1, min(600, math.ceil(seconds)))
+
+    def check(self, tenant: str, priority: int | None = INTERACTIVE, pages: int = 0, nbytes: int = 0,
+              extraction: bool = False) -> int:
+        """Raise Overloaded if the work would not fit; otherwise return its queue position."""
+        with self._lock:
+            return self._check(tenant, priority, pages, nbytes, extraction)
+
+    def _check(self, tenant: str, priority: int | None, pages: int, nbytes: int, extraction: bool) -> int:
+        lim = self.limits
+        if _over(pages, min(filter(None, (lim.tenant_max_inflight_pages, lim.max_inflight_pages)), default=0)) \
+                or _over(nbytes, min(filter(None, (lim.tenant_max_inflight_bytes, lim.max_inflight_bytes)), default=0)):
+            ADMISSION_REJECTIONS.inc(status=413, reason="too large")
+            raise Overloaded(413, f"upload too large: {pages} pages, {nbytes // MB} MB", None, 0)
+
+        queued, tenant_queued, position = self._queue_position(tenant, priority) if priority is not None else (0, 0, 1)
+        pages_held, bytes_held = self._pages.get(tenant, 0), self._bytes.get(tenant, 0)
+        extractions_held = self._extractions.get(tenant, 0)
+
+        def reject(status: int, reason: str, excess_jobs: int):
+            ADMISSION_REJECTIONS.inc(status=status, reason=reason.split(":")[0])
+            raise Overloaded(status, reason, self._retry_after(excess_jobs), position)
+
+        # The tenant's own share first — one busy tenant gets 429, not everyone 503
+        if priority is not None and _over(tenant_queued + 1, lim.tenant_max_queued_jobs):
+            reject(429, f"tenant queue full: {tenant_queued} jobs queued", tenant_queued - lim.tenant_max_queued_jobs + 1)
+        if _over(pages_held + pages, lim.tenant_max_inflight_pages):
+            reject(429, f"tenant page budget exhausted: {pages_held} pages in flight", tenant_queued)
+        if _over(bytes_held + nbytes, lim.tenant_max_inflight_bytes):
+            reject(429, f"tenant upload budget exhausted: {bytes_held // MB} MB in flight", tenant_queued)
+        if extraction and _over(extractions_held + 1, lim.tenant_max_extractions):
+            reject(429, f"tenant extraction limit: {extractions_held} running", 1)
+
+        if priority is not None and _over(queued + 1, lim.max_queued_jobs):
+            reject(503, f"queue full: {queued} jobs queued", queued - lim.max_queued_jobs + 1)
+        if _over(sum(self._pages.values()) + pages, lim.max_inflight_pages):
+            reject(503, f"page budget exhausted: {sum(self._pages.values())} pages in flight", position)
+        if _over(sum(self._bytes.values()) + nbytes, lim.max_inflight_bytes):
+            reject(503, f"upload budget exhausted: {sum(self._bytes.values()) // MB} MB in flight", position)
+        if extraction and _over(sum(self._extractions.values()) + 1, lim.max_extractions):
+            reject(503, f"extraction limit: {sum(self._extractions.values())} running", 1)
+        return position
+
+    def admit(self, tenant: str, priority: int | None = INTERACTIVE, pages: int = 0, nbytes: int = 0,
+              extraction: bool = False) -> Ticket:
+        """Check and reserve in one step. Release the ticket when the work is done."""
+        with self._lock:
+            position = self._check(tenant, priority, pages, nbytes, extraction)
+            self._pages[tenant] += pages
+            self._bytes[tenant] += nbytes
+            self._extractions[tenant] += int(extraction)
+        return Ticket(tenant, pages, nbytes, extraction, position, self)
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            if ticket._released:
+                return
+            ticket._released = True
+            self._pages[ticket.tenant] -= ticket.pages
+            self._bytes[ticket.tenant] -= ticket.nbytes
+            self._extractions[ticket.tenant] -= int(ticket.extraction)
+            for counts in (self._pages, self._bytes, self._extractions):
+                if not counts[ticket.tenant]:
+                    del counts[ticket.tenant]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pages": sum(self._pages.values()),
+                "bytes": sum(self._bytes.values()),
+                "extractions": sum(self._extractions.values()),
+            }
+
+
+admission = AdmissionController(Limits())
+
+
+# ── Early rejection ───────────────────────────────────────────────────────────
+
+# (method, path) → priority of the work it queues; None for work done in the request
+ADMITTED_ROUTES = {
+    ("POST", "/upload/session"): INTERACTIVE,
+    ("POST", "/upload/class"): BULK,
+    ("POST", "/answer-keys/extract"): None,
+}
+
+
+class AdmissionMiddleware:
+    """
+    Turn requests away from the headers alone, before a large body is received:
+    full queues, and a Content-Length that could not fit in the byte budget.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = (scope.get("method"), scope.get("path")) if scope["type"] == "http" else None
+        if route not in ADMITTED_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        tenant = headers.get("x-tenant-id") or "default"
+        try:
+            nbytes = int(headers.get("content-length", "0"))
+        except ValueError:
+            nbytes = 0
+        priority = ADMITTED_ROUTES[route]
+        try:
+            # In external mode the queue depth comes from the jobs table — keep it off the event loop
+            await run_in_threadpool(admission.check, tenant, priority, nbytes=nbytes, extraction=priority is None)
+        except Overloaded as e:
+            body = json.dumps(e.body()).encode()
+            await send({
+                "type": "http.response.start",
+                "status": e.status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ] + [(k.lower().encode(), v.encode()) for k, v in e.headers().items()],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
@@ -1,32 +1,54 @@
 """
 ai_grader.py — Grade student answers using Google Gemini 1.5 Flash (free tier).
-Falls back to a deterministic heuristic when the API key is not set.
+Falls back to the offline local scorer when the API key is not set.
 """
 import os
 import json
 import re
-from PIL import Image
+import numpy as np
 import io
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from services.ocr_service import ink_bbox
+from services.scheduler import scheduler
+from services.metrics import span, MODEL_FALLBACKS
+
+from services.local_scorer import score_answer
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# google.generativeai takes the better part of a second to import — load it with the model
+GEMINI_AVAILABLE = find_spec("google.generativeai") is not None
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Send requests to another Gemini-compatible server instead (e.g. benchmarks/fake_gemini.py)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
 
 # Confidence thresholds
 HIGH_CONF = 0.85
 MED_CONF = 0.65
 
+# Image payload budget for each grading request
+IMAGE_MAX_DIM = int(os.getenv("GRADER_IMAGE_MAX_DIM", "1024"))
+IMAGE_MAX_BYTES = int(os.getenv("GRADER_IMAGE_MAX_BYTES", "120000"))
+# Mean Tesseract word confidence (0-100) above which the transcript alone is trusted
+IMAGE_SKIP_OCR_CONF = float(os.getenv("GRADER_IMAGE_SKIP_OCR_CONF", "90"))
+MIN_QUALITY = 35
+
 _model = None
 
 
 def _get_model():
     global _model
     if _model is None and GEMINI_AVAILABLE and GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
+        import google.generativeai as genai
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=GEMINI_API_KEY, transport="rest",
+                            client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=GEMINI_API_KEY)
         _model = genai.GenerativeModel("gemini-1.5-flash")
     return _model
 
@@ -67,23 +89,61 @@ Rules:
 """
 
 
-def _pil_to_bytes(img: Image.Image) -> bytes:
+def _ink_crop(gray: "Image.Image") -> "Image.Image | None":
+    """Tighten a grayscale crop to the bounding box of its ink; None if the crop is blank."""
+    box = ink_bbox(np.asarray(gray))
+    return gray.crop(box) if box else None
+
+
+def _encode(img: "Image.Image", quality: int) -> bytes:
     buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=85)
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
     return buf.getvalue()
 
 
+def _pil_to_bytes(img: "Image.Image") -> bytes | None:
+    """
+    Smallest useful JPEG of an answer crop: ink bounding box only, grayscale,
+    longest side at most IMAGE_MAX_DIM, and the highest quality that fits
+    IMAGE_MAX_BYTES. Returns None when the crop has no ink at all.
+    """
+    from PIL import Image
+
+    gray = _ink_crop(img.convert("L"))
+    if gray is None:
+        return None
+    gray.thumbnail((IMAGE_MAX_DIM, IMAGE_MAX_DIM), Image.LANCZOS)
+
+    while True:
+        # Binary search for the best quality within the budget
+        lo, hi, best = MIN_QUALITY, 85, None
+        while lo <= hi:
+            q = (lo + hi) // 2
+            data = _encode(gray, q)
+            if len(data) <= IMAGE_MAX_BYTES:
+                best, lo = data, q + 1
+            else:
+                hi = q - 1
+        if best is not None or min(gray.size) < 64:
+            return best or _encode(gray, MIN_QUALITY)
+        # Still too big at the lowest quality — shrink and retry
+        gray = gray.resize((int(gray.width * 0.75), int(gray.height * 0.75)), Image.LANCZOS)
+
+
 def grade_answer(
     question_text: str,
     question_type: str,
     max_marks: int,
     marking_scheme: list[dict],  # list of {step_key, label, max_marks}
     student_text: str,
-    cropped_image: Image.Image | None = None,
+    cropped_image: "Image.Image | None" = None,
+    expected_answer: str | None = None,
+    ocr_confidence: float | None = None,
 ) -> dict:
     """
     Grade a student answer using Gemini.
-    Returns a dict matching the GradingResult + QuestionStep shape.
+    Returns a dict matching the GradingResult + QuestionStep shape, with "route"
+    saying which grader produced it: "model", or "fallback" for the local scorer.
     """
     model = _get_model()
 
@@ -107,46 +167,44 @@ def grade_answer(
     if model:
         try:
             parts = [prompt]
-            if cropped_image:
-                parts.append({
-                    "mime_type": "image/jpeg",
-                    "data": _pil_to_bytes(cropped_image),
-                })
-            response = model.generate_content(parts)
-            raw = response.text.strip()
-            # Strip markdown code fences if present
-            raw = re.sub(r"^```json\s*|```$", "", raw, flags=re.MULTILINE).strip()
-            return json.loads(raw)
+            image_bytes = None
+            # A confidently read transcript needs no picture
+            if cropped_image and (ocr_confidence is None or ocr_confidence < IMAGE_SKIP_OCR_CONF):
+                image_bytes = _pil_to_bytes(cropped_image)
+            if image_bytes:
+                parts.append({"mime_type": "image/jpeg", "data": image_bytes})
+            # Per-tenant cap on concurrent model calls; the image size goes on the session's span
+            with scheduler.model_slot(), span("model_call", image_bytes=len(image_bytes or b"")):
+                response = model.generate_content(parts)
+            with span("parse"):
+                raw = response.text.strip()
+                # Strip markdown code fences if present
+                raw = re.sub(r"^```json\s*|```$", "", raw, flags=re.MULTILINE).strip()
+                return {**json.loads(raw), "route": "model"}
         except Exception as e:
-            print(f"[ai_grader] Gemini error: {e} — falling back to heuristic")
+            print(f"[ai_grader] Gemini error: {e} — falling back to local scorer")
+            MODEL_FALLBACKS.inc(reason="error")
+    else:
+        MODEL_FALLBACKS.inc(reason="no_model")
 
-    # ── Heuristic fallback (no API key or error) ──────────────────────────
-    return _heuristic_grade(question_type, max_marks, marking_scheme, student_text)
+    # ── Local fallback (no API key or error) ──────────────────────────────
+    return _local_grade(question_text, question_type, max_marks, marking_scheme, student_text, expected_answer)
 
 
-def _heuristic_grade(question_type, max_marks, marking_scheme, student_text):
+def _local_grade(question_text, question_type, max_marks, marking_scheme, student_text, expected_answer):
     """
-    Simple keyword-based heuristic for when Gemini is unavailable.
-    Always returns confidence=low so the teacher reviews manually.
+    Provisional marks from the offline scorer when Gemini is unavailable.
+    Confidence is capped at medium so the teacher still reviews every answer.
     """
-    has_text = bool(student_text and len(student_text.strip()) > 10)
-
-    steps = []
-    for s in (marking_scheme or []):
-        steps.append({
-            "step_key": s["step_key"],
-            "obtained_marks": None,
-            "ai_status": "low_confidence",
-            "ai_note": "Manual review required — Gemini API not configured",
-        })
-
-    return {
-        "obtained_marks": None,
-        "confidence": "low",
-        "ai_remark": (
-            "Gemini API key not configured. Please enter marks manually."
-            if not GEMINI_API_KEY
-            else "Could not parse AI response. Please verify manually."
-        ),
-        "steps": steps,
-    }
+    grading = score_answer(question_text, question_type, max_marks, marking_scheme or [],
+                           student_text, expected_answer)
+    if grading["confidence"] == "high":
+        grading["confidence"] = "medium"
+    reason = (
+        "Gemini API key not configured"
+        if not GEMINI_API_KEY
+        else "Could not parse AI response"
+    )
+    grading["ai_remark"] = f"{reason} — provisional offline score, please verify."
+    grading["route"] = "fallback"
+    return grading
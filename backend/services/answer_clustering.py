@@ -0,0 +1,110 @@
+"""
+answer_clustering.py — Group identical / near-identical student answers.
+Transcripts are normalised, exact duplicates are merged first, and the
+remaining groups are joined by Jaccard similarity of character shingles.
+"""
+import re
+import unicodedata
+import zlib
+
+# Character n-gram size for shingling — short enough to survive OCR noise
+SHINGLE_SIZE = 5
+# Minimum Jaccard similarity to a cluster leader to join the cluster
+DEFAULT_THRESHOLD = 0.8
+# Normalised answers shorter than this are treated as blank
+BLANK_MAX_CHARS = 3
+
+_STRIP_RE = re.compile(r"[^\w\s=+\-*/^.%()]")
+_SENTENCE_DOT_RE = re.compile(r"(?<!\d)\.|\.(?!\d)")  # full stops, but not decimal points
+_SPACE_RE = re.compile(r"\s+")
+_OPERATOR_RE = re.compile(r"\s*([=+\-*/^])\s*")
+
+
+def normalise(text: str | None) -> str:
+    """Lower-case, unify unicode forms, drop stray punctuation and collapse whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = text.replace("'", "").replace("\u2019", "")   # "ohm's" → "ohms"
+    text = _STRIP_RE.sub(" ", text)
+    text = _SENTENCE_DOT_RE.sub(" ", text)
+    text = _OPERATOR_RE.sub(r"\1", text)                 # "v = i r" → "v=i r"
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set[int]:
+    """Hashed character k-grams of already-normalised text."""
+    if len(text) <= k:
+        return {zlib.crc32(text.encode())} if text else set()
+    return {zlib.crc32(text[i:i + k].encode()) for i in range(len(text) - k + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def cluster_transcripts(
+    transcripts: list[str | None],
+    threshold: float = DEFAULT_THRESHOLD,
+    leaders: set[int] | None = None,
+) -> list[list[int]]:
+    """
+    Cluster transcripts, returning lists of indices into `transcripts`.
+    The first index of each cluster is its representative.
+
+    `leaders` marks indices that should be preferred as representatives
+    (e.g. answers that already carry a trusted grade).
+    """
+    leaders = leaders or set()
+
+    # 1. Exact duplicates after normalisation (blanks all land in "")
+    groups: dict[str, list[int]] = {}
+    for i, t in enumerate(transcripts):
+        norm = normalise(t)
+        key = "" if len(norm) < BLANK_MAX_CHARS else norm
+        groups.setdefault(key, []).append(i)
+
+    blanks = groups.pop("", None)
+
+    # 2. Greedy leader clustering over the distinct forms, trusted/most common first,
+    #    with an inverted shingle index so each form is only compared to candidates
+    ordered = sorted(
+        groups.items(),
+        key=lambda kv: (not any(i in leaders for i in kv[1]), -len(kv[1])),
+    )
+    clusters: list[list[int]] = []
+    leader_shingles: list[set[int]] = []
+    index: dict[int, list[int]] = {}
+
+    for norm, members in ordered:
+        sh = shingles(norm)
+        best, best_sim = None, threshold
+        seen = set()
+        for s in sh:
+            for c in index.get(s, ()):
+                if c in seen:
+                    continue
+                seen.add(c)
+                sim = jaccard(sh, leader_shingles[c])
+                if sim >= best_sim:
+                    best, best_sim = c, sim
+        if best is None:
+            for s in sh:
+                index.setdefault(s, []).append(len(clusters))
+            clusters.append(list(members))
+            leader_shingles.append(sh)
+        else:
+            clusters[best].extend(members)
+
+    if blanks:
+        clusters.append(blanks)
+
+    # Put a preferred leader first in each cluster
+    for members in clusters:
+        for pos, i in enumerate(members):
+            if i in leaders:
+                members.insert(0, members.pop(pos))
+                break
+    return clusters
@@ -6,45 +6,39 @@ Falls back gracefully when libraries or API key are missing.
 import os
 import json
 import re
+from importlib.util import find_spec
 from pathlib import Path
 
+# Optional libraries are only checked for here and imported on first use —
+# most processes never extract an answer key, so they shouldn't pay to load them
+
 # ── Optional PDF text extraction ─────────────────────────────────────────────
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+PDFPLUMBER_AVAILABLE = find_spec("pdfplumber") is not None
 
 # ── Optional DOCX text extraction ────────────────────────────────────────────
-try:
-    from docx import Document as DocxDocument
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+DOCX_AVAILABLE = find_spec("docx") is not None
 
 # ── Optional Tesseract fallback ───────────────────────────────────────────────
-try:
-    import pytesseract
-    from PIL import Image
-    TESSERACT_AVAILABLE = True
-except ImportError:
-    TESSERACT_AVAILABLE = False
+TESSERACT_AVAILABLE = find_spec("pytesseract") is not None and find_spec("PIL") is not None
 
 # ── Gemini ────────────────────────────────────────────────────────────────────
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+GEMINI_AVAILABLE = find_spec("google.generativeai") is not None
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Send requests to another Gemini-compatible server instead (e.g. benchmarks/fake_gemini.py)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
 
 _model = None
 
 def _get_model():
     global _model
     if _model is None and GEMINI_AVAILABLE and GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
+        import google.generativeai as genai
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=GEMINI_API_KEY, transport="rest",
+                            client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=GEMINI_API_KEY)
         _model = genai.GenerativeModel("gemini-1.5-flash")
     return _model
 
@@ -54,6 +48,7 @@ def _get_model():
 def _extract_text_from_pdf(file_path: str) -> str:
     if PDFPLUMBER_AVAILABLE:
         try:
+            import pdfplumber
             with pdfplumber.open(file_path) as pdf:
                 return "\n".join(
                     page.extract_text() or "" for page in pdf.pages
@@ -64,10 +59,11 @@ def _extract_text_from_pdf(file_path: str) -> str:
     # Tesseract fallback for scanned PDFs
     if TESSERACT_AVAILABLE:
         try:
+            from services import ocr_cache
             from services.pdf_processor import file_to_images
             images = file_to_images(file_path)
             return "\n".join(
-                pytesseract.image_to_string(img, lang="eng") for img in images
+                ocr_cache.image_to_string(img, lang="eng") for img in images
             ).strip()
         except Exception as e:
             print(f"[extractor] OCR fallback failed: {e}")
@@ -79,6 +75,7 @@ def _extract_text_from_docx(file_path: str) -> str:
     if not DOCX_AVAILABLE:
         return ""
     try:
+        from docx import Document as DocxDocument
         doc = DocxDocument(file_path)
         return "\n".join(para.text for para in doc.paragraphs if para.text.strip())
     except Exception as e:
@@ -97,8 +94,10 @@ def extract_text(file_path: str) -> str:
         # Image file — use Tesseract directly
         if TESSERACT_AVAILABLE:
             try:
+                from PIL import Image
+                from services import ocr_cache
                 img = Image.open(file_path)
-                return pytesseract.image_to_string(img, lang="eng").strip()
+                return ocr_cache.image_to_string(img, lang="eng").strip()
             except Exception as e:
                 print(f"[extractor] image OCR failed: {e}")
     return ""
@@ -142,6 +141,7 @@ Rules:
 - Use LONG_ANSWER for descriptive questions with step-wise marks
 - Use NUMERICAL for calculation/problem-solving questions with step-wise marks
 - steps is always a list (empty [] for SHORT_ANSWER)
+- If the key states a model answer or final numerical result, add it as "answer" (a string); otherwise omit "answer"
 - step_key must be a single lowercase letter: a, b, c, d, ...
 - max_marks should be a number (integer or half-mark increments like 0.5)
 - If you cannot parse any questions from the text, return an empty array: []
@@ -0,0 +1,352 @@
+"""
+blob_store.py — Content-addressed storage for uploads and rendered pages.
+
+Keys are the SHA-256 of the content, sharded two levels deep
+("ab/cd/abcd…ef.png"), so an identical file is stored once and any API or
+worker node can read what another wrote. The blobs table counts references;
+a released blob is deleted by collect_garbage() after a grace period.
+
+BLOB_BACKEND=local (default): files under BLOB_ROOT (uploads/blobs) — share
+  the directory between nodes, or use
+BLOB_BACKEND=s3: S3_BUCKET on AWS or any S3-compatible server (S3_ENDPOINT_URL
+  for MinIO or a local stand-in). Needs boto3 (optional).
+
+  python -m services.blob_store gc      collect released blobs now
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from importlib.util import find_spec
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.blob import Blob
+
+BOTO3_AVAILABLE = find_spec("boto3") is not None
+
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+BLOB_ROOT = os.getenv("BLOB_ROOT", "uploads/blobs")
+# Released blobs older than this are deleted by collect_garbage()
+BLOB_GC_GRACE = int(os.getenv("BLOB_GC_GRACE", "3600"))
+# Lifetime of presigned read URLs (S3 backend)
+BLOB_URL_TTL = int(os.getenv("BLOB_URL_TTL", "900"))
+
+CHUNK_SIZE = 256 * 1024
+
+_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+
+
+def make_key(digest: str, ext: str = "") -> str:
+    ext = ext.lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext):
+        ext = ""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_blob_key(ref: str | None) -> bool:
+    return bool(ref and _KEY_RE.match(ref))
+
+
+def content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def write_file(self, key: str, src: str):
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Copy beside the target, then rename — readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def open(self, key: str) -> BinaryIO:
+        return self._path(key).open("rb")
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[str]:
+        yield str(self._path(key))
+
+    def signed_url(self, key: str, expires: int) -> str | None:
+        return None   # served by GET /blobs/{key}
+
+    def describe(self, key: str) -> str:
+        return str(self._path(key))
+
+
+class S3Backend:
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None, region: str | None = None):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("BLOB_BACKEND=s3 needs boto3. Run: pip install boto3")
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def write_file(self, key: str, src: str):
+        self.client.upload_file(src, self.bucket, self._key(key), ExtraArgs={"ContentType": content_type(key)})
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[str]:
+        # pdf2image and friends want a real file
+        fd, tmp = tempfile.mkstemp(suffix=Path(key).suffix)
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(key), tmp)
+            yield tmp
+        finally:
+            os.unlink(tmp)
+
+    def signed_url(self, key: str, expires: int) -> str | None:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(key)}, ExpiresIn=expires,
+        )
+
+    def describe(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+
+class BlobStore:
+    """Reference-counted, content-addressed blobs on top of a backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def put_file(self, src: str | Path, ext: str | None = None) -> str:
+        """Store a file and take one reference to it. Returns the blob key."""
+        src = str(src)
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        key = make_key(digest.hexdigest(), Path(src).suffix if ext is None else ext)
+        self._add_ref(key, os.path.getsize(src), lambda: self.backend.write_file(key, src))
+        return key
+
+    def put_stream(self, stream: BinaryIO, ext: str = "") -> str:
+        """Store everything read from `stream` (e.g. an UploadFile) and take one reference."""
+        fd, tmp = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+            return self.put_file(tmp, ext)
+        finally:
+            os.unlink(tmp)
+
+    def put_bytes(self, data: bytes, ext: str = "") -> str:
+        fd, tmp = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            return self.put_file(tmp, ext)
+        finally:
+            os.unlink(tmp)
+
+    def _add_ref(self, key: str, size: int, write):
+        db = SessionLocal()
+        try:
+            for _ in range(100):
+                # Already stored (or released but not yet collected) — just count the reference
+                bumped = db.execute(
+                    update(Blob)
+                    .where(Blob.key == key, Blob.refcount >= 0)
+                    .values(refcount=Blob.refcount + 1, released_at=None)
+                ).rowcount
+                db.commit()
+                if bumped:
+                    return
+                # New blob: claim the row first, then write. A row being collected
+                # (refcount -1) blocks the insert until its object is gone.
+                db.add(Blob(key=key, size=size, content_type=content_type(key), refcount=1))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                    time.sleep(0.05)
+                    continue
+                try:
+                    write()
+                except Exception:
+                    db.execute(delete(Blob).where(Blob.key == key))
+                    db.commit()
+                    raise
+                return
+            raise RuntimeError(f"Blob {key} is stuck in garbage collection")
+        finally:
+            db.close()
+
+    def acquire(self, key: str):
+        """Take another reference to an existing blob."""
+        db = SessionLocal()
+        try:
+            if not db.execute(
+                update(Blob).where(Blob.key == key, Blob.refcount >= 0)
+                .values(refcount=Blob.refcount + 1, released_at=None)
+            ).rowcount:
+                raise KeyError(key)
+            db.commit()
+        finally:
+            db.close()
+
+    def release(self, key: str):
+        """Drop one reference; at zero the blob becomes eligible for garbage collection."""
+        db = SessionLocal()
+        try:
+            db.execute(update(Blob).where(Blob.key == key, Blob.refcount > 0).values(refcount=Blob.refcount - 1))
+            db.execute(
+                update(Blob).where(Blob.key == key, Blob.refcount == 0).values(released_at=datetime.utcnow())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def collect_garbage(self, grace_seconds: int = BLOB_GC_GRACE) -> int:
+        """Delete blobs released more than `grace_seconds` ago. Returns how many were deleted."""
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        db = SessionLocal()
+        deleted = 0
+        try:
+            # refcount -1: a collection that was interrupted — finish it
+            keys = [k for (k,) in db.query(Blob.key).filter(Blob.refcount <= 0, Blob.released_at <= cutoff)]
+            for key in keys:
+                # Tombstone first so a concurrent put waits instead of resurrecting a half-deleted blob
+                won = db.execute(
+                    update(Blob).where(Blob.key == key, Blob.refcount <= 0).values(refcount=-1)
+                ).rowcount
+                db.commit()
+                if not won:
+                    continue
+                try:
+                    self.backend.delete(key)
+                except Exception as e:
+                    print(f"[blob_store] Could not delete {key}: {e}")
+                    db.execute(update(Blob).where(Blob.key == key).values(refcount=0))
+                    db.commit()
+                    continue
+                db.execute(delete(Blob).where(Blob.key == key))
+                db.commit()
+                deleted += 1
+            return deleted
+        finally:
+            db.close()
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+    # `ref` is a blob key, or a local path from before the blob store existed
+
+    def read_bytes(self, ref: str) -> bytes:
+        if not is_blob_key(ref):
+            return Path(ref).read_bytes()
+        with self.backend.open(ref) as f:
+            return f.read()
+
+    def iter_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with self.backend.open(key) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+
+    @contextmanager
+    def local_path(self, ref: str) -> Iterator[str]:
+        """A filesystem path to the content for the duration of the block."""
+        if not is_blob_key(ref):
+            yield ref
+            return
+        with self.backend.local_path(ref) as path:
+            yield path
+
+    def exists(self, key: str) -> bool:
+        return self.backend.exists(key)
+
+    def size(self, key: str) -> int:
+        return self.backend.size(key)
+
+    def signed_url(self, key: str, expires: int = BLOB_URL_TTL) -> str | None:
+        """A time-limited direct URL, when the backend can issue one."""
+        return self.backend.signed_url(key, expires)
+
+    def describe(self, key: str) -> str:
+        return self.backend.describe(key)
+
+
+def _backend_from_env():
+    if BLOB_BACKEND == "s3":
+        return S3Backend(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.getenv("S3_PREFIX", ""),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            region=os.getenv("S3_REGION"),
+        )
+    return LocalBackend(BLOB_ROOT)
+
+
+blob_store = BlobStore(_backend_from_env())
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["gc"]:
+        print(f"[blob_store] Collected {blob_store.collect_garbage()} blob(s)")
+    else:
+        print("usage: python -m services.blob_store gc")
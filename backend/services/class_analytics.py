@@ -0,0 +1,130 @@
+"""
+class_analytics.py — Item statistics over every graded paper for one exam.
+All per-question and per-step numbers are computed column-wise with NumPy
+on a students × items score matrix.
+"""
+import math
+import numpy as np
+
+# Share of students in the upper / lower groups for the discrimination index
+DISCRIMINATION_GROUP = 0.27
+MAX_HISTOGRAM_BINS = 10
+
+
+def _nan(v) -> float:
+    return np.nan if v is None else float(v)
+
+
+def _round(v, ndigits: int = 3):
+    v = float(v)
+    return None if math.isnan(v) else round(v, ndigits)
+
+
+def _nanmean(a: np.ndarray) -> np.ndarray:
+    """Column means ignoring NaN, NaN for empty columns (without RuntimeWarnings)."""
+    count = (~np.isnan(a)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(a, axis=0) / count
+
+
+def _column_stats(scores: np.ndarray, ai: np.ndarray, max_marks: np.ndarray,
+                  upper: np.ndarray, lower: np.ndarray) -> list[dict]:
+    graded = ~np.isnan(scores)
+    n = graded.sum(axis=0)
+    both = graded & ~np.isnan(ai)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _nanmean(scores)
+        pct_zero = ((scores == 0) & graded).sum(axis=0) / n * 100
+        difficulty = mean / max_marks
+        discrimination = (_nanmean(scores[upper]) - _nanmean(scores[lower])) / max_marks
+        agreement = (np.isclose(scores, ai) & both).sum(axis=0) / both.sum(axis=0)
+
+    stats = []
+    for j in range(scores.shape[1]):
+        col = scores[graded[:, j], j]
+        top = max(int(math.ceil(max_marks[j])), 1)
+        if top + 1 <= MAX_HISTOGRAM_BINS:
+            # One bucket per whole mark (half marks round to the nearest bucket)
+            counts, edges = np.histogram(col, bins=top + 1, range=(-0.5, top + 0.5))
+        else:
+            counts, edges = np.histogram(col, bins=MAX_HISTOGRAM_BINS, range=(0, max_marks[j]))
+        stats.append({
+            "graded": int(n[j]),
+            "maxMarks": float(max_marks[j]),
+            "mean": _round(mean[j]),
+            "pctZero": _round(pct_zero[j], 1),
+            "difficulty": _round(difficulty[j]),
+            "discrimination": _round(discrimination[j]),
+            "aiAgreement": _round(agreement[j]),
+            "histogram": {
+                "edges": [round(float(e), 2) for e in edges],
+                "counts": counts.tolist(),
+            },
+        })
+    return stats
+
+
+def compute_item_statistics(question_rows: list[tuple], step_rows: list[tuple]) -> dict:
+    """
+    question_rows: (session_id, q_number, max_marks, obtained_marks, ai_obtained_marks)
+    step_rows:     (session_id, q_number, step_key, max_marks, obtained_marks, ai_obtained_marks)
+
+    difficulty     — mean / max (higher = easier)
+    discrimination — (upper-group mean − lower-group mean) / max, groups = top/bottom 27% by total
+    aiAgreement    — share of papers where the final mark equals the AI's original mark
+    """
+    if not question_rows:
+        return {"papers": 0, "questions": []}
+
+    q_arr = np.array(question_rows, dtype=object)
+    sessions, s_idx = np.unique(q_arr[:, 0].astype(str), return_inverse=True)
+    q_numbers, q_idx = np.unique(q_arr[:, 1].astype(int), return_inverse=True)
+
+    shape = (len(sessions), len(q_numbers))
+    scores = np.full(shape, np.nan)
+    ai = np.full(shape, np.nan)
+    scores[s_idx, q_idx] = [_nan(v) for v in q_arr[:, 3]]
+    ai[s_idx, q_idx] = [_nan(v) for v in q_arr[:, 4]]
+    q_max = np.zeros(len(q_numbers))
+    np.maximum.at(q_max, q_idx, q_arr[:, 2].astype(float))
+
+    # Upper / lower groups by paper total
+    totals = np.nansum(scores, axis=1)
+    order = np.argsort(totals, kind="stable")
+    k = max(1, int(round(len(sessions) * DISCRIMINATION_GROUP)))
+    lower, upper = order[:k], order[-k:]
+
+    q_stats = _column_stats(scores, ai, q_max, upper, lower)
+
+    # Steps: one column per (q_number, step_key), on the same paper rows
+    steps_by_q: dict[int, list[dict]] = {}
+    if step_rows:
+        st_arr = np.array(step_rows, dtype=object)
+        session_pos = {sid: i for i, sid in enumerate(sessions)}
+        keys = [(int(q), str(k)) for q, k in zip(st_arr[:, 1], st_arr[:, 2])]
+        step_keys = sorted(set(keys))
+        col_pos = {key: j for j, key in enumerate(step_keys)}
+
+        rows = np.array([session_pos.get(str(sid), -1) for sid in st_arr[:, 0]])
+        cols = np.array([col_pos[key] for key in keys])
+        keep = rows >= 0
+
+        st_shape = (len(sessions), len(step_keys))
+        st_scores = np.full(st_shape, np.nan)
+        st_ai = np.full(st_shape, np.nan)
+        st_scores[rows[keep], cols[keep]] = [_nan(v) for v in st_arr[keep, 4]]
+        st_ai[rows[keep], cols[keep]] = [_nan(v) for v in st_arr[keep, 5]]
+        st_max = np.zeros(len(step_keys))
+        np.maximum.at(st_max, cols, st_arr[:, 3].astype(float))
+
+        for (q_num, step_key), s in zip(step_keys, _column_stats(st_scores, st_ai, st_max, upper, lower)):
+            steps_by_q.setdefault(q_num, []).append({"stepKey": step_key, **s})
+
+    return {
+        "papers": len(sessions),
+        "questions": [
+            {"qNumber": int(q_num), **stats, "steps": steps_by_q.get(int(q_num), [])}
+            for q_num, stats in zip(q_numbers, q_stats)
+        ],
+    }
@@ -0,0 +1,76 @@
+"""
+class_splitter.py — Split one scanned class PDF into per-student page groups.
+Students are separated by a fixed page count, by blank separator sheets, or
+by cover pages (a "Name" / "Roll No" header near the top of the page).
+"""
+import re
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import numpy as np
+
+from services import ocr_cache
+from services.ocr_service import INK_THRESHOLD, TESSERACT_AVAILABLE
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# fixed | separator | cover
+SPLIT_MODES = ("fixed", "separator", "cover")
+
+# A page with less ink than this fraction of its pixels counts as blank
+BLANK_INK_FRACTION = 0.002
+# Fraction of the page height searched for a cover-page header
+COVER_HEADER_FRACTION = 0.25
+
+_COVER_RE = re.compile(r"\b(name|roll\s*no|candidate|admission\s*no)\b", re.IGNORECASE)
+
+
+def is_blank_page(image: "Image.Image") -> bool:
+    # Downsample first — the decision needs coverage, not detail
+    small = image.convert("L")
+    small.thumbnail((600, 600))
+    return float((np.asarray(small) < INK_THRESHOLD).mean()) < BLANK_INK_FRACTION
+
+
+def is_cover_page(image: "Image.Image") -> bool:
+    if not TESSERACT_AVAILABLE:
+        return False
+    header = image.crop((0, 0, image.width, int(image.height * COVER_HEADER_FRACTION)))
+    return bool(_COVER_RE.search(ocr_cache.image_to_string(header, lang="eng")))
+
+
+def split_students(
+    pages: Iterable["Image.Image"],
+    mode: str = "fixed",
+    pages_per_student: int | None = None,
+) -> Iterator[list["Image.Image"]]:
+    """
+    Group pages into students, yielding each group as soon as it is complete.
+    Separator pages are dropped; cover pages start (and stay in) their group.
+    """
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"Unknown split mode: {mode}")
+    if mode == "fixed" and not pages_per_student:
+        raise ValueError("pages_per_student is required for fixed splitting")
+
+    group: list["Image.Image"] = []
+    for page in pages:
+        if mode == "fixed":
+            group.append(page)
+            if len(group) == pages_per_student:
+                yield group
+                group = []
+        elif mode == "separator":
+            if is_blank_page(page):
+                if group:
+                    yield group
+                group = []
+            else:
+                group.append(page)
+        else:
+            if group and is_cover_page(page):
+                yield group
+                group = []
+            group.append(page)
+    if group:
+        yield group
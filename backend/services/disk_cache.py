@@ -0,0 +1,128 @@
+"""
+disk_cache.py — A size-bounded directory of cache files, evicted LRU.
+
+Files are named by a hex digest and sharded on its first two characters.
+Each hit refreshes the file's access time (explicitly, so noatime mounts
+don't matter); when the total passes max_bytes the least recently used
+files are deleted down to EVICT_TO of the limit. Several processes may
+share the directory: writes are atomic renames, and each process evicts
+from what is on disk.
+"""
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from services.metrics import CACHE_LOOKUPS
+
+# After an eviction pass the cache is at most this fraction of the limit
+EVICT_TO = 0.9
+
+
+class DiskLRU:
+    def __init__(self, name: str, root: str, max_bytes: int):
+        self.name = name
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._bytes: int | None = None   # counted lazily on the first write
+
+    def path_for(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.{ext}"
+
+    def lookup(self, path: Path) -> bool:
+        """True (and marked as recently used) if `path` is cached; counts the hit or miss."""
+        try:
+            # Only the access time moves; the mtime stays valid for Last-Modified / If-Range
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except FileNotFoundError:
+            self._count("miss")
+            return False
+        self._count("hit")
+        return True
+
+    def _count(self, result: str):
+        CACHE_LOOKUPS.inc(cache=self.name, result=result)
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write beside the target, then rename — concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._total()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict(keep=path)
+
+    def _files(self) -> list[Path]:
+        if not self.root.exists():
+            return []
+        return [f for f in self.root.glob("*/*") if not f.name.startswith(".tmp-")]
+
+    def _total(self) -> int:
+        total = 0
+        for f in self._files():
+            try:
+                total += f.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self, keep: Path):
+        """Delete least recently used files down to EVICT_TO of the limit, sparing `keep` (just written)."""
+        entries = []
+        for f in self._files():
+            if f == keep:
+                continue
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, st.st_size, f))
+        entries.sort()
+        total = sum(size for _, size, _ in entries) + keep.stat().st_size
+        target = self.max_bytes * EVICT_TO
+        for _, size, f in entries:
+            if total <= target:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+        self._bytes = total
+
+    def clear(self) -> int:
+        """Delete every cached file. Returns how many were removed."""
+        with self._lock:
+            files = self._files()
+            for f in files:
+                f.unlink(missing_ok=True)
+            self._bytes = 0
+            return len(files)
+
+    def stats(self) -> dict:
+        """Lookups seen by this process plus what is on disk now (shared with other processes)."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hitRate": round(hits / lookups, 4) if lookups else None,
+            **self.disk_usage(),
+        }
+
+    def disk_usage(self) -> dict:
+        """What is on disk now — the same from any process sharing the directory."""
+        return {"files": len(self._files()), "bytes": self._total(), "maxBytes": self.max_bytes}
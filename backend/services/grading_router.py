@@ -0,0 +1,76 @@
+"""
+grading_router.py — Decide which answers actually need the remote model.
+Blanks, exact matches to the model answer and high-confidence local scores
+are settled immediately; only the uncertain remainder goes to grade_answer.
+"""
+import os
+
+from services.ai_grader import grade_answer
+from services.answer_clustering import normalise, BLANK_MAX_CHARS
+from services.local_scorer import score_answers
+from services.metrics import span, GRADING_ROUTES
+
+# Set LOCAL_ROUTING=0 to send every non-blank answer to the model
+LOCAL_ROUTING = os.getenv("LOCAL_ROUTING", "1") != "0"
+
+# blank | exact | local | model | fallback (sent to the model, graded by the local scorer)
+ROUTES = ("blank", "exact", "local", "model", "fallback")
+
+
+def _full_marks(item: dict) -> dict:
+    return {
+        "obtained_marks": float(item["max_marks"]),
+        "confidence": "high",
+        "ai_remark": "Matches the model answer.",
+        "steps": [
+            {"step_key": s["step_key"], "obtained_marks": float(s["max_marks"]),
+             "ai_status": "correct", "ai_note": "Matches the model answer"}
+            for s in (item.get("marking_scheme") or [])
+        ],
+    }
+
+
+def route_answers(items: list[dict]) -> list[dict]:
+    """
+    Grade a batch of answers (score_answers item shape, plus optional
+    cropped_image and ocr_confidence), returning grade_answer-shaped dicts
+    with a "route" key. The local scorer runs once over the whole batch.
+    """
+    with span("local_score"):
+        local = score_answers(items)
+    out = []
+    for item, scored in zip(items, local):
+        norm = normalise(item.get("student_text"))
+        expected = normalise(item.get("expected_answer"))
+
+        if len(norm) < BLANK_MAX_CHARS:
+            grading, route = scored, "blank"
+        elif expected and norm == expected:
+            grading, route = _full_marks(item), "exact"
+        elif LOCAL_ROUTING and scored["confidence"] == "high":
+            grading, route = scored, "local"
+        else:
+            grading = grade_answer(
+                question_text=item["question_text"],
+                question_type=item["question_type"],
+                max_marks=item["max_marks"],
+                marking_scheme=item.get("marking_scheme") or [],
+                student_text=item.get("student_text"),
+                cropped_image=item.get("cropped_image"),
+                ocr_confidence=item.get("ocr_confidence"),
+                expected_answer=item.get("expected_answer"),
+            )
+            # grade_answer reports whether the model answered or it fell back to the local scorer
+            route = grading.get("route", "model")
+        GRADING_ROUTES.inc(route=route)
+        out.append({**grading, "route": route})
+    return out
+
+
+def routing_summary(routes: list[str | None]) -> dict:
+    """Per-route counts plus the number of model calls avoided."""
+    counts = {r: 0 for r in ROUTES}
+    for r in routes:
+        if r in counts:
+            counts[r] += 1
+    return {**counts, "modelCallsSaved": counts["blank"] + counts["exact"] + counts["local"]}
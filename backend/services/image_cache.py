@@ -0,0 +1,137 @@
+"""
+image_cache.py — Resized / cropped / re-encoded page images, cached on disk.
+
+A derivative is rendered once from its source page and kept under
+IMAGE_CACHE_DIR (uploads/derived), an LRU bounded by IMAGE_CACHE_MAX_MB
+(see services/disk_cache.py).
+
+Requested widths are rounded up to a fixed ladder (WIDTHS) so clients can't
+fill the cache with one-pixel variations.
+"""
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from services.blob_store import blob_store, is_blob_key
+from services.disk_cache import DiskLRU
+from services.metrics import span
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "uploads/derived")
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "512"))
+# Encoder quality for webp / jpeg
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+WIDTHS = (160, 320, 640, 960, 1280, 1600, 2400)
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+def snap_width(width: int | None) -> int | None:
+    """Round up to the next width on the ladder; None keeps the source width."""
+    if not width:
+        return None
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def parse_crop(crop: str | None) -> tuple[float, float, float, float] | None:
+    """'x,y,w,h' in percent of the page (the bbox_pct convention) → clamped tuple."""
+    if not crop:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in crop.split(","))
+    except ValueError:
+        raise ValueError("crop must be 'x,y,w,h' in percent")
+    x, y = min(max(x, 0.0), 100.0), min(max(y, 0.0), 100.0)
+    w, h = min(max(w, 0.0), 100.0 - x), min(max(h, 0.0), 100.0 - y)
+    if w <= 0 or h <= 0:
+        raise ValueError("crop is empty")
+    return round(x, 1), round(y, 1), round(w, 1), round(h, 1)
+
+
+def crop_param(bbox: dict | None) -> str | None:
+    """A question's bbox_pct as the crop query parameter."""
+    if not bbox:
+        return None
+    return ",".join(str(round(float(bbox.get(k, d)), 1)) for k, d in (("x", 0), ("y", 0), ("w", 100), ("h", 100)))
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    width: int | None = None
+    fmt: str = "webp"
+    crop: tuple[float, float, float, float] | None = None
+
+    def token(self) -> str:
+        crop = ",".join(map(str, self.crop)) if self.crop else "-"
+        return f"w={self.width or '-'};f={self.fmt};c={crop};q={IMAGE_QUALITY}"
+
+
+def render(data: bytes, spec: DerivativeSpec) -> bytes:
+    """Crop, downscale (never upscale) and encode one image."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if spec.crop:
+            x, y, w, h = spec.crop
+            W, H = img.size
+            box = (int(W * x / 100), int(H * y / 100), int(W * (x + w) / 100), int(H * (y + h) / 100))
+            img = img.crop((box[0], box[1], max(box[2], box[0] + 1), max(box[3], box[1] + 1)))
+        if spec.width and img.width > spec.width:
+            img = img.resize((spec.width, max(1, round(img.height * spec.width / img.width))), Image.LANCZOS)
+        if spec.fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        if spec.fmt == "png":
+            img.save(out, format="PNG", optimize=True)
+        else:
+            img.save(out, format=spec.fmt.upper(), quality=IMAGE_QUALITY)
+        return out.getvalue()
+
+
+def source_version(ref: str) -> str:
+    """
+    What a derivative of `ref` depends on. Blob keys name their content; a
+    legacy file path also includes its mtime and size.
+    """
+    if is_blob_key(ref):
+        return ref
+    st = os.stat(ref)
+    return f"{ref}:{st.st_mtime_ns}:{st.st_size}"
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+class DerivativeCache:
+    """Disk LRU of rendered derivatives, keyed on source version + spec."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.store = DiskLRU("image_derivatives", root, max_bytes)
+
+    def digest(self, version: str, spec: DerivativeSpec) -> str:
+        return hashlib.sha256(f"{version}|{spec.token()}".encode()).hexdigest()
+
+    def get_or_render(self, ref: str, version: str, spec: DerivativeSpec) -> Path:
+        """Path of the cached derivative, rendering it from `ref` on a miss."""
+        path = self.store.path_for(self.digest(version, spec), spec.fmt)
+        if self.store.lookup(path):
+            return path
+        with span("derive_image"):
+            data = render(blob_store.read_bytes(ref), spec)
+        self.store.write(path, data)
+        return path
+
+
+derivative_cache = DerivativeCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def derivative_url(ref: str, width: int | None = None, fmt: str = "webp", bbox: dict | None = None) -> str:
+    """URL of a page (or a bbox crop of it) served by GET /images/{key}."""
+    params = [f"fmt={fmt}"]
+    if width:
+        params.insert(0, f"w={snap_width(width)}")
+    crop = crop_param(bbox)
+    if crop:
+        params.append(f"crop={crop}")
+    return f"/images/{ref}?" + "&".join(params)
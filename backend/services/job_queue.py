@@ -0,0 +1,287 @@
+"""
+job_queue.py — Hand grading work to the scheduler, here or in a worker process.
+
+GRADING_WORKER=inline (default): enqueue() submits straight to the in-process
+scheduler, exactly as before.
+GRADING_WORKER=external: enqueue() writes a row to the jobs table and returns;
+`python worker.py` claims rows and runs them through its own scheduler, so
+the API process never loads the OCR / PDF / model stack.
+"""
+import os
+import pickle
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import func, update
+
+from database import SessionLocal
+from models.job import QueuedJob
+from services.scheduler import scheduler, INTERACTIVE
+
+GRADING_WORKER = os.getenv("GRADING_WORKER", "inline")
+# hostname:pid, so workers sharing a host never share an id
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+# Seconds a claimed job stays leased without a heartbeat before another worker may take it back
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# External mode: seconds a jobs-table queue count is reused, so admission checks don't query per request
+QUEUE_DEPTH_TTL = float(os.getenv("QUEUE_DEPTH_TTL", "1.0"))
+
+_depth_lock = threading.Lock()
+_depth: tuple[float, dict[tuple[str, int], int]] | None = None   # (taken at, {(tenant, priority): n})
+
+
+def enqueue(fn: Callable, *args, tenant: str = "default", priority: int = INTERACTIVE,
+            offpeak: bool = False, on_done: Callable | None = None, **kwargs):
+    """
+    Queue fn(*args, **kwargs). fn must be a module-level function and args picklable.
+    on_done runs in this process once the job has finished (inline) or has been
+    handed to the jobs table (external) — the point where this node is done with it.
+    """
+    if GRADING_WORKER != "external":
+        if on_done:
+            scheduler.submit(_run_then, on_done, fn, *args, tenant=tenant, priority=priority,
+                             offpeak=offpeak, **kwargs)
+        else:
+            scheduler.submit(fn, *args, tenant=tenant, priority=priority, offpeak=offpeak, **kwargs)
+        return
+
+    db = SessionLocal()
+    try:
+        db.add(QueuedJob(
+            name=f"{fn.__module__}:{fn.__qualname__}",
+            payload=pickle.dumps((fn, args, kwargs)),
+            tenant=tenant,
+            priority=priority,
+            offpeak=offpeak,
+        ))
+        db.commit()
+        _forget_depth()
+    finally:
+        db.close()
+        if on_done:
+            on_done()
+
+
+def _run_then(on_done: Callable, fn: Callable, *args, **kwargs):
+    try:
+        fn(*args, **kwargs)
+    finally:
+        on_done()
+
+
+def queued_by_priority(tenant: str | None = None) -> dict[int, int]:
+    """Jobs waiting to start per priority, for one tenant or all, wherever they are queued."""
+    if GRADING_WORKER != "external":
+        return scheduler.queued(tenant)
+    counts: dict[int, int] = defaultdict(int)
+    for (t, priority), n in _queued_jobs().items():
+        if tenant is None or t == tenant:
+            counts[priority] += n
+    return dict(counts)
+
+
+def _queued_jobs() -> dict[tuple[str, int], int]:
+    """Queued rows per (tenant, priority), counted at most once per QUEUE_DEPTH_TTL."""
+    global _depth
+    with _depth_lock:
+        if _depth is not None and time.monotonic() - _depth[0] < QUEUE_DEPTH_TTL:
+            return _depth[1]
+    db = SessionLocal()
+    try:
+        counts = {
+            (tenant, priority): n
+            for tenant, priority, n in db.query(QueuedJob.tenant, QueuedJob.priority, func.count())
+            .filter(QueuedJob.status == "queued")
+            .group_by(QueuedJob.tenant, QueuedJob.priority)
+        }
+    finally:
+        db.close()
+    with _depth_lock:
+        _depth = (time.monotonic(), counts)
+    return counts
+
+
+def _forget_depth():
+    """This process just queued a job — count again on the next check rather than admit past a limit."""
+    global _depth
+    with _depth_lock:
+        _depth = None
+
+
+def queued_counts() -> dict[str, int]:
+    """Jobs per status in the jobs table (external mode)."""
+    db = SessionLocal()
+    try:
+        return dict(db.query(QueuedJob.status, func.count()).group_by(QueuedJob.status).all())
+    finally:
+        db.close()
+
+
+# ── Worker side ───────────────────────────────────────────────────────────────
+
+def _lease_end() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+class JobWorker:
+    """
+    Claims queued rows and feeds them to the local scheduler, keeping at most
+    `max_claimed` (one per scheduler worker) in hand. Each claimed row is
+    leased for JOB_LEASE_SECONDS and the heartbeat renews the lease while the
+    job is here, so rows left running by a worker that died are recognisable
+    from any other worker, whatever it is called.
+    """
+
+    def __init__(self, worker_id: str = WORKER_ID, max_claimed: int | None = None):
+        self.worker_id = worker_id
+        self.max_claimed = max_claimed or scheduler.workers
+        self._claimed: dict[str, int] = {}    # job id → priority
+        self._lock = threading.Lock()
+
+    def requeue_orphans(self) -> int:
+        """Put back running jobs whose lease has lapsed — their worker stopped without finishing them."""
+        db = SessionLocal()
+        try:
+            n = db.execute(
+                update(QueuedJob)
+                .where(
+                    QueuedJob.status == "running",
+                    (QueuedJob.lease_until < datetime.utcnow()) | QueuedJob.lease_until.is_(None),
+                )
+                .values(status="queued", worker=None, started_at=None, lease_until=None)
+            ).rowcount
+            db.commit()
+            return n
+        finally:
+            db.close()
+
+    def renew_leases(self) -> int:
+        """Extend the lease on every job this worker holds; returns how many rows were renewed."""
+        with self._lock:
+            held = list(self._claimed)
+        if not held:
+            return 0
+        db = SessionLocal()
+        try:
+            n = db.execute(
+                update(QueuedJob)
+                .where(QueuedJob.id.in_(held), QueuedJob.status == "running", QueuedJob.worker == self.worker_id)
+                .values(lease_until=_lease_end())
+            ).rowcount
+            db.commit()
+            return n
+        finally:
+            db.close()
+
+    def start_heartbeat(self):
+        """Renew leases from a daemon thread, three times per lease, however long a claim or GC takes."""
+        def beat():
+            while True:
+                time.sleep(JOB_LEASE_SECONDS / 3)
+                try:
+                    self.renew_leases()
+                except Exception as e:
+                    print(f"[job_queue] Lease renewal failed: {e}")
+
+        threading.Thread(target=beat, name="job-heartbeat", daemon=True).start()
+
+    def claim(self) -> int:
+        """
+        Claim jobs the local scheduler can start now and submit each one.
+        Returns how many were claimed. A claimed job that can't start yet would
+        hold a slot while other workers stay idle. Off-peak jobs therefore stay
+        in the table outside the window. Each tenant only gets the room its
+        TENANT_MAX_JOBS share has left, and the least busy tenant goes first,
+        so one tenant's backlog can't take every slot. Bulk jobs leave the
+        scheduler's interactive reserve unclaimed.
+        """
+        with self._lock:
+            room = self.max_claimed - len(self._claimed)
+            bulk_room = scheduler.bulk_workers - sum(p != INTERACTIVE for p in self._claimed.values())
+        if room <= 0:
+            return 0
+
+        held = scheduler.in_hand()
+        offpeak_ok = scheduler.in_offpeak()
+        db = SessionLocal()
+        claimed = []
+        try:
+            waiting = db.query(QueuedJob.priority, QueuedJob.tenant).filter(QueuedJob.status == "queued")
+            if not offpeak_ok:
+                waiting = waiting.filter(QueuedJob.offpeak.is_(False))
+            tenants_by_priority: dict[int, list[str]] = defaultdict(list)
+            for priority, tenant in waiting.distinct().all():
+                tenants_by_priority[priority].append(tenant)
+
+            for priority in sorted(tenants_by_priority):
+                tenants = tenants_by_priority[priority]
+                # One job at a time to whichever tenant has the least in hand
+                while room > 0 and tenants and (priority == INTERACTIVE or bulk_room > 0):
+                    tenant = min(tenants, key=lambda t: held[t])
+                    if held[tenant] >= scheduler.tenant_max_jobs:
+                        break   # the least busy tenant is full, so all of them are
+                    job = self._claim_one(db, priority, tenant, offpeak_ok)
+                    if job is None:
+                        tenants.remove(tenant)
+                        continue
+                    claimed.append(job)
+                    held[tenant] += 1
+                    room -= 1
+                    if priority != INTERACTIVE:
+                        bulk_room -= 1
+        finally:
+            db.close()
+
+        for job_id, tenant, priority, offpeak in claimed:
+            with self._lock:
+                self._claimed[job_id] = priority
+            scheduler.submit(self._run, job_id, tenant=tenant, priority=priority, offpeak=offpeak)
+        return len(claimed)
+
+    def _claim_one(self, db, priority: int, tenant: str, offpeak_ok: bool) -> tuple | None:
+        """Take the tenant's oldest startable job at `priority`; None when it has none left."""
+        while True:
+            q = db.query(QueuedJob.id).filter(
+                QueuedJob.status == "queued", QueuedJob.priority == priority, QueuedJob.tenant == tenant,
+            )
+            if not offpeak_ok:
+                q = q.filter(QueuedJob.offpeak.is_(False))
+            row = q.order_by(QueuedJob.created_at).first()
+            if row is None:
+                return None
+            # Conditional update — another worker may have taken it since the read
+            won = db.execute(
+                update(QueuedJob)
+                .where(QueuedJob.id == row.id, QueuedJob.status == "queued")
+                .values(status="running", worker=self.worker_id, started_at=datetime.utcnow(),
+                        lease_until=_lease_end())
+            ).rowcount
+            db.commit()
+            if won:
+                job = db.get(QueuedJob, row.id)
+                return job.id, job.tenant, job.priority, job.offpeak
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = db.get(QueuedJob, job_id)
+            error = None
+            try:
+                fn, args, kwargs = pickle.loads(job.payload)
+                fn(*args, **kwargs)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"[job_queue] Job {job.name} ({job_id}) failed: {error}")
+            job.status = "failed" if error else "done"
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+            with self._lock:
+                self._claimed.pop(job_id, None)
+
@@ -0,0 +1,221 @@
+"""
+local_scorer.py — Offline provisional scoring against the marking scheme.
+Used when Gemini is unavailable and as a cheap triage pass.  Every step label
+(and the expected answer, when the scheme has one) is scored by IDF-weighted
+keyword coverage of the transcript, computed for a whole batch at once with
+NumPy; NUMERICAL steps add formula, unit and numeric-tolerance checks.
+"""
+import math
+import re
+import numpy as np
+
+from services.answer_clustering import normalise, shingles, jaccard
+
+# Coverage needed for full / half credit on a step
+FULL_COVERAGE = 0.6
+HALF_COVERAGE = 0.35
+# Coverage this far from the thresholds counts as an unambiguous decision
+CLEAR_MARGIN = 0.2
+# Relative tolerance when comparing a numeric final answer
+NUMERIC_TOLERANCE = 0.02
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "be", "by",
+    "with", "as", "at", "it", "its", "this", "that", "from", "correct", "correctly", "stated",
+    "mark", "marks", "answer", "final", "step", "value", "values", "explanation", "proper",
+}
+_UNITS = {
+    "ω": ("ω", "ohm"), "ohm": ("ω", "ohm"), "v": ("v", "volt"), "a": ("a", "amp"),
+    "w": ("w", "watt"), "j": ("j", "joule"), "n": ("n", "newton"), "m/s": ("m/s",),
+    "kg": ("kg",), "hz": ("hz", "hertz"), "c": ("c", "coulomb"), "k": ("k", "kelvin"),
+}
+_TOKEN_RE = re.compile(r"[a-zω]+|\d+(?:\.\d+)?")
+_NUMBER_RE = re.compile(r"(?<![a-zA-Z\d.])-?\d+(?:\.\d+)?")   # not the 1 in "R1"
+_PAREN_UNIT_RE = re.compile(r"\(([^)]{1,6})\)")
+_VISUAL_WORDS = ("diagram", "graph", "figure", "sketch", "draw")
+_FORMULA_RE = re.compile(r"[\w/()^.+\-* ]+=[\w/()^.+\-* ]+")
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def _tokens(text: str) -> set[str]:
+    return {_stem(t) for t in _TOKEN_RE.findall(normalise(text)) if t not in _STOPWORDS}
+
+
+def _formula(text: str) -> str | None:
+    m = _FORMULA_RE.search(normalise(text))
+    return m.group(0).replace(" ", "") if m else None
+
+
+def _numbers(text: str) -> list[float]:
+    return [float(n) for n in _NUMBER_RE.findall(text or "")]
+
+
+def _step_award(coverage: float, max_marks: float) -> float:
+    if coverage >= FULL_COVERAGE:
+        return float(max_marks)
+    if coverage >= HALF_COVERAGE and max_marks >= 1:
+        return math.floor(max_marks) / 2 or 0.5
+    return 0.0
+
+
+def _is_clear(coverage: float) -> bool:
+    return coverage >= FULL_COVERAGE + CLEAR_MARGIN or coverage <= max(HALF_COVERAGE - CLEAR_MARGIN, 0.05)
+
+
+def score_answers(items: list[dict]) -> list[dict]:
+    """
+    Score a batch of answers. Each item has the grade_answer arguments:
+    question_text, question_type, max_marks, marking_scheme, student_text
+    and optionally expected_answer. Returns grade_answer-shaped dicts.
+    """
+    # ── One reference per step (or one per question without steps) ─────────
+    refs: list[tuple[int, dict | None, str]] = []   # (item index, step def, reference text)
+    for i, it in enumerate(items):
+        steps = it.get("marking_scheme") or []
+        expected = it.get("expected_answer") or ""
+        if steps:
+            for s in steps:
+                refs.append((i, s, s["label"]))
+        else:
+            # Without a model answer the question text is only a weak proxy
+            refs.append((i, None, expected or it["question_text"]))
+
+    student_tokens = [_tokens(it.get("student_text") or "") for it in items]
+    ref_tokens = [_tokens(text) for _, _, text in refs]
+
+    vocab = {t: j for j, t in enumerate(sorted(set().union(*student_tokens, *ref_tokens)))}
+    V = max(len(vocab), 1)
+
+    def _matrix(token_sets):
+        m = np.zeros((len(token_sets), V))
+        for r, toks in enumerate(token_sets):
+            m[r, [vocab[t] for t in toks]] = 1.0
+        return m
+
+    S = _matrix(student_tokens)                     # items × vocab presence
+    R = _matrix(ref_tokens)                         # refs × vocab presence
+    # IDF over every document in the batch, so words common to all answers weigh little
+    df = S.sum(axis=0) + R.sum(axis=0)
+    idf = np.log((len(items) + len(refs) + 1) / (df + 1)) + 1.0
+    W = R * idf
+    owners = np.array([i for i, _, _ in refs], dtype=int)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coverage = np.nan_to_num((W * S[owners]).sum(axis=1) / W.sum(axis=1))
+
+    # ── Assemble per item ────────────────────────────────────────────────────
+    by_item: dict[int, list[int]] = {}
+    for k, (owner, _, _) in enumerate(refs):
+        by_item.setdefault(owner, []).append(k)
+
+    out = []
+    for i, it in enumerate(items):
+        text = it.get("student_text") or ""
+        norm = normalise(text)
+
+        if len(norm) < 3:
+            out.append({
+                "obtained_marks": 0.0,
+                "confidence": "high",
+                "ai_remark": "No answer detected.",
+                "steps": [
+                    {"step_key": s["step_key"], "obtained_marks": 0.0, "ai_status": "incorrect",
+                     "ai_note": "Blank"}
+                    for s in (it.get("marking_scheme") or [])
+                ],
+                "source": "local",
+            })
+            continue
+
+        # Garbled OCR: few letters/digits among the written characters
+        written = [ch for ch in text if not ch.isspace()]
+        legible = sum(ch.isalnum() for ch in written) / max(len(written), 1) >= 0.5
+
+        steps_out = []
+        total = 0.0
+        clear = legible and bool(it.get("marking_scheme") or it.get("expected_answer"))
+        for k in by_item[i]:
+            step = refs[k][1]
+            cov = float(coverage[k])
+            max_m = float(step["max_marks"] if step else it["max_marks"])
+            note = f"Keyword coverage {cov:.0%}"
+
+            label = step["label"].lower() if step else ""
+            if any(w in label for w in _VISUAL_WORDS):
+                # Drawings never reach the transcript — leave these to a human or the model
+                clear = False
+                note = "Diagram step — verify against the sheet"
+
+            ref_formula = _formula(step["label"]) if step else None
+            if ref_formula:
+                # Formula step: compare the written formula itself
+                student_formula = _formula(text)
+                if student_formula:
+                    cov = max(cov, jaccard(shingles(ref_formula, 3), shingles(student_formula, 3)))
+                    note = f"Formula similarity {cov:.0%}"
+
+            if it["question_type"] == "NUMERICAL" and step:
+                if "substitut" in label:
+                    # Substitution step: the givens from the question should reappear
+                    givens = set(_numbers(it["question_text"]))
+                    used = givens & set(_numbers(text))
+                    if givens:
+                        cov = len(used) / len(givens)
+                        note = f"{len(used)}/{len(givens)} given values substituted"
+                paren = _PAREN_UNIT_RE.search(step["label"])
+                if "unit" in label or "final" in label or "result" in label:
+                    unit = normalise(paren.group(1)) if paren else ""
+                    spellings = _UNITS.get(unit, (unit,)) if unit else ()
+                    has_unit = any(sp and sp in norm for sp in spellings)
+                    expected = _numbers(it.get("expected_answer") or "")
+                    got = _numbers(text)
+                    if expected and got:
+                        ok = math.isclose(got[-1], expected[-1], rel_tol=NUMERIC_TOLERANCE)
+                        cov = 1.0 if ok and (has_unit or not spellings) else 0.5 if ok else 0.0
+                        note = "Final value matches" if ok else f"Final value {got[-1]} ≠ {expected[-1]}"
+                        if ok and spellings and not has_unit:
+                            note += " — unit missing"
+                    elif got:
+                        # No reference value: a number with the right unit is plausible, not proven
+                        cov = 0.6 if has_unit else 0.35
+                        note = "Final value present" + ("" if has_unit else " — unit missing")
+
+            awarded = _step_award(cov, max_m)
+            clear = clear and _is_clear(cov)
+            total += awarded
+            if step:
+                steps_out.append({
+                    "step_key": step["step_key"],
+                    "obtained_marks": awarded,
+                    "ai_status": "correct" if awarded >= max_m else "incorrect" if awarded == 0 else "low_confidence",
+                    "ai_note": note,
+                })
+
+        total = min(total, float(it["max_marks"]))
+        out.append({
+            "obtained_marks": total,
+            "confidence": "high" if clear else "medium" if legible else "low",
+            "ai_remark": "Provisional score from the offline scorer — please verify.",
+            "steps": steps_out,
+            "source": "local",
+        })
+    return out
+
+
+def score_answer(question_text: str, question_type: str, max_marks: float,
+                 marking_scheme: list[dict], student_text: str,
+                 expected_answer: str | None = None) -> dict:
+    """Single-answer convenience wrapper around score_answers."""
+    return score_answers([{
+        "question_text": question_text,
+        "question_type": question_type,
+        "max_marks": max_marks,
+        "marking_scheme": marking_scheme,
+        "student_text": student_text,
+        "expected_answer": expected_answer,
+    }])[0]
@@ -0,0 +1,172 @@
+"""
+metrics.py — In-process counters, gauges and histograms plus timing spans.
+Rendered in the Prometheus text format by GET /metrics, or by serve() in a
+process without the API (worker.py). Spans also feed a per-session
+collector so each session's stage timings can be stored.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+# Seconds — covers a fast local scoring step up to a slow model call / big PDF render
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_collector: ContextVar[list | None] = ContextVar("span_collector", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key: tuple, extra: dict | None = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(self._values.items())]
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time from a callback returning {label-value: number} or a number."""
+
+    def __init__(self, name: str, help: str, fn: Callable, label: str | None = None):
+        self.name, self.help, self.fn, self.label = name, help, fn, label
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"[metrics] Gauge {self.name} failed: {e}")
+            return lines
+        if isinstance(value, dict):
+            lines += [f'{self.name}{{{self.label}="{k}"}} {v}' for k, v in sorted(value.items())]
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.buckets = name, help, buckets
+        self._series: dict[tuple, list] = {}   # key → [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for le, n in zip(self.buckets, series):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, {'le': le})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, {'le': '+Inf'})} {series[-1]}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {series[-1]}")
+        return lines
+
+
+_registry: list = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_all() -> str:
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_all().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # one line per scrape is noise
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve GET /metrics on `port` from a daemon thread — each process exposes its own counters."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# ── Pipeline metrics ──────────────────────────────────────────────────────────
+
+STAGE_SECONDS = register(Histogram("gradeglide_stage_seconds", "Time spent per pipeline stage"))
+PAGES_PROCESSED = register(Counter("gradeglide_pages_processed_total", "Answer-sheet pages processed"))
+SESSIONS_PROCESSED = register(Counter("gradeglide_sessions_processed_total", "Sessions processed, by outcome"))
+GRADING_ROUTES = register(Counter("gradeglide_grading_routes_total", "Answers graded, by router decision"))
+MODEL_FALLBACKS = register(Counter("gradeglide_model_fallbacks_total", "Model gradings that fell back to the local scorer"))
+CACHE_LOOKUPS = register(Counter("gradeglide_cache_lookups_total", "Cache lookups, by cache and result"))
+ADMISSION_REJECTIONS = register(Counter("gradeglide_admission_rejections_total", "Requests turned away by admission control, by status and reason"))
+
+
+# ── Spans ─────────────────────────────────────────────────────────────────────
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a block into gradeglide_stage_seconds and the active session collector."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _collector.get()
+        if spans is not None:
+            spans.append({"stage": stage, "ms": round(elapsed * 1000, 2), **attrs})
+
+
+@contextmanager
+def collect_spans():
+    """Collect every span opened in this context (one session's run) into a list."""
+    spans: list[dict] = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
@@ -0,0 +1,105 @@
+"""
+ocr_cache.py — Tesseract results cached on disk, shared by every OCR caller.
+
+Re-processing, regrading or re-uploading a sheet OCRs the same pixels again;
+so does extracting the same answer key twice. image_to_string() and
+image_to_data() here look the result up first, keyed on a hash of the pixels
+(mode, size and raw bytes — so any cropping or other preprocessing done
+before OCR is part of the key) plus the function, language, Tesseract config
+(--psm / --oem …) and Tesseract version.
+
+OCR_CACHE_DIR (uploads/ocr_cache) is an LRU bounded by OCR_CACHE_MAX_MB
+(see services/disk_cache.py); OCR_CACHE=0 turns caching off.
+
+  python -m services.ocr_cache stats      files and bytes on disk
+  python -m services.ocr_cache clear      delete every cached result
+
+Hits and misses are counted per process, where the OCR runs; the hit rate
+comes from gradeglide_cache_lookups_total{cache="ocr"} on /metrics (the
+worker's own /metrics with GRADING_WORKER=external).
+"""
+import hashlib
+import json
+import os
+import sys
+from typing import TYPE_CHECKING
+
+from services.disk_cache import DiskLRU
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+OCR_CACHE = os.getenv("OCR_CACHE", "1") != "0"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "uploads/ocr_cache")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+
+ocr_store = DiskLRU("ocr", OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024)
+
+_engine_version: str | None = None
+
+
+def _tesseract():
+    from services.ocr_service import get_tesseract
+    return get_tesseract()
+
+
+def engine_version() -> str:
+    """Tesseract's version, asked once — results from another engine version don't match."""
+    global _engine_version
+    if _engine_version is None:
+        try:
+            _engine_version = str(_tesseract().get_tesseract_version())
+        except Exception:
+            _engine_version = "unknown"
+    return _engine_version
+
+
+def image_digest(image: "Image.Image") -> str:
+    h = hashlib.sha256(f"{image.mode}|{image.width}x{image.height}|".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def _key(kind: str, image: "Image.Image", lang: str, config: str) -> str:
+    params = f"{kind}|{lang}|{config}|{engine_version()}"
+    return hashlib.sha256(f"{image_digest(image)}|{params}".encode()).hexdigest()
+
+
+def _cached(kind: str, image: "Image.Image", lang: str, config: str, run):
+    if not OCR_CACHE:
+        return run()
+    path = ocr_store.path_for(_key(kind, image, lang, config), "json")
+    if ocr_store.lookup(path):
+        try:
+            return json.loads(path.read_bytes())
+        except (OSError, ValueError) as e:
+            # Evicted between lookup and read, or a torn file from an old crash — recompute
+            print(f"[ocr_cache] Ignoring unreadable entry {path.name}: {e}")
+    result = run()
+    ocr_store.write(path, json.dumps(result).encode())
+    return result
+
+
+def image_to_string(image: "Image.Image", lang: str = "eng", config: str = "") -> str:
+    """pytesseract.image_to_string, cached."""
+    return _cached(
+        "string", image, lang, config,
+        lambda: _tesseract().image_to_string(image, lang=lang, config=config),
+    )
+
+
+def image_to_data(image: "Image.Image", lang: str = "eng", config: str = "") -> dict:
+    """pytesseract.image_to_data as a dict of columns, cached."""
+    def run():
+        pytesseract = _tesseract()
+        return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    return _cached("data", image, lang, config, run)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["stats"]:
+        print(json.dumps(ocr_store.disk_usage(), indent=2))
+    elif sys.argv[1:] == ["clear"]:
+        print(f"[ocr_cache] Removed {ocr_store.clear()} cached result(s)")
+    else:
+        print("usage: python -m services.ocr_cache stats|clear")
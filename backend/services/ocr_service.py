@@ -5,40 +5,107 @@ when Tesseract is not installed so the rest of the app still works.
 """
 import os
 import re
-from PIL import Image
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Iterable
+import numpy as np
 
-try:
-    import pytesseract
-    # Allow override of Tesseract path via env (needed on Windows)
-    tesseract_cmd = os.getenv("TESSERACT_CMD")
-    if tesseract_cmd:
-        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-    TESSERACT_AVAILABLE = True
-except ImportError:
-    TESSERACT_AVAILABLE = False
+from services.metrics import span
+from services import ocr_cache
 
+if TYPE_CHECKING:
+    from PIL import Image
 
-def extract_full_text(image: Image.Image) -> str:
+# pytesseract and PIL are imported on first use, so the API process never loads them.
+# Calls go through services/ocr_cache.py, which skips Tesseract for pixels it has seen.
+TESSERACT_AVAILABLE = find_spec("pytesseract") is not None
+_pytesseract = None
+
+
+def get_tesseract():
+    """The pytesseract module, imported and pointed at TESSERACT_CMD on first use."""
+    global _pytesseract
+    if _pytesseract is None:
+        import pytesseract
+        # Allow override of Tesseract path via env (needed on Windows)
+        tesseract_cmd = os.getenv("TESSERACT_CMD")
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        _pytesseract = pytesseract
+    return _pytesseract
+
+
+# Grayscale level below which a pixel counts as ink
+INK_THRESHOLD = 160
+# Rows/columns inked across more than this fraction are ruled lines or margin rules
+FURNITURE_FRACTION = 0.6
+# Pixels kept around the ink bounding box
+INK_PADDING = 12
+
+
+def ink_bbox(gray: np.ndarray) -> tuple[int, int, int, int] | None:
+    """
+    Bounding box (x0, y0, x1, y1) of the handwriting in a grayscale array,
+    ignoring ruled lines, margin rules and isolated specks. None if blank.
+    """
+    ink = gray < INK_THRESHOLD
+    h, w = ink.shape
+    if not h or not w:
+        return None
+    # Page furniture: near-continuous horizontal or vertical lines
+    ink[ink.mean(axis=1) > FURNITURE_FRACTION, :] = False
+    ink[:, ink.mean(axis=0) > FURNITURE_FRACTION] = False
+    # Specks: rows / columns with a single stray pixel
+    rows = np.flatnonzero(ink.sum(axis=1) > 1)
+    cols = np.flatnonzero(ink.sum(axis=0) > 1)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return (
+        max(0, int(cols[0]) - INK_PADDING), max(0, int(rows[0]) - INK_PADDING),
+        min(w, int(cols[-1]) + 1 + INK_PADDING), min(h, int(rows[-1]) + 1 + INK_PADDING),
+    )
+
+
+def _tight_region(image: "Image.Image", page: np.ndarray, y_start: int, y_end: int) -> tuple["Image.Image", dict]:
+    """Crop a horizontal band down to its ink; returns (crop, bbox_pct)."""
+    width, height = image.size
+    box = ink_bbox(page[y_start:y_end])
+    if box is None:
+        x0, y0, x1, y1 = 0, y_start, width, y_end
+    else:
+        x0, y0, x1, y1 = box[0], y_start + box[1], box[2], y_start + box[3]
+    return image.crop((x0, y0, x1, y1)), {
+        "x": round(x0 / width * 100, 1),
+        "y": round(y0 / height * 100, 1),
+        "w": round((x1 - x0) / width * 100, 1),
+        "h": round((y1 - y0) / height * 100, 1),
+    }
+
+
+def extract_full_text(image: "Image.Image") -> str:
     """Run OCR on the entire image and return raw text."""
     if not TESSERACT_AVAILABLE:
         return "[OCR unavailable — install Tesseract and pytesseract]"
-    return pytesseract.image_to_string(image, lang="eng")
+    with span("ocr"):
+        return ocr_cache.image_to_string(image, lang="eng")
 
 
-def detect_question_regions(image: Image.Image) -> list[dict]:
+def detect_question_regions(image: "Image.Image") -> list[dict]:
     """
     Detect answer regions labelled Q1, Q2, Q3, etc. in the image.
-    Returns a list of dicts: {q_num, bbox_pct, cropped_image, raw_text}
+    Returns a list of dicts: {q_num, bbox_pct, cropped_image, raw_text, ocr_confidence}
     bbox_pct is normalised 0-100 (x, y, w, h) for the React bounding boxes.
+    ocr_confidence is Tesseract's mean word confidence (0-100) in the region.
     """
-    width, height = image.size
+    height = image.height
+    page = np.asarray(image.convert("L"))
 
     if not TESSERACT_AVAILABLE:
         # Return synthetic regions so the app can still be demoed
-        return _synthetic_regions(image, width, height)
+        return _synthetic_regions(image, page)
 
     # Get word-level data with positions
-    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    with span("ocr"):
+        data = ocr_cache.image_to_data(image)
     n_boxes = len(data["text"])
 
     # Find lines that contain Q1, Q2 … Q9 labels
@@ -64,35 +131,71 @@ def detect_question_regions(image: Image.Image) -> list[dict]:
         y_start = max(0, y_top - 5)
         y_end = min(height, y_end - 5)
 
-        cropped = image.crop((0, y_start, width, y_end))
-        raw_text = pytesseract.image_to_string(cropped, lang="eng").strip()
+        # OCR only the inked part of the band
+        cropped, bbox_pct = _tight_region(image, page, y_start, y_end)
+        with span("ocr", q=q_num):
+            raw_text = ocr_cache.image_to_string(cropped, lang="eng").strip()
 
         regions.append({
             "q_num": q_num,
-            "bbox_pct": {
-                "x": 0,
-                "y": round(y_start / height * 100, 1),
-                "w": 100,
-                "h": round((y_end - y_start) / height * 100, 1),
-            },
+            "bbox_pct": bbox_pct,
             "cropped_image": cropped,
             "raw_text": raw_text,
+            "ocr_confidence": _mean_confidence(data, y_start, y_end),
         })
 
     # If no Q-labels found, treat entire image as one region
     if not regions:
         raw_text = extract_full_text(image)
+        cropped, bbox_pct = _tight_region(image, page, 0, height)
         regions = [{
             "q_num": 1,
-            "bbox_pct": {"x": 0, "y": 0, "w": 100, "h": 100},
-            "cropped_image": image,
+            "bbox_pct": bbox_pct,
+            "cropped_image": cropped,
             "raw_text": raw_text,
+            "ocr_confidence": _mean_confidence(data, 0, height),
         }]
 
     return regions
 
 
-def _synthetic_regions(image: Image.Image, width: int, height: int) -> list[dict]:
+def locate_questions(pages: Iterable["Image.Image | None"], wanted: Iterable[int]) -> dict[int, dict]:
+    """
+    Run detect_question_regions page by page until every wanted question is found.
+    Page 1 is always read; `pages` is consumed lazily, so later pages are only
+    loaded while something is missing (None stands for a page that couldn't be read).
+    Regions from page 2 on carry "page" in their bbox_pct. Returns {q_num: region}.
+    """
+    wanted = set(wanted)
+    found: dict[int, dict] = {}
+    for page_number, image in enumerate(pages, start=1):
+        if page_number > 1 and wanted <= found.keys():
+            break
+        if image is None:
+            continue
+        with span("detect_regions", page=page_number):
+            regions = detect_question_regions(image)
+        for r in regions:
+            if r["q_num"] not in found:
+                if page_number > 1:
+                    r["bbox_pct"] = {**r["bbox_pct"], "page": page_number}
+                found[r["q_num"]] = r
+    return found
+
+
+def _mean_confidence(data: dict, y_start: int, y_end: int) -> float | None:
+    """Mean confidence of the recognised words whose top edge lies in [y_start, y_end)."""
+    confs = [
+        float(data["conf"][i])
+        for i in range(len(data["text"]))
+        if str(data["text"][i]).strip()
+        and float(data["conf"][i]) >= 0
+        and y_start <= data["top"][i] < y_end
+    ]
+    return sum(confs) / len(confs) if confs else None
+
+
+def _synthetic_regions(image: "Image.Image", page: np.ndarray) -> list[dict]:
     """Return three fake regions so the UI works without Tesseract."""
     splits = [(0, 30), (30, 73), (73, 95)]
     labels = [
@@ -102,12 +205,12 @@ def _synthetic_regions(image: Image.Image, width: int, height: int) -> list[dict
     ]
     regions = []
     for i, ((y0, y1), text) in enumerate(zip(splits, labels)):
-        y_start = int(height * y0 / 100)
-        y_end = int(height * y1 / 100)
+        y_start, y_end = int(image.height * y0 / 100), int(image.height * y1 / 100)
+        cropped, bbox_pct = _tight_region(image, page, y_start, y_end)
         regions.append({
             "q_num": i + 1,
-            "bbox_pct": {"x": 0, "y": y0, "w": 100, "h": y1 - y0},
-            "cropped_image": image.crop((0, y_start, width, y_end)),
+            "bbox_pct": bbox_pct,
+            "cropped_image": cropped,
             "raw_text": text,
         })
     return regions
@@ -2,21 +2,26 @@
 pdf_processor.py — Convert uploaded PDFs or images to PIL Image objects.
 Falls back gracefully when Poppler is not installed.
 """
+import io
 import os
+import re
+from importlib.util import find_spec
 from pathlib import Path
-from PIL import Image
+from typing import TYPE_CHECKING, BinaryIO, Iterator
 
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
+from services.blob_store import blob_store
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL and pdf2image are imported on first use, so the API process never loads them
+PDF2IMAGE_AVAILABLE = find_spec("pdf2image") is not None
 
 # Read optional Poppler path from env (needed on Windows)
 POPPLER_PATH = os.getenv("POPPLER_PATH", None) or None
 
 
-def file_to_images(file_path: str) -> list[Image.Image]:
+def file_to_images(file_path: str) -> list["Image.Image"]:
     """
     Convert an uploaded file (PDF or image) to a list of PIL Images.
     Returns one image per page for PDFs, or a single-item list for images.
@@ -25,6 +30,7 @@ def file_to_images(file_path: str) -> list[Image.Image]:
     ext = path.suffix.lower()
 
     if ext in (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tiff"):
+        from PIL import Image
         img = Image.open(file_path).convert("RGB")
         return [img]
 
@@ -34,6 +40,7 @@ def file_to_images(file_path: str) -> list[Image.Image]:
                 "pdf2image is not installed. Run: pip install pdf2image\n"
                 "Also install Poppler: https://github.com/oschwartz10612/poppler-windows/releases"
             )
+        from pdf2image import convert_from_path
         kwargs = {"dpi": 200}
         if POPPLER_PATH:
             kwargs["poppler_path"] = POPPLER_PATH
@@ -43,16 +50,67 @@ def file_to_images(file_path: str) -> list[Image.Image]:
     raise ValueError(f"Unsupported file type: {ext}")
 
 
-def save_page_images(images: list[Image.Image], session_id: str, upload_dir: str) -> list[str]:
+def iter_pages(file_path: str) -> Iterator["Image.Image"]:
     """
-    Save PIL images to disk as PNGs, return their file paths.
+    Yield pages one at a time, so a long class scan can be processed while the
+    rest of it is still being rendered.
     """
-    session_dir = Path(upload_dir) / session_id
-    session_dir.mkdir(parents=True, exist_ok=True)
+    path = Path(file_path)
+    if path.suffix.lower() != ".pdf":
+        yield from file_to_images(file_path)
+        return
+    if not PDF2IMAGE_AVAILABLE:
+        raise RuntimeError("pdf2image is not installed. Run: pip install pdf2image")
+
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    kwargs = {"dpi": 200}
+    if POPPLER_PATH:
+        kwargs["poppler_path"] = POPPLER_PATH
+    n_pages = pdfinfo_from_path(file_path, poppler_path=POPPLER_PATH)["Pages"]
+    for page in range(1, n_pages + 1):
+        yield convert_from_path(file_path, first_page=page, last_page=page, **kwargs)[0].convert("RGB")
+
+
+# Page objects in an uncompressed PDF body ("/Type /Pages" is the page tree, not a page)
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# Used when the page objects are hidden in compressed object streams
+ESTIMATED_BYTES_PER_PAGE = 150_000
+
 
-    paths = []
-    for i, img in enumerate(images):
-        out_path = session_dir / f"page_{i + 1}.png"
-        img.save(str(out_path), "PNG")
-        paths.append(str(out_path))
-    return paths
+def estimate_pages(stream: BinaryIO, ext: str) -> int:
+    """
+    Cheap page count for admission control, without rendering or importing a PDF
+    library: counts page objects, falling back to a size estimate. Rewinds `stream`.
+    """
+    if ext.lower() != ".pdf":
+        return 1
+    count, size, tail = 0, 0, b""
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        size += len(chunk)
+        # Carry over a short tail so a marker split across chunks is still seen,
+        # without counting one that lies wholly inside the tail twice
+        data = tail + chunk
+        count += len(_PDF_PAGE_RE.findall(data)) - len(_PDF_PAGE_RE.findall(tail))
+        tail = data[-32:]
+    stream.seek(0)
+    return count or max(1, -(-size // ESTIMATED_BYTES_PER_PAGE))
+
+
+def save_page_images(images: list["Image.Image"]) -> list[str]:
+    """
+    Store PIL images in the blob store as PNGs, return their blob keys.
+    Each key carries one reference, owned by the AnswerSheetImage row written for it.
+    """
+    keys = []
+    try:
+        for img in images:
+            buf = io.BytesIO()
+            img.save(buf, "PNG")
+            keys.append(blob_store.put_bytes(buf.getvalue(), ".png"))
+    except Exception:
+        # No row will ever own the pages stored so far
+        for key in keys:
+            blob_store.release(key)
+        raise
+    return keys
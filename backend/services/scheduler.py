@@ -0,0 +1,215 @@
+"""
+scheduler.py — Priority + weighted fair-share scheduling for grading work.
+Interactive uploads always run before bulk work, and bulk work never takes
+the last INTERACTIVE_RESERVE workers, so a teacher's upload starts at once
+even behind a class batch. Within a priority, tenants (the uploading account)
+take turns in proportion to their weight, and each tenant is capped on
+concurrent jobs (OCR + grading) and on concurrent grading-model calls.
+"""
+import os
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, time
+from itertools import count
+from typing import Callable
+
+from services.metrics import Gauge, register
+
+# Lower runs first
+INTERACTIVE = 0
+BULK = 1
+
+_current_tenant: ContextVar[str] = ContextVar("grading_tenant", default="default")
+_job_ids = count(1)
+
+
+@dataclass
+class Job:
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    tenant: str
+    priority: int
+    weight: float = 1.0
+    offpeak: bool = False     # bulk work that may only start inside the off-peak window
+    id: int = field(default_factory=lambda: next(_job_ids))
+
+
+def _parse_window(spec: str) -> tuple[time, time] | None:
+    """"22:00-06:00" → (22:00, 06:00); empty → None."""
+    if not spec:
+        return None
+    start, end = (time.fromisoformat(part.strip()) for part in spec.split("-"))
+    return start, end
+
+
+class GradingScheduler:
+    def __init__(self, workers: int, tenant_max_jobs: int, tenant_max_model_calls: int,
+                 offpeak_window: tuple[time, time] | None = None, interactive_reserve: int = 1):
+        self.workers = workers
+        # Workers bulk jobs may not occupy; at least one worker is always left to bulk
+        self.interactive_reserve = max(0, min(interactive_reserve, workers - 1))
+        self.tenant_max_jobs = tenant_max_jobs
+        self.tenant_max_model_calls = tenant_max_model_calls
+        self.offpeak_window = offpeak_window
+
+        self._cv = threading.Condition()
+        self._queues: dict[int, dict[str, deque[Job]]] = {INTERACTIVE: {}, BULK: {}}
+        self._vtime: dict[str, float] = defaultdict(float)   # weighted work served per tenant
+        self._clock = 0.0                                      # vtime of the last dispatched job
+        self._running: dict[str, int] = defaultdict(int)
+        self._model_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._threads: list[threading.Thread] = []
+
+    @classmethod
+    def from_env(cls) -> "GradingScheduler":
+        return cls(
+            workers=int(os.getenv("SCHEDULER_WORKERS", "4")),
+            tenant_max_jobs=int(os.getenv("TENANT_MAX_JOBS", "2")),
+            tenant_max_model_calls=int(os.getenv("TENANT_MAX_MODEL_CALLS", "2")),
+            offpeak_window=_parse_window(os.getenv("OFFPEAK_WINDOW", "")),
+            interactive_reserve=int(os.getenv("INTERACTIVE_RESERVE", "1")),
+        )
+
+    # ── Submission ────────────────────────────────────────────────────────────
+
+    def submit(self, fn: Callable, *args, tenant: str = "default", priority: int = INTERACTIVE,
+               weight: float = 1.0, offpeak: bool = False, **kwargs) -> Job:
+        job = Job(fn, args, kwargs, tenant, priority, weight, offpeak and self.offpeak_window is not None)
+        with self._cv:
+            self._start_workers()
+            queues = self._queues[priority]
+            if not queues.get(tenant):
+                # A tenant returning from idle starts level with everyone else
+                # instead of cashing in the time it was away
+                self._vtime[tenant] = max(self._vtime[tenant], self._clock)
+            queues.setdefault(tenant, deque()).append(job)
+            self._cv.notify()
+        return job
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"grading-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    # ── Dispatch ──────────────────────────────────────────────────────────────
+
+    def in_offpeak(self, now: datetime | None = None) -> bool:
+        if self.offpeak_window is None:
+            return True
+        start, end = self.offpeak_window
+        t = (now or datetime.now()).time()
+        return start <= t < end if start < end else t >= start or t < end
+
+    def _next_job(self) -> Job | None:
+        """Highest priority first; within it, the eligible tenant with the least weighted service."""
+        offpeak = self.in_offpeak()
+        busy = sum(self._running.values())
+        for priority in sorted(self._queues):
+            if priority != INTERACTIVE and busy >= self.bulk_workers:
+                break
+            queues = self._queues[priority]
+            eligible = [
+                tenant for tenant, q in queues.items()
+                if q and self._running[tenant] < self.tenant_max_jobs and (offpeak or not q[0].offpeak)
+            ]
+            if not eligible:
+                continue
+            tenant = min(eligible, key=lambda t: self._vtime[t])
+            job = queues[tenant].popleft()
+            if not queues[tenant]:
+                del queues[tenant]
+            self._vtime[tenant] += 1.0 / job.weight
+            self._clock = self._vtime[tenant]
+            self._running[tenant] += 1
+            return job
+        return None
+
+    @property
+    def bulk_workers(self) -> int:
+        """How many workers bulk jobs may hold at once."""
+        return self.workers - self.interactive_reserve
+
+    def _work(self):
+        while True:
+            with self._cv:
+                job = self._next_job()
+                while job is None:
+                    # Time out now and then so off-peak jobs start when the window opens
+                    self._cv.wait(timeout=60)
+                    job = self._next_job()
+            token = _current_tenant.set(job.tenant)
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                print(f"[scheduler] Job {job.id} for {job.tenant} failed: {e}")
+            finally:
+                _current_tenant.reset(token)
+                with self._cv:
+                    self._running[job.tenant] -= 1
+                    self._cv.notify_all()
+
+    # ── Per-tenant model-call cap ─────────────────────────────────────────────
+
+    @contextmanager
+    def model_slot(self):
+        """Hold one of the current tenant's grading-model call slots."""
+        tenant = _current_tenant.get()
+        with self._cv:
+            sem = self._model_slots.setdefault(tenant, threading.BoundedSemaphore(self.tenant_max_model_calls))
+        with sem:
+            yield
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    def snapshot(self) -> dict:
+        with self._cv:
+            return {
+                "queued": {
+                    "interactive": sum(len(q) for q in self._queues[INTERACTIVE].values()),
+                    "bulk": sum(len(q) for q in self._queues[BULK].values()),
+                },
+                "running": {t: n for t, n in self._running.items() if n},
+                "offpeak": self.in_offpeak(),
+            }
+
+    def queued(self, tenant: str | None = None) -> dict[int, int]:
+        """Jobs waiting per priority, for one tenant or all of them."""
+        with self._cv:
+            return {
+                priority: sum(len(q) for t, q in queues.items() if tenant is None or t == tenant)
+                for priority, queues in self._queues.items()
+            }
+
+    def in_hand(self) -> dict[str, int]:
+        """Jobs per tenant either running or waiting here — what counts against TENANT_MAX_JOBS soon."""
+        with self._cv:
+            held = defaultdict(int, {t: n for t, n in self._running.items() if n})
+            for queues in self._queues.values():
+                for tenant, q in queues.items():
+                    held[tenant] += len(q)
+            return held
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until nothing is queued or running (tests, graceful shutdown)."""
+        with self._cv:
+            return self._cv.wait_for(
+                lambda: not any(self._queues[p] for p in self._queues) and not any(self._running.values()),
+                timeout=timeout,
+            )
+
+
+scheduler = GradingScheduler.from_env()
+
+register(Gauge(
+    "gradeglide_queue_depth", "Grading jobs waiting, by priority",
+    lambda: scheduler.snapshot()["queued"], label="priority",
+))
+register(Gauge(
+    "gradeglide_running_jobs", "Grading jobs running, by tenant",
+    lambda: scheduler.snapshot()["running"], label="tenant",
+))
@@ -0,0 +1,60 @@
+"""
+similarity_index.py — MinHash signatures + LSH banding for transcripts.
+Two answers whose shingle sets have Jaccard similarity s share at least one
+band bucket with probability 1 − (1 − s^ROWS)^BANDS, so only colliding
+pairs ever need to be compared.
+"""
+import hashlib
+import numpy as np
+
+from services.answer_clustering import normalise, shingles
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS   # 8 rows → ~0.71 similarity collision threshold
+
+# Answers shorter than this (normalised) are too generic to flag as copied
+MIN_CHARS = 20
+# A bucket shared by more answers than this is a stock answer, not copying
+MAX_BUCKET_SIZE = 50
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)   # fixed seed: signatures must be stable across processes
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def signature(text: str | None) -> np.ndarray | None:
+    """MinHash signature (uint32[NUM_PERM]) of a transcript, or None if it is too short."""
+    norm = normalise(text)
+    if len(norm) < MIN_CHARS:
+        return None
+    x = np.fromiter(shingles(norm), dtype=np.uint64)
+    # a·x + b stays below 2^63 since a < 2^31 and x < 2^32
+    hashed = (_A[:, None] * x[None, :] + _B[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(sig: np.ndarray) -> list[int]:
+    """One signed 64-bit bucket id per band."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).digest(),
+            "big",
+            signed=True,
+        )
+        for b in range(BANDS)
+    ]
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<u4")
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity from two signatures."""
+    return float(np.mean(a == b))
@@ -0,0 +1,78 @@
+"""
+worker.py — GradeGlide grading worker (OCR, PDF rendering, model calls).
+Run with: python worker.py
+Pair with an API started as GRADING_WORKER=external uvicorn main:app, which
+only queues jobs. Priorities, tenant fair share and model-call caps apply
+inside the worker exactly as they do in the single-process setup.
+"""
+import importlib
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import init_db
+
+init_db()
+Path("uploads").mkdir(exist_ok=True)
+
+# Job payloads unpickle their function by module reference; import the pipeline modules up front
+import api.upload  # noqa: F401
+import api.regrade  # noqa: F401
+import api.clusters  # noqa: F401
+from services.job_queue import JobWorker, JOB_LEASE_SECONDS
+from services.blob_store import blob_store
+from services import metrics
+
+POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1.0"))
+# How often this worker deletes released blobs past their grace period
+BLOB_GC_INTERVAL = float(os.getenv("BLOB_GC_INTERVAL", "600"))
+# The pipeline counters and histograms live in this process; scrape them here (0 = off)
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+# Optional libraries the services import on first use; load them before the first job
+PRELOAD = ("PIL.Image", "pytesseract", "pdf2image", "google.generativeai", "pdfplumber", "docx")
+
+
+def main():
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    worker = JobWorker()
+    worker.start_heartbeat()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+        print(f"[worker] Metrics on :{METRICS_PORT}/metrics")
+    requeued = worker.requeue_orphans()
+    print(f"[worker] {worker.worker_id} ready — {requeued} interrupted job(s) requeued")
+    next_gc = time.monotonic()
+    next_requeue = time.monotonic() + JOB_LEASE_SECONDS
+    while True:
+        # Any worker takes back jobs whose owner stopped renewing their lease
+        if time.monotonic() >= next_requeue:
+            try:
+                requeued = worker.requeue_orphans()
+                if requeued:
+                    print(f"[worker] Requeued {requeued} job(s) with a lapsed lease")
+            except Exception as e:
+                print(f"[worker] Requeueing lapsed jobs failed: {e}")
+            next_requeue = time.monotonic() + JOB_LEASE_SECONDS
+        if time.monotonic() >= next_gc:
+            try:
+                collected = blob_store.collect_garbage()
+                if collected:
+                    print(f"[worker] Collected {collected} released blob(s)")
+            except Exception as e:
+                print(f"[worker] Blob garbage collection failed: {e}")
+            next_gc = time.monotonic() + BLOB_GC_INTERVAL
+        # Keep claiming while there is work; back off when the queue is empty
+        if not worker.claim():
+            time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
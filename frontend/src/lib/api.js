@@ -14,10 +14,36 @@ async function request(path, options = {}) {
     return res.json()
 }
 
+// ── Tenant ────────────────────────────────────────────────────────────────
+
+const TENANT_KEY = "gradeglide.tenantId"
+
+/**
+ * Headers naming this browser's account to the backend, which queues and caps
+ * grading work per X-Tenant-Id. The id is generated once and kept in localStorage.
+ */
+export const tenantHeaders = () => {
+    let id = localStorage.getItem(TENANT_KEY)
+    if (!id) {
+        id = crypto.randomUUID ? crypto.randomUUID() : `t-${Date.now()}-${Math.random().toString(36).slice(2)}`
+        localStorage.setItem(TENANT_KEY, id)
+    }
+    return { "X-Tenant-Id": id }
+}
+
 // ── Sessions ──────────────────────────────────────────────────────────────
 
-/** List all grading sessions for the batch list in GradingWorkspace */
-export const getSessions = () => request("/sessions")
+/**
+ * List grading sessions for the batch list in GradingWorkspace.
+ * Returns { items, nextCursor, total } — pass nextCursor back to get the next page.
+ * @param {object} params  — limit, cursor, status, subject, exam_title, created_from, created_to, include_total
+ */
+export const getSessions = (params = {}) => {
+    const qs = new URLSearchParams(
+        Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== "")
+    ).toString()
+    return request(`/sessions${qs ? `?${qs}` : ""}`)
+}
 
 /** Full session data shaped for GradingReview */
 export const getSession = (id) => request(`/sessions/${id}`)
@@ -36,6 +62,19 @@ export const updateMarks = (sessionId, questionId, obtainedMarks, stepId = null)
         body: JSON.stringify({ question_id: questionId, step_id: stepId, obtained_marks: obtainedMarks }),
     })
 
+/**
+ * Save many mark edits in one round trip.
+ * @param {string} sessionId
+ * @param {Array<{question_id: string, step_id: string|null, obtained_marks: number|null}>} updates
+ * @param {number|null} version  — session version from getSession; a stale value yields HTTP 409
+ */
+export const updateMarksBatch = (sessionId, updates, version = null) =>
+    request(`/sessions/${sessionId}/marks/batch`, {
+        method: "PATCH",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ version, updates }),
+    })
+
 /** Mark a session as completed */
 export const finaliseSession = (sessionId) =>
     request(`/sessions/${sessionId}/finalise`, { method: "POST" })
@@ -49,7 +88,7 @@ export const finaliseSession = (sessionId) =>
 export const uploadAnswerSheet = (file) => {
     const form = new FormData()
     form.append("answer_sheet", file)
-    return request("/upload/session", { method: "POST", body: form })
+    return request("/upload/session", { method: "POST", headers: tenantHeaders(), body: form })
 }
 
 // ── Export ────────────────────────────────────────────────────────────────
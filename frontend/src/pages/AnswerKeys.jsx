@@ -17,6 +17,7 @@ import {
 import { Card, CardContent } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
 import { Badge } from '@/components/ui/badge'
+import { tenantHeaders } from '@/lib/api'
 
 const BACKEND = 'http://localhost:8000'
 
@@ -178,7 +179,7 @@ function CreateModal({ onClose, onCreated }) {
         try {
             const form = new FormData()
             form.append('file', file)
-            const res = await fetch(`${BACKEND}/answer-keys/extract`, { method: 'POST', body: form })
+            const res = await fetch(`${BACKEND}/answer-keys/extract`, { method: 'POST', headers: tenantHeaders(), body: form })
             const data = await res.json()
             if (!res.ok) throw new Error(data.detail || `Server error ${res.status}`)
             setQuestions(data.questions || [])
@@ -483,6 +483,16 @@ function QuestionCard({ q, isActive, onSelect, onUpdateMark }) {
                             <span className={cn('text-[10px] font-semibold px-1.5 py-0.5 rounded', typeLabel.cls)}>
                                 {typeLabel.text}
                             </span>
+                            {q.propagated && (
+                                <span className="text-[10px] font-semibold px-1.5 py-0.5 rounded bg-teal-50 text-teal-700" title="Graded once for a group of near-identical answers">
+                                    Cluster-graded
+                                </span>
+                            )}
+                            {['blank', 'exact', 'local'].includes(q.route) && (
+                                <span className="text-[10px] font-semibold px-1.5 py-0.5 rounded bg-slate-100 text-slate-600" title="Settled by the local scorer without an AI call">
+                                    Auto-graded
+                                </span>
+                            )}
                         </div>
                         <h4 className="font-semibold text-sm leading-snug">Q{q.id}. {q.question}</h4>
                     </div>
@@ -613,13 +623,15 @@ export default function GradingReview() {
     const imageContainerRef = useRef(null)
     const clearCanvasRef = useRef(null)
     const saveTimer = useRef(null)
+    const pendingEdits = useRef({})   // "qid:stepId" → latest edit, flushed as one batch
+    const versionRef = useRef(null)
 
     // ── Fetch session from backend; fall back to mock if backend is offline ──
     useEffect(() => {
         setLoading(true)
         fetch(`${BACKEND_BASE}/sessions/${id}`)
             .then(r => r.ok ? r.json() : Promise.reject(r.status))
-            .then(json => { setData(json); setApiError(null) })
+            .then(json => { setData(json); versionRef.current = json.version ?? null; setApiError(null) })
             .catch(() => {
                 // Backend offline → use built-in mock so UI still works
                 setData(MOCK_EXAM_DATA)
@@ -629,6 +641,81 @@ export default function GradingReview() {
     }, [id])
 
     // ── Save mark updates to backend (debounced 600ms) ───────────────────────
+    // One PATCH at a time: each flush is chained on the previous one, so it
+    // always carries the version the last save returned.
+    const saveChain = useRef(Promise.resolve())
+    const mounted = useRef(true)
+
+    const flushEdits = useCallback((sessionId, opts) => {
+        const patchMarks = (updates) =>
+            fetch(`${BACKEND_BASE}/sessions/${sessionId}/marks/batch`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ version: versionRef.current, updates }),
+                ...opts,
+            }).then(r => r.ok ? r.json() : Promise.reject(r.status))
+
+        // Put edits that didn't save back in the queue, unless a newer edit replaced them
+        const requeue = (updates) => {
+            for (const u of updates) {
+                const key = `${u.question_id}:${u.step_id ?? ''}`
+                if (!(key in pendingEdits.current)) pendingEdits.current[key] = u
+            }
+        }
+
+        // Show the server's copy with any still-unsaved edits laid over it
+        const showFresh = (json) => {
+            const unsaved = {}
+            for (const u of Object.values(pendingEdits.current)) unsaved[u.question_id] = u.obtained_marks
+            const questions = json.questions.map(q =>
+                String(q.id) in unsaved ? { ...q, obtainedMarks: unsaved[String(q.id)] } : q
+            )
+            const obtainedMarks = questions.reduce((sum, q) => sum + (q.obtainedMarks ?? 0), 0)
+            setData({ ...json, questions, obtainedMarks })
+        }
+
+        saveChain.current = saveChain.current.then(async () => {
+            const updates = Object.values(pendingEdits.current)
+            pendingEdits.current = {}
+            if (!updates.length) return
+            try {
+                const json = await patchMarks(updates)
+                versionRef.current = json.version
+            } catch (status) {
+                if (status !== 409) {
+                    requeue(updates)   // backend offline — retried with the next flush
+                    return
+                }
+                // Changed elsewhere: reload, then reapply these edits on the latest version
+                try {
+                    const fresh = await fetch(`${BACKEND_BASE}/sessions/${sessionId}`)
+                        .then(r => r.ok ? r.json() : Promise.reject(r.status))
+                    versionRef.current = fresh.version ?? null
+                    const json = await patchMarks(updates)
+                    versionRef.current = json.version
+                    if (mounted.current) {
+                        showFresh({ ...fresh, version: json.version })
+                        setApiError('This paper was changed elsewhere — your edits were reapplied to the latest marks')
+                    }
+                } catch {
+                    requeue(updates)
+                    if (mounted.current) setApiError('Could not save marks — they will be retried with your next edit')
+                }
+            }
+        })
+        return saveChain.current
+    }, [])
+
+    // Send whatever is still pending when leaving the page (or switching paper)
+    useEffect(() => {
+        mounted.current = true
+        return () => {
+            mounted.current = false
+            clearTimeout(saveTimer.current)
+            flushEdits(id, { keepalive: true })
+        }
+    }, [id, flushEdits])
+
     const handleUpdateMark = useCallback((qid, newMark, stepId = null) => {
         setData(prev => {
             if (!prev) return prev
@@ -639,20 +726,15 @@ export default function GradingReview() {
             return { ...prev, questions: updatedQuestions, obtainedMarks: newTotal }
         })
 
-        // Debounce the PATCH request
+        // Queue the edit; the debounced flush sends everything pending in one PATCH
+        pendingEdits.current[`${qid}:${stepId ?? ''}`] = {
+            question_id: String(qid),
+            step_id: stepId,
+            obtained_marks: newMark,
+        }
         clearTimeout(saveTimer.current)
-        saveTimer.current = setTimeout(() => {
-            fetch(`${BACKEND_BASE}/sessions/${id}/marks`, {
-                method: 'PATCH',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    question_id: String(qid),
-                    step_id: stepId,
-                    obtained_marks: newMark,
-                }),
-            }).catch(() => { }) // Silently ignore if backend offline
-        }, 600)
-    }, [id])
+        saveTimer.current = setTimeout(() => flushEdits(id), 600)
+    }, [id, flushEdits])
 
     // When a Q is selected from the right pane, highlight its bbox on the left
     const handleSelectQ = useCallback((qid) => {
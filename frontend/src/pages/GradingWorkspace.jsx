@@ -14,6 +14,7 @@ import {
 import { Card, CardContent } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
 import { Badge } from '@/components/ui/badge'
+import { tenantHeaders } from '@/lib/api'
 import { Link, useNavigate } from 'react-router-dom'
 
 const BACKEND = 'http://localhost:8000'
@@ -58,7 +59,7 @@ function UploadModal({ onClose, onSuccess }) {
             const form = new FormData()
             form.append('answer_sheet', file)
             if (selectedKeyId) form.append('answer_key_id', selectedKeyId)
-            const res = await fetch(`${BACKEND}/upload/session`, { method: 'POST', body: form })
+            const res = await fetch(`${BACKEND}/upload/session`, { method: 'POST', headers: tenantHeaders(), body: form })
             if (!res.ok) throw new Error(`Server error ${res.status}`)
             const data = await res.json()
             setStatus('done')
@@ -204,23 +205,37 @@ const MOCK_ITEMS = [
     { id: 'batch-2', studentName: 'Demo Student 2', subject: 'Chemistry', examTitle: 'Mid-Term Quiz — Chemistry', status: 'completed', obtainedMarks: 10, totalMarks: 10, createdAt: new Date(Date.now() - 86400000).toISOString() },
 ]
 
+const PAGE_SIZE = 50
+
 // ── Main Page ─────────────────────────────────────────────────────────────────
 export default function GradingWorkspace() {
     const navigate = useNavigate()
     const [sessions, setSessions] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
+    const [loadingMore, setLoadingMore] = useState(false)
     const [loading, setLoading] = useState(true)
     const [showUpload, setShowUpload] = useState(false)
     const [backendOnline, setBackendOnline] = useState(true)
 
     const loadSessions = () => {
         setLoading(true)
-        fetch(`${BACKEND}/sessions`)
+        fetch(`${BACKEND}/sessions?limit=${PAGE_SIZE}`)
             .then(r => r.json())
-            .then(data => { setSessions(data); setBackendOnline(true) })
-            .catch(() => { setSessions(MOCK_ITEMS); setBackendOnline(false) })
+            .then(data => { setSessions(data.items); setNextCursor(data.nextCursor); setBackendOnline(true) })
+            .catch(() => { setSessions(MOCK_ITEMS); setNextCursor(null); setBackendOnline(false) })
             .finally(() => setLoading(false))
     }
 
+    const loadMore = () => {
+        if (!nextCursor) return
+        setLoadingMore(true)
+        fetch(`${BACKEND}/sessions?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(nextCursor)}`)
+            .then(r => r.json())
+            .then(data => { setSessions(prev => [...prev, ...data.items]); setNextCursor(data.nextCursor) })
+            .catch(() => { })
+            .finally(() => setLoadingMore(false))
+    }
+
     useEffect(() => { loadSessions() }, [])
 
     return (
@@ -286,6 +301,14 @@ export default function GradingWorkspace() {
                 ) : (
                     <div className="space-y-3">
                         {sessions.map(s => <SessionItem key={s.id} {...s} />)}
+                        {nextCursor && (
+                            <div className="flex justify-center pt-2">
+                                <Button variant="outline" size="sm" onClick={loadMore} disabled={loadingMore}>
+                                    {loadingMore && <Loader2 className="mr-2 h-4 w-4 animate-spin" />}
+                                    Load more
+                                </Button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>